@@ -0,0 +1,41 @@
+# %%
+"""
+Write time vs. file size of an input file with different HDF5 storage options
+"""
+import numpy as np
+import kwave
+
+# %%
+N = 256
+grid = kwave.Grid(Nx=N, Ny=N, Nz=N, dx=0.1e-3, dy=0.1e-3, dz=0.1e-3)
+grid.make_time(1500)
+
+c0 = np.full((N, N, N), 1500.0, dtype=np.float32)
+c0[N // 2 :] = 1540.0
+z, y, x = (i - N // 2 for i in np.ogrid[:N, :N, :N])
+p0 = 5 * (x**2 + y**2 + z**2 <= 10**2).astype(np.float32)
+
+mask = np.zeros((N, N, N))
+mask[N // 2, N // 2, :] = 1
+
+inp = kwave.H5Input(
+    simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+    grid=grid,
+    medium=kwave.Medium(c0=c0),
+    sensor=kwave.Sensor.make_binary_sensor(mask),
+    source=kwave.Source(p0_source_input=p0),
+    pml=kwave.PML(20, 2.0, 20, 2.0, 20, 2.0),
+)
+
+# %%
+settings = {
+    "contiguous": None,
+    "gzip-1": kwave.StorageOptions(compression="gzip", compression_opts=1),
+    "gzip-4": kwave.StorageOptions(compression="gzip"),
+    "gzip-4 + shuffle": kwave.StorageOptions(compression="gzip", shuffle=True),
+    "lzf (python only)": kwave.StorageOptions(compression="lzf"),
+}
+
+print(f"{'setting':<20} {'write [s]':>10} {'size [MiB]':>12}")
+for r in kwave.benchmark_storage(inp, settings):
+    print(f"{r['name']:<20} {r['write_time']:>10.3f} {r['file_size'] / 2**20:>12.1f}")
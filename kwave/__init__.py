@@ -4,10 +4,19 @@ Partial port of the k-Wave MATLAB toolbox
 from kwave.kwave_funcs import (
     gaussian,
     gaussian_filter,
+    GaussianFilterBank,
     envelope_detection,
+    EnvelopeDetector,
     log_compression,
     stacked_plot,
     reorder_sensor_data,
+    largest_prime_factor,
+    get_optimal_pml_size,
+    expand_grid_for_pml,
+    crop_to_grid,
+    reorder_planar_sensor_data,
+    kspace_line_recon,
+    kspace_plane_recon,
 )
 from kwave.h5input import (
     SimulationFlags,
@@ -20,4 +29,31 @@ from kwave.h5input import (
     H5Input,
 )
 from kwave.h5output import SimulationFlagsOutput, SimulationResults, H5Output
-from kwave.kspaceFirstOrder_runner import kspaceFirstOrder, kspaceFirstOrder_version
+from kwave.kspaceFirstOrder_runner import (
+    kspaceFirstOrder,
+    kspaceFirstOrder_batch,
+    kspaceFirstOrder_async,
+    kspaceFirstOrder_version,
+)
+from kwave.kspaceFirstOrder_numpy import kspaceFirstOrder_numpy
+from kwave.cache import SimulationCache
+from kwave.solver_options import SolverOptions
+from kwave.result_store import ResultStore
+from kwave.pipeline import SensorPipeline
+from kwave.reconstruction import DelayAndSum, delay_and_sum
+from kwave.estimate import ResourceEstimate, EstimateModel, estimate
+from kwave.monitor import (
+    SolverPhase,
+    SolverProgress,
+    SolverInfo,
+    ResourceSample,
+    RunMetrics,
+)
+from kwave.h5_dataclass_helper import (
+    LazyDataset,
+    StorageOptions,
+    benchmark_storage,
+    collapse_uniform,
+    update_hdf5,
+    InputTemplate,
+)
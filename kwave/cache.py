@@ -0,0 +1,143 @@
+"""
+Content-addressed cache of simulation outputs.
+
+Outputs are stored as `<key>.h5` files under the cache directory, where the
+key is a hash of the simulation input (see `hash_dataclass`) and the solver
+arguments. A JSON index records the size and last access time of every
+entry so the cache can be kept under a disk budget by evicting the least
+recently used outputs.
+"""
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import h5py
+
+from kwave.h5input import H5Input
+from kwave.h5output import H5Output
+from kwave.h5_dataclass_helper import hash_dataclass, deserialize_from_hdf5
+
+__all__ = ("SimulationCache",)
+
+
+class SimulationCache:
+    """
+    On-disk LRU cache of solver output files.
+
+    path:
+        Cache directory (created if needed).
+    max_bytes:
+        Disk budget. The least recently used outputs are evicted once the
+        total size of the cached files exceeds it.
+
+    The index is loaded once when the cache is opened and rewritten
+    atomically after every change. A cache object may be shared between
+    threads (e.g. by `kspaceFirstOrder_batch`).
+    """
+
+    index_name = "index.json"
+
+    def __init__(self, path: str | Path, max_bytes: int = 10 * 2**30):
+        self.path = Path(path)
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = {}
+
+        index_file = self.path / self.index_name
+        if index_file.exists():
+            with open(index_file) as fp:
+                self._index = json.load(fp)
+
+    def make_key(self, inp: H5Input, solver_args: list[str] = ()) -> str:
+        """
+        Stable key for an input and the solver arguments
+        (excluding the input/output file names).
+        """
+        h = hashlib.sha256()
+        hash_dataclass(inp, h)
+        h.update(json.dumps(list(solver_args)).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> H5Output | None:
+        """
+        Return the cached output for `key`, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._index:
+                return None
+            fname = self._file(key)
+            if not fname.exists():
+                # removed behind our back
+                del self._index[key]
+                self._save_index()
+                return None
+            self._index[key]["last_access"] = time.time()
+            self._save_index()
+
+        with h5py.File(fname, "r") as fp:
+            return deserialize_from_hdf5(H5Output, fp)
+
+    def put(self, key: str, output_file: str | Path):
+        """
+        Copy a solver output file into the cache, evicting old entries
+        if the cache exceeds its budget.
+        """
+        size = os.path.getsize(output_file)
+        if size > self.max_bytes:
+            return
+
+        # copy under a temporary name first so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(output_file, tmp)
+        os.replace(tmp, self._file(key))
+
+        with self._lock:
+            self._index[key] = dict(size=size, last_access=time.time())
+            self._evict()
+            self._save_index()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(e["size"] for e in self._index.values())
+
+    def __contains__(self, key: str):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def _file(self, key: str) -> Path:
+        return self.path / (key + ".h5")
+
+    def _remove(self, key: str):
+        del self._index[key]
+        self._file(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        total = self.size_bytes
+        lru = sorted(self._index, key=lambda k: self._index[k]["last_access"])
+        for key in lru:
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key]["size"]
+            self._remove(key)
+
+    def _save_index(self):
+        tmp = self.path / (self.index_name + ".tmp")
+        with open(tmp, "w") as fp:
+            json.dump(self._index, fp)
+        os.replace(tmp, self.path / self.index_name)
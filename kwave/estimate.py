@@ -0,0 +1,263 @@
+"""
+Pre-launch estimates of the resources a simulation needs.
+
+`estimate` predicts the peak memory of the solver, the size of the input and
+output files and the run time from the grid shape (including the PML), the
+`SimulationFlags`, the medium (homogeneous or heterogeneous) and the
+recorded outputs, without running anything:
+
+    est = kwave.estimate(inp, outputs=kwave.SolverOptions(p_max_all=True))
+    print(est.memory_bytes / 2**30, "GiB", est.runtime, "s")
+
+The coefficients of the model live in `EstimateModel`. The defaults are
+rough figures for the CUDA binary; fit them to a machine with
+`EstimateModel.calibrate` from the `RunMetrics` of measured runs.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Iterable
+
+import numpy as np
+
+from kwave.h5input import H5Input
+from kwave.monitor import RunMetrics
+from kwave.solver_options import SolverOptions
+
+__all__ = ("ResourceEstimate", "EstimateModel", "estimate")
+
+
+@dataclass
+class ResourceEstimate:
+    """Predicted resources of one simulation"""
+
+    memory_bytes: int  # peak solver memory
+    input_bytes: int  # input file size
+    output_bytes: int  # output file size
+    runtime: float  # wall time [s]
+    grid_points: int
+    time_steps: int
+
+
+@dataclass
+class EstimateModel:
+    """
+    Coefficients of the resource model.
+
+    memory_overhead:
+        Fixed memory of the solver process (runtime, FFT plans, CUDA context).
+    memory_scale:
+        Factor applied to the memory of the solver's matrices.
+    runtime_overhead:
+        Fixed run time (start up, reading the input, writing the output) [s].
+    fft_time:
+        Time per FFT point and log2 of the FFT size [s]. Each time step costs
+        `fft_time * n_ffts * N * log2(N)` for N grid points.
+    """
+
+    memory_overhead: int = 256 * 2**20
+    memory_scale: float = 1.0
+    runtime_overhead: float = 2.0
+    fft_time: float = 1.5e-12
+
+    @classmethod
+    def calibrate(
+        cls,
+        runs: Iterable[tuple[H5Input, SolverOptions | None, RunMetrics]],
+    ) -> EstimateModel:
+        """
+        Fit the model to measured runs, given as (input, options, metrics)
+        tuples (e.g. the metrics passed to the `kspaceFirstOrder` callback).
+
+        With runs of at least two different sizes the overheads and the
+        scales are fitted by least squares; otherwise only the scales are
+        fitted and the default overheads are kept.
+        """
+        base = cls()
+        mem_x, mem_y, time_x, time_y = [], [], [], []
+        for inp, options, metrics in runs:
+            parts = _model_parts(inp, options)
+            if metrics.peak_rss_bytes:
+                mem_x.append(parts["matrix_bytes"])
+                mem_y.append(metrics.peak_rss_bytes)
+            if metrics.wall_time:
+                time_x.append(parts["fft_work"])
+                time_y.append(metrics.wall_time)
+
+        memory_overhead, memory_scale = _fit_line(
+            mem_x, mem_y, base.memory_overhead, base.memory_scale
+        )
+        runtime_overhead, fft_time = _fit_line(
+            time_x, time_y, base.runtime_overhead, base.fft_time
+        )
+        return cls(
+            memory_overhead=int(memory_overhead),
+            memory_scale=memory_scale,
+            runtime_overhead=runtime_overhead,
+            fft_time=fft_time,
+        )
+
+
+def _fit_line(x, y, intercept, slope) -> tuple[float, float]:
+    """Fit y = intercept + slope * x, keeping the defaults if underdetermined"""
+    if not x:
+        return intercept, slope
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(np.unique(x)) >= 2:
+        A = np.stack([np.ones_like(x), x], axis=1)
+        (b, a), *_ = np.linalg.lstsq(A, y, rcond=None)
+        if b >= 0 and a > 0:
+            return float(b), float(a)
+    # fit the slope only
+    a = np.sum(x * (y - intercept)) / np.sum(x * x)
+    return intercept, float(a) if a > 0 else slope
+
+
+def _is_field(val) -> bool:
+    """True for heterogeneous (grid sized) medium parameters"""
+    return val is not None and np.size(val) > 1
+
+
+def _options(outputs: SolverOptions | Iterable[str] | None) -> SolverOptions:
+    if outputs is None:
+        return SolverOptions()
+    if isinstance(outputs, SolverOptions):
+        return outputs
+    names = set(outputs)
+    flags = {f.name: f.name in names for f in fields(SolverOptions) if f.type == "bool"}
+    unknown = names - set(flags) - {"copy_sensor_mask"}
+    if unknown:
+        raise ValueError(f"Unknown outputs {sorted(unknown)}")
+    return SolverOptions(**flags)
+
+
+def _input_nbytes(d: object) -> int:
+    """Approximate size of the serialized input dataclass"""
+    nbytes = 0
+    for f in fields(d):
+        val = getattr(d, f.name)
+        if is_dataclass(val):
+            nbytes += _input_nbytes(val)
+        elif val is not None:
+            # float32 and uint64 datasets, 8 bytes is an upper bound
+            nbytes += 8 * np.size(val)
+    return nbytes
+
+
+def _output_nbytes(inp: H5Input, options: SolverOptions) -> int:
+    """Approximate size of the output file"""
+    ndims = len(inp.grid.shape)
+    n_grid = int(np.prod(inp.grid.shape))
+    n_sensor = inp.sensor.get_num_points()
+    n_steps = int(inp.grid.Nt) - options.start_index + 1
+
+    nbytes = 0
+    for name in options.recorded_fields(ndims):
+        if name.endswith(("_all", "_final")):
+            nbytes += 4 * n_grid
+        elif name.endswith(("_rms", "_max", "_min")):
+            nbytes += 4 * n_sensor
+        else:
+            nbytes += 4 * n_sensor * n_steps
+    return nbytes
+
+
+def _model_parts(inp: H5Input, options: SolverOptions | None) -> dict:
+    """
+    Memory of the solver's matrices and FFT work of the whole run, before
+    the model's coefficients are applied.
+
+    Follows the matrices allocated by kspaceFirstOrder-OMP/CUDA for a fluid
+    simulation: full grid float32 matrices, complex FFT buffers of the
+    reduced (real-to-complex) size, and the sensor buffers.
+    """
+    options = _options(options)
+    flags = inp.simulation_flags
+    medium = inp.medium
+    shape = inp.grid.shape
+    ndims = len(shape)
+    n_grid = int(np.prod(shape))
+    n_reduced = n_grid // shape[-1] * (shape[-1] // 2 + 1)
+    n_sensor = inp.sensor.get_num_points()
+    n_steps = int(inp.grid.Nt)
+
+    # full grid float32 matrices: p, u, rho (split), du (divergence), temps
+    n_real = 1 + 3 * ndims + 3
+    # complex FFT temps and the real k-space operators on the reduced grid
+    n_complex = 3
+    n_reduced_real = 1  # kappa
+    if _is_field(medium.c0):
+        n_real += 1
+    if _is_field(medium.rho0):
+        n_real += 1 + ndims  # rho0 and the staggered dt / rho0
+    if flags.absorbing_flag:
+        n_reduced_real += 2  # nabla1, nabla2
+        if _is_field(medium.alpha_coeff):
+            n_real += 2  # tau, eta
+    if flags.nonlinear_flag and _is_field(medium.BonA):
+        n_real += 1
+    if flags.p0_source_flag:
+        n_real += 1
+
+    recorded = options.recorded_fields(ndims)
+    n_real += sum(1 for name in recorded if name.endswith(("_all", "_final")))
+    if options.u_non_staggered_raw:
+        n_real += ndims
+
+    matrix_bytes = (
+        4 * n_real * n_grid
+        + 8 * n_complex * n_reduced
+        + 4 * n_reduced_real * n_reduced
+        # sensor index and one float32 buffer per sensor output
+        + 8 * n_sensor
+        + 4 * n_sensor * len(recorded)
+    )
+
+    # FFTs per time step: grad p (1 fwd + ndims inv), div u (ndims fwd + ndims
+    # inv), absorption (2 fwd + 2 inv)
+    n_ffts = 1 + 3 * ndims
+    if flags.absorbing_flag:
+        n_ffts += 4
+    if options.u_non_staggered_raw:
+        n_ffts += 2 * ndims
+    fft_work = n_ffts * n_grid * np.log2(max(n_grid, 2)) * n_steps
+
+    return dict(
+        matrix_bytes=matrix_bytes,
+        fft_work=fft_work,
+        input_bytes=_input_nbytes(inp),
+        output_bytes=_output_nbytes(inp, options),
+        grid_points=n_grid,
+        time_steps=n_steps,
+    )
+
+
+def estimate(
+    inp: H5Input,
+    outputs: SolverOptions | Iterable[str] | None = None,
+    model: EstimateModel | None = None,
+) -> ResourceEstimate:
+    """
+    Predict the peak memory, file sizes and run time of a simulation.
+
+    inp:
+        The simulation input. The grid includes the PML.
+    outputs:
+        `SolverOptions` or output flag names (e.g. ["p_raw", "p_max_all"]).
+        Default: record the raw pressure only.
+    model:
+        Model coefficients, e.g. from `EstimateModel.calibrate`.
+    """
+    if model is None:
+        model = EstimateModel()
+    parts = _model_parts(inp, outputs)
+    return ResourceEstimate(
+        memory_bytes=int(
+            model.memory_overhead + model.memory_scale * parts["matrix_bytes"]
+        ),
+        input_bytes=parts["input_bytes"],
+        output_bytes=parts["output_bytes"],
+        runtime=float(model.runtime_overhead + model.fft_time * parts["fft_work"]),
+        grid_points=parts["grid_points"],
+        time_steps=parts["time_steps"],
+    )
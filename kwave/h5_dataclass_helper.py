@@ -1,11 +1,20 @@
 from __future__ import annotations
+import io
+import os
+import time
+import tempfile
 import types
+import functools
+import hashlib
 import getpass
 import platform
 import typing
 import importlib.metadata
+import shutil
+import weakref
 from datetime import datetime
-from dataclasses import dataclass, is_dataclass
+from dataclasses import dataclass, field, is_dataclass, replace
+from pathlib import Path
 from datetime import datetime
 import h5py
 import numpy as np
@@ -80,26 +89,281 @@ def get_call_type(tp):
             return tp
 
 
+ShapeSpec = tuple[typing.Union[int, str], ...]
+
+
+class FieldPlan(typing.NamedTuple):
+    """
+    Serialization plan of one dataclass field, compiled from its annotation.
+
+    nested:      dataclass type of a nested dataclass field (other entries unused)
+    dtype:       annotated dtype (e.g. np.float32)
+    optional:    the field may be None
+    attrs:       HDF5 dataset attributes (`DatasetAttrs`)
+    shapes:      allowed (3D) dataset shapes
+    conditional: (condition, shape) pairs; the shape is allowed when
+                 condition(instance) is true
+    """
+
+    name: str
+    nested: type | None = None
+    dtype: type | None = None
+    optional: bool = False
+    attrs: DatasetAttrs | None = None
+    shapes: tuple[ShapeSpec, ...] = ((1, 1, 1),)
+    conditional: tuple[tuple[typing.Callable[[object], bool], ShapeSpec], ...] = ()
+
+    def allowed_shapes(self, d: object) -> tuple[ShapeSpec, ...]:
+        """Allowed shapes for the field of instance `d`"""
+        if not self.conditional:
+            return self.shapes
+        return self.shapes + tuple(shape for cond, shape in self.conditional if cond(d))
+
+
+def _compile_field(name: str, anno) -> FieldPlan:
+    if is_dataclass(anno):
+        return FieldPlan(name, nested=anno)
+
+    dtype = get_call_type(anno)
+    optional = is_optional(anno)
+    if typing.get_origin(anno) is not typing.Annotated:
+        return FieldPlan(name, dtype=dtype, optional=optional)
+
+    attrs, *shape_meta = anno.__metadata__
+    shapes, conditional = [], []
+    for meta in shape_meta:
+        if isinstance(meta, list):
+            # [(condition, shape), ...]
+            conditional += [(cond, tuple(shape)) for cond, shape in meta]
+        else:
+            shapes.append(tuple(meta))
+    if not shapes and not conditional:
+        shapes = [(1, 1, 1)]
+    return FieldPlan(
+        name,
+        dtype=dtype,
+        optional=optional,
+        attrs=attrs,
+        shapes=tuple(shapes),
+        conditional=tuple(conditional),
+    )
+
+
+@functools.cache
+def get_field_plan(dclass: type) -> tuple[FieldPlan, ...]:
+    """
+    Serialization plan of a dataclass, compiled once per class from its
+    type hints and cached.
+    """
+    hints = typing.get_type_hints(dclass, include_extras=True)
+    return tuple(_compile_field(name, anno) for name, anno in hints.items())
+
+
+class LazyDataset:
+    """
+    Array-like proxy for an HDF5 dataset that reads on access.
+
+    Contiguous, unfiltered datasets are mapped zero-copy with `np.memmap`.
+    Other layouts are read with h5py, so slicing the proxy
+    (e.g. `p[0, t0:t1, sensors]`) only reads that hyperslab.
+    `np.asarray(proxy)` reads the whole dataset.
+
+    With `transpose=True` the proxy presents the dataset with its axes
+    reversed (e.g. the (Cx, Cy, Cz, Nt) order of the k-Wave manual for
+    cuboid outputs stored as (Nt, Cz, Cy, Cx)), still without copies.
+
+    Proxies returned by `kspaceFirstOrder(..., lazy=True)` own the run's
+    output file: it is removed once the last proxy of the run is garbage
+    collected, or by `close()` on any of them.
+    """
+
+    def __init__(self, dset: h5py.Dataset, transpose: bool = False):
+        self.filename = dset.file.filename
+        self.name = dset.name
+        self.transpose = transpose
+        self.shape = dset.shape[::-1] if transpose else dset.shape
+        self.dtype = dset.dtype
+        # reopen the file with the same chunk cache
+        _, nslots, nbytes, w0 = dset.file.id.get_access_plist().get_cache()
+        self._file_kwargs = dict(rdcc_nslots=nslots, rdcc_nbytes=nbytes, rdcc_w0=w0)
+
+        self._offset = None
+        if dset.chunks is None and dset.compression is None and dset.size:
+            self._offset = dset.id.get_offset()
+        self._memmap = None
+        self._lease = None
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return f"LazyDataset({self.filename!r}, {self.name!r}, shape={self.shape}, dtype={self.dtype})"
+
+    @property
+    def T(self) -> LazyDataset:
+        """Proxy with the axes reversed"""
+        other = object.__new__(LazyDataset)
+        other.__dict__.update(self.__dict__)
+        other.transpose = not self.transpose
+        other.shape = self.shape[::-1]
+        other._memmap = None
+        return other
+
+    @property
+    def is_memmap(self):
+        return self._offset is not None
+
+    def _get_memmap(self) -> np.memmap:
+        if self._memmap is None:
+            mm = np.memmap(
+                self.filename,
+                dtype=self.dtype,
+                mode="r",
+                offset=self._offset,
+                shape=self.shape[::-1] if self.transpose else self.shape,
+            )
+            self._memmap = mm.T if self.transpose else mm
+        return self._memmap
+
+    def __getitem__(self, idx):
+        if self.is_memmap:
+            return self._get_memmap()[idx]
+        if self.transpose:
+            # index the stored axes in reverse and reverse the result
+            if not isinstance(idx, tuple):
+                idx = (idx,)
+            if any(i is Ellipsis for i in idx):
+                k = idx.index(Ellipsis)
+                fill = (slice(None),) * (self.ndim - len(idx) + 1)
+                idx = idx[:k] + fill + idx[k + 1 :]
+            idx = idx + (slice(None),) * (self.ndim - len(idx))
+        with h5py.File(self.filename, "r", **self._file_kwargs) as f:
+            if self.transpose:
+                return np.asarray(f[self.name][idx[::-1]]).T
+            return f[self.name][idx]
+
+    def __array__(self, dtype=None, copy=None):
+        if self.is_memmap:
+            arr = self._get_memmap()
+        else:
+            arr = self[()]
+        if dtype is not None:
+            arr = arr.astype(dtype, copy=False)
+        return arr
+
+    def read(self) -> np.ndarray:
+        """Read the whole dataset into memory"""
+        return np.array(self[()])
+
+    def close(self):
+        """
+        Release the file. If the proxy owns a run's output file, the file
+        is removed and all proxies of that run become invalid.
+        """
+        self._memmap = None
+        if self._lease is not None:
+            self._lease.close()
+
+
+def _remove_paths(paths: tuple[Path, ...]):
+    for path in paths:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+class _FileLease:
+    """
+    Removes `paths` once it is garbage collected (i.e. when no
+    `LazyDataset` holding it is left) or closed.
+    """
+
+    def __init__(self, *paths: Path):
+        self._finalizer = weakref.finalize(self, _remove_paths, paths)
+
+    def close(self):
+        self._finalizer()
+
+
+def _lazy_datasets(d: object) -> list[LazyDataset]:
+    """The `LazyDataset` fields (and cuboid lists of them) of a dataclass"""
+    res = []
+    for plan in get_field_plan(d.__class__):
+        val = getattr(d, plan.name)
+        if plan.nested is not None and val is not None:
+            res += _lazy_datasets(val)
+        elif isinstance(val, LazyDataset):
+            res.append(val)
+        elif isinstance(val, list):
+            res += [v for v in val if isinstance(v, LazyDataset)]
+    return res
+
+
+def release_with(d: object, *paths: Path) -> bool:
+    """
+    Tie the lifetime of `paths` (files or directories) to the `LazyDataset`
+    fields of the dataclass `d`: they are removed once all of them are
+    released (see `LazyDataset.close`). Returns False, without removing
+    anything, if `d` holds no proxies.
+    """
+    proxies = _lazy_datasets(d)
+    if not proxies:
+        return False
+    lease = _FileLease(*paths)
+    for proxy in proxies:
+        proxy._lease = lease
+    return True
+
+
 DClass = typing.TypeVar("DClass")
 
 
-def deserialize_from_hdf5(dclass: type[DClass], f: h5py.File, verbose=False) -> DClass:
+def deserialize_from_hdf5(
+    dclass: type[DClass],
+    f: h5py.File,
+    verbose=False,
+    skip: typing.Container[str] = (),
+    lazy: bool = False,
+) -> DClass:
     """
     Deserialize an input HDF5 file to a dataclass.
+
+    Datasets named in `skip` are not read and their fields are left as None.
+    With `lazy=True`, array datasets are returned as `LazyDataset` proxies
+    that read from the file on access, so the file must outlive them.
+
+    Groups of numbered datasets (the outputs of cuboid sensor masks,
+    e.g. p/1, p/2, ...) are returned as a list with one array per cuboid,
+    with the axes reversed to the (Cx, Cy, Cz, Nt) order of the k-Wave
+    manual. These are views (or transposed proxies), not copies.
     """
     if verbose:
         print("Parsing ", dclass)
 
     d = {}
-    for key, anno in typing.get_type_hints(dclass).items():
-        if is_dataclass(anno):
-            d[key] = deserialize_from_hdf5(anno, f, verbose)
+    for plan in get_field_plan(dclass):
+        key = plan.name
+        if plan.nested is not None:
+            d[key] = deserialize_from_hdf5(plan.nested, f, verbose, skip, lazy)
+        elif key in skip:
+            d[key] = None
         else:
-            dtype: type = get_call_type(anno)
+            dtype: type = plan.dtype
 
             h5val: h5py.Dataset = f.get(key)
             if h5val is None:
                 pass
+            elif isinstance(h5val, h5py.Group):
+                h5val = _read_cuboids(h5val, lazy)
             elif h5val.shape == (1, 1, 1):
                 # Shape (1, 1, 1) represents a single value
                 h5val = h5val[0][0][0]
@@ -107,6 +371,12 @@ def deserialize_from_hdf5(dclass: type[DClass], f: h5py.File, verbose=False) ->
                     print(
                         f"WARNING: {key=} has type {type(h5val)}, different from annotated {dtype}."
                     )
+            elif lazy:
+                h5val = LazyDataset(h5val)
+                if dtype != h5val.dtype:
+                    print(
+                        f"WARNING: {key=} has type {h5val.dtype}, different from annotated {dtype}."
+                    )
             else:
                 # Some other shape. Make a numpy array copy
                 h5val = h5val[:]
@@ -123,6 +393,82 @@ def deserialize_from_hdf5(dclass: type[DClass], f: h5py.File, verbose=False) ->
     return dclass(**d)
 
 
+@dataclass
+class StorageOptions:
+    """
+    HDF5 storage layout of the datasets written by `serialize_to_hdf5`.
+
+    compression:
+        None, "gzip" or "lzf". The k-Wave binaries read gzip (deflate)
+        compressed inputs; "lzf" is an h5py filter only Python can read.
+    compression_opts:
+        gzip level, 0-9 (default 4).
+    shuffle:
+        Byte shuffle before compression (helps smooth float data).
+    chunks:
+        Chunk shape (clipped to the dataset shape), True for a shape chosen
+        by h5py, or None for contiguous datasets unless a filter is enabled.
+    min_size:
+        Datasets with fewer elements are written contiguous and unfiltered.
+    chunk_cache_bytes:
+        Chunk cache size (rdcc_nbytes) to open files with, see `file_kwargs`.
+    fields:
+        Per field options replacing these ones,
+        e.g. {"p0_source_input": StorageOptions(compression="gzip")}.
+    """
+
+    compression: str | None = None
+    compression_opts: int | None = None
+    shuffle: bool = False
+    chunks: tuple[int, ...] | bool | None = None
+    min_size: int = 4096
+    chunk_cache_bytes: int | None = None
+    fields: dict[str, StorageOptions] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.compression not in (None, "gzip", "lzf"):
+            raise ValueError(f"Unknown compression {self.compression!r}")
+
+    def dataset_kwargs(self, key: str, shape: tuple[int, ...]) -> dict:
+        """Keyword arguments for `h5py.Group.create_dataset` of field `key`"""
+        opts = self.fields.get(key, self)
+        if int(np.prod(shape)) < opts.min_size:
+            return {}
+
+        kwargs = {}
+        if opts.compression is not None:
+            kwargs["compression"] = opts.compression
+            if opts.compression == "gzip":
+                level = opts.compression_opts
+                kwargs["compression_opts"] = 4 if level is None else level
+        if opts.shuffle:
+            kwargs["shuffle"] = True
+
+        chunks = opts.chunks
+        if chunks is None and kwargs:
+            chunks = True  # filters require a chunked layout
+        if isinstance(chunks, tuple):
+            chunks = tuple(min(c, n) for c, n in zip(chunks, shape))
+        if chunks:
+            kwargs["chunks"] = chunks
+        return kwargs
+
+    def file_kwargs(self) -> dict:
+        """Keyword arguments for `h5py.File`"""
+        if self.chunk_cache_bytes is None:
+            return {}
+        return dict(rdcc_nbytes=self.chunk_cache_bytes)
+
+
+def _read_cuboids(group: h5py.Group, lazy: bool) -> list:
+    """Datasets "1", "2", ... of a group, with their axes reversed"""
+    res = []
+    for i in range(1, len(group) + 1):
+        dset = group[str(i)]
+        res.append(LazyDataset(dset, transpose=True) if lazy else dset[()].T)
+    return res
+
+
 def _match_shape(s1: tuple[int, int, int], s2: tuple[int | str, int | str, int | str]):
     if len(s1) != len(s2):
         return False
@@ -139,62 +485,433 @@ def _check_shape_correct(
     return any(_match_shape(actual_shape, s) for s in anno_shapes)
 
 
-def serialize_to_hdf5(d: object, f: h5py.File, verbose=False, _entry=True):
+# bytes converted and written at a time by the streaming serializer
+_SLAB_BYTES = 64 * 2**20
+
+
+def _iter_slabs(val: np.ndarray, dtype, max_bytes: int | None = None):
+    """
+    Yield (index, block) pairs that cover `val` in C order, each block a
+    contiguous copy converted to `dtype` of at most about `max_bytes`.
+    Works on memmaps and non-contiguous views without reading or copying
+    the whole array at once.
+    """
+    if max_bytes is None:
+        max_bytes = _SLAB_BYTES
+    shape = val.shape
+    # slice along the first non-singleton axis so the blocks are in C order
+    axis = next((i for i, n in enumerate(shape) if n > 1), 0)
+    row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape[axis + 1 :]))
+    step = max(1, max_bytes // max(row_bytes, 1))
+    for start in range(0, shape[axis], step):
+        idx = (slice(None),) * axis + (slice(start, start + step),)
+        yield idx, np.ascontiguousarray(val[idx], dtype=dtype)
+
+
+def _is_uniform(val: np.ndarray, dtype) -> bool:
+    """True if all elements of `val` are equal once converted to `dtype`"""
+    flat = val.ravel(order="K") if val.flags.forc else None
+    first = np.asarray(val.flat[0], dtype=dtype)
+    # cheap rejection of heterogeneous arrays from a few samples
+    if flat is not None:
+        samples = flat[:: max(1, flat.size // 64)]
+        if not np.all(samples.astype(dtype) == first):
+            return False
+    return all(np.all(block == first) for _, block in _iter_slabs(val, dtype))
+
+
+def collapse_uniform(d: DClass) -> tuple[DClass, list[str]]:
+    """
+    Replace uniform arrays by single values in fields that may be stored
+    as a (1, 1, 1) scalar (e.g. `Medium.rho0` that is 1000 everywhere).
+
+    Returns a copy of `d` (arrays are shared, not copied) and the names of
+    the collapsed fields. Fields listed together in a class's
+    `_uniform_groups` are only collapsed if all of them are uniform, as
+    the solver decides on the first one if the others are scalars.
+    """
+    changes = {}
+    collapsed = []
+    for plan in get_field_plan(d.__class__):
+        val = getattr(d, plan.name)
+        if plan.nested is not None:
+            new, names = collapse_uniform(val)
+            if names:
+                changes[plan.name] = new
+                collapsed += names
+        elif (
+            val is not None
+            and (1, 1, 1) in plan.shapes
+            and np.size(val) > 1
+            and _is_uniform(np.asanyarray(val), plan.dtype)
+        ):
+            changes[plan.name] = plan.dtype(np.asanyarray(val).flat[0])
+
+    for group in getattr(d, "_uniform_groups", ()):
+        if not all(
+            getattr(d, k) is None or k in changes or np.size(getattr(d, k)) == 1
+            for k in group
+        ):
+            for k in group:
+                changes.pop(k, None)
+
+    if not changes:
+        return d, collapsed
+    collapsed += [k for k in changes if not is_dataclass(changes[k])]
+    return replace(d, **changes), collapsed
+
+
+def _normalize_field(d: object, plan: FieldPlan, val, verbose=False) -> np.ndarray:
+    """
+    Value of field `plan` of `d` as an array of at least 3 dimensions
+    (a view where possible), checked against the annotated shapes.
+    """
+    key, dtype = plan.name, plan.dtype
+    if verbose:
+        print("--", key, dtype, plan.attrs, plan.shapes)
+
+    ## Check type
+    if isinstance(val, (int, float, np.number)):
+        # single value
+        val = dtype(val)
+        val = np.expand_dims(val, (0, 1, 2))
+    else:
+        val = np.asanyarray(val)
+        if val.dtype != dtype:
+            print(
+                f"Warning: Type of {key} is {val.dtype}, but annotated {dtype}. Casting..."
+            )
+
+    ## Check shape
+    if val.ndim < 3:
+        # a view, also for memmaps and non-contiguous arrays
+        val = val.reshape((1,) * (3 - val.ndim) + val.shape)
+
+    anno_shapes = plan.allowed_shapes(d)
+    if not _check_shape_correct(val.shape, anno_shapes):
+        raise ValueError(f"Shape mismatch {key}: {val.shape=}, {anno_shapes=}")
+    return val
+
+
+def _hash_value(val: np.ndarray, dtype, h):
+    """Feed the dtype, shape and data of a (3D) value into `h`"""
+    h.update(str((np.dtype(dtype).str, val.shape)).encode())
+    for _, block in _iter_slabs(val, dtype):
+        h.update(memoryview(block).cast("B"))
+
+
+def _fingerprint(val: np.ndarray, dtype) -> np.bytes_:
+    h = hashlib.sha256()
+    _hash_value(val, dtype, h)
+    return _b(h.hexdigest())
+
+
+def _write_field(
+    f: h5py.File,
+    plan: FieldPlan,
+    val: np.ndarray,
+    storage: StorageOptions | None = None,
+    fingerprint: np.bytes_ | None = None,
+    hash_data: bool = False,
+) -> np.bytes_ | None:
+    """
+    Write a normalized field value. With `hash_data=True`, its fingerprint
+    is computed from the slabs as they are written and stored with it.
+    """
+    key, dtype = plan.name, plan.dtype
+    dset = f.get(key)
+    if dset is not None and (dset.shape != val.shape or dset.dtype != dtype):
+        del f[key]
+        dset = None
+    if dset is None:
+        kwargs = {} if storage is None else storage.dataset_kwargs(key, val.shape)
+        dset = f.create_dataset(key, shape=val.shape, dtype=dtype, **kwargs)
+
+    h = None
+    if hash_data:
+        h = hashlib.sha256()
+        h.update(str((np.dtype(dtype).str, val.shape)).encode())
+    for idx, block in _iter_slabs(val, dtype):
+        dset[idx] = block
+        if h is not None:
+            h.update(memoryview(block).cast("B"))
+    if h is not None:
+        fingerprint = _b(h.hexdigest())
+    if plan.attrs is not None:
+        for attr_k, attr_v in zip(plan.attrs._fields, plan.attrs):
+            dset.attrs[attr_k] = attr_v
+    if fingerprint is not None:
+        dset.attrs[_FINGERPRINT_ATTR] = fingerprint
+    return fingerprint
+
+
+# dataset attribute holding the content fingerprint used by `update_hdf5`
+_FINGERPRINT_ATTR = "kwave_fingerprint"
+
+
+def serialize_to_hdf5(
+    d: object,
+    f: h5py.File,
+    verbose=False,
+    storage: StorageOptions | None = None,
+    collapse: bool = False,
+    fingerprints: bool = False,
+    links: typing.Mapping[str, str] | None = None,
+    _entry=True,
+) -> list[str]:
     """
     Serialize a dataclass to an HDF5 file.
+
+    `storage` sets the chunking and compression of the datasets
+    (default: contiguous, unfiltered).
+
+    With `collapse=True`, uniform arrays are stored as single values where
+    the format allows it (see `collapse_uniform`). Returns the names of the
+    collapsed fields.
+
+    With `fingerprints=True`, a content hash is stored with every dataset so
+    `update_hdf5` can later skip the unchanged ones.
+
+    Fields named in `links` ({name: file}) are not written but stored as
+    HDF5 external links to the dataset of the same name in that file
+    (see `InputTemplate`).
+
+    Arrays are written slab by slab, converting each slab to the annotated
+    dtype, so e.g. a float64 memmap is never copied whole into memory.
     """
+    collapsed = []
     if _entry:
         for k, v in make_input_file_attrs().items():
             f.attrs[k] = v
+        if collapse:
+            d, collapsed = collapse_uniform(d)
 
-    for key, anno in typing.get_type_hints(d.__class__, include_extras=True).items():
+    for plan in get_field_plan(d.__class__):
+        key = plan.name
         val = getattr(d, key)
 
-        if is_dataclass(anno):
+        if plan.nested is not None:
             if verbose:
                 print(d.__class__)
-            serialize_to_hdf5(val, f, verbose, _entry=False)
+            serialize_to_hdf5(
+                val,
+                f,
+                verbose,
+                storage,
+                fingerprints=fingerprints,
+                links=links,
+                _entry=False,
+            )
+            continue
+
+        if links and key in links:
+            f[key] = h5py.ExternalLink(str(links[key]), "/" + key)
             continue
 
         # If value is None and annotation marked optional, skip
         if val is None:
-            if is_optional(anno):
+            if plan.optional:
                 continue
             raise ValueError(f"Missing required data '{key}' in {d.__class__}")
 
         # Regular data
-        ## Get annotated dtype
-        dtype = get_call_type(anno)
-        if verbose:
-            print("--", key, dtype, anno.__metadata__)
-
-        ## Get annotated shape
-        meta_attrs = anno.__metadata__[0]
-        anno_shapes = ((1, 1, 1),)
-        if len(anno.__metadata__) > 1:
-            anno_shapes = anno.__metadata__[1:]
-
-        ## Check type
-        if isinstance(val, (int, float, np.number)):
-            # single value
-            val = dtype(val)
-            val = np.expand_dims(val, (0, 1, 2))
+        val = _normalize_field(d, plan, val, verbose)
+        _write_field(f, plan, val, storage, hash_data=fingerprints)
+
+    return collapsed
+
+
+def update_hdf5(
+    d: object,
+    f: h5py.File,
+    verbose=False,
+    storage: StorageOptions | None = None,
+    unchanged: typing.Container[str] = (),
+) -> list[str]:
+    """
+    Update a file written by `serialize_to_hdf5` (opened with mode "r+")
+    to hold the dataclass `d`, rewriting only the datasets whose content
+    fingerprint changed. Datasets without a fingerprint, or of a different
+    shape or dtype, are rewritten without comparing.
+
+    Fields named in `unchanged` are neither hashed nor rewritten if the
+    file holds them.
+
+    Datasets of the same shape and dtype are overwritten in place so the
+    file does not grow; `storage` applies to newly created datasets.
+    Returns the names of the rewritten (or removed) datasets.
+    """
+    updated = []
+    for plan in get_field_plan(d.__class__):
+        key = plan.name
+        val = getattr(d, key)
+
+        if plan.nested is not None:
+            updated += update_hdf5(val, f, verbose, storage, unchanged)
+            continue
+        if key in unchanged and key in f:
+            continue
+
+        if val is None:
+            if not plan.optional:
+                raise ValueError(f"Missing required data '{key}' in {d.__class__}")
+            if key in f:
+                del f[key]
+                updated.append(key)
+            continue
+
+        val = _normalize_field(d, plan, val, verbose)
+        dset = f.get(key)
+        stored = None if dset is None else dset.attrs.get(_FINGERPRINT_ATTR)
+        if stored is not None and dset.shape == val.shape and dset.dtype == plan.dtype:
+            fingerprint = _fingerprint(val, plan.dtype)
+            if stored == fingerprint:
+                continue
+            _write_field(f, plan, val, storage, fingerprint)
         else:
-            if val.dtype != dtype:
-                print(
-                    f"Warning: Type of {key} is {val.dtype}, but annotated {dtype}. Casting..."
-                )
-                val = val.astype(dtype)
-
-        ## Check shape
-        if len(val.shape) == 1:
-            val = np.expand_dims(val, (0, 1))
-        elif len(val.shape) == 2:
-            val = np.expand_dims(val, 0)
-
-        if not _check_shape_correct(val.shape, anno_shapes):
-            raise ValueError(f"Shape mismatch {val.shape=}, {anno_shapes=}")
-
-        dset = f.create_dataset(key, data=val)
-        for attr_k, attr_v in zip(meta_attrs._fields, meta_attrs):
-            dset.attrs[attr_k] = attr_v
+            _write_field(f, plan, val, storage, hash_data=True)
+        updated.append(key)
+
+    return updated
+
+
+class InputTemplate:
+    """
+    HDF5 file with the datasets shared by the inputs of a sweep, e.g. a
+    large heterogeneous medium and the PML.
+
+        template = InputTemplate("sweep/template.h5", medium, pml)
+        for source in sources:
+            kwave.kspaceFirstOrder(..., medium=medium, pml=pml, source=source,
+                                   template=template)
+
+    The parts are written once, with uniform arrays collapsed to single
+    values (see `collapse_uniform`). Inputs whose parts are equal to the
+    template's, once collapsed the same way, then reference its datasets
+    through HDF5 external links (absolute paths, resolved by the HDF5
+    library, so the solver binaries read them as usual) and only contain
+    their own data.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *parts: object,
+        storage: StorageOptions | None = None,
+    ):
+        self.path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        parts = [collapse_uniform(p)[0] for p in parts]
+        self._hashes = {type(p): hash_dataclass(p).digest() for p in parts}
+        self._keys = {}
+        with h5py.File(self.path, "w") as f:
+            for k, v in make_input_file_attrs().items():
+                f.attrs[k] = v
+            for part in parts:
+                before = set(f)
+                serialize_to_hdf5(part, f, storage=storage, _entry=False)
+                self._keys[type(part)] = set(f) - before
+
+    def matches(self, part: object) -> bool:
+        """True if `part` has the same content as the template's"""
+        cls = type(part)
+        if cls not in self._hashes:
+            return False
+        # compare the content even for the template's own part, whose arrays
+        # may have been modified in place since
+        part = collapse_uniform(part)[0]
+        return hash_dataclass(part).digest() == self._hashes[cls]
+
+    def links(self, d: object) -> dict[str, str]:
+        """
+        External links ({dataset name: template file}) for the parts of the
+        dataclass `d` that match the template.
+        """
+        links = {}
+        for plan in get_field_plan(d.__class__):
+            val = getattr(d, plan.name)
+            if plan.nested is not None and self.matches(val):
+                links.update(dict.fromkeys(self._keys[type(val)], str(self.path)))
+        return links
+
+
+def serialize_to_bytes(
+    d: object, verbose=False, storage: StorageOptions | None = None
+) -> bytes:
+    """
+    Serialize a dataclass to an HDF5 file image in memory (h5py core driver),
+    without touching the filesystem.
+    """
+    with h5py.File(f"kwave-{id(d)}.h5", "w", driver="core", backing_store=False) as f:
+        serialize_to_hdf5(d, f, verbose, storage)
+        f.flush()
+        return f.id.get_file_image()
+
+
+def deserialize_from_bytes(dclass: type[DClass], data: bytes, **kwargs) -> DClass:
+    """
+    Deserialize a dataclass from an HDF5 file image (see `serialize_to_bytes`).
+    """
+    with h5py.File(io.BytesIO(data), "r") as f:
+        return deserialize_from_hdf5(dclass, f, **kwargs)
+
+
+def hash_dataclass(d: object, h=None):
+    """
+    Feed the values of a dataclass into the hashlib object `h`
+    (default: a new sha256) and return `h`.
+
+    Values are normalized the same way `serialize_to_hdf5` writes them
+    (cast to the annotated dtype, at least 3 dimensions), so two inputs that
+    produce the same HDF5 datasets produce the same hash.
+    """
+    if h is None:
+        h = hashlib.sha256()
+
+    for plan in get_field_plan(d.__class__):
+        key = plan.name
+        val = getattr(d, key)
+
+        if plan.nested is not None:
+            hash_dataclass(val, h)
+            continue
+
+        h.update(key.encode())
+        if val is None:
+            h.update(b"None")
+            continue
+
+        val = np.asanyarray(val)
+        _hash_value(val.reshape((1,) * (3 - val.ndim) + val.shape), plan.dtype, h)
+
+    return h
+
+
+def benchmark_storage(
+    d: object,
+    settings: dict[str, StorageOptions | None],
+    path: str | Path | None = None,
+    repeat: int = 3,
+) -> list[dict]:
+    """
+    Write the dataclass `d` with each of the named storage `settings` and
+    report the best write time [s] and the file size [bytes] of each,
+    e.g. to choose the compression of inputs going over a shared filesystem.
+
+    Files are written to `path` (default: a temporary directory) and removed.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=path) as tmpdir:
+        fname = Path(tmpdir) / "benchmark.h5"
+        for name, storage in settings.items():
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                with h5py.File(fname, "w") as f:
+                    serialize_to_hdf5(d, f, storage=storage)
+                times.append(time.perf_counter() - t0)
+            results.append(
+                dict(name=name, write_time=min(times), file_size=os.path.getsize(fname))
+            )
+            fname.unlink()
+    return results
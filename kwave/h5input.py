@@ -8,6 +8,7 @@ Deserialization
 
 """
 from __future__ import annotations
+import typing
 from typing import Annotated
 import numpy as np
 from dataclasses import dataclass, field
@@ -102,12 +103,110 @@ class Grid:
     def t_array(self):
         return np.arange(self.Nt) * self.dt
 
-    def make_time(self, c: float, cfl=0.3, t_end=None):
+    @property
+    def spacing(self) -> tuple[float, ...]:
+        """Grid spacing in the order of `shape`"""
+        return (self.dz, self.dy, self.dx)[3 - len(self.shape) :]
+
+    def _points(self, geometry) -> np.ndarray:
+        """
+        Positions [m] of the points of a source or sensor, shape (n, ndims)
+        in the order of `shape`. `geometry` is a binary mask of the grid
+        shape, a `Sensor` (binary mask type) or a `Source`. None stands for
+        the whole grid, represented by its corners.
+        """
+        shape = self.shape
+        if geometry is None:
+            subs = np.array(np.meshgrid(*[(0, n - 1) for n in shape], indexing="ij"))
+            subs = subs.reshape(len(shape), -1)
+        else:
+            if isinstance(geometry, Sensor) and geometry.sensor_mask_type == 1:
+                index = np.flatnonzero(geometry.get_binary_mask(shape))
+            elif isinstance(geometry, Sensor):
+                index = np.ravel(geometry.sensor_mask_index)
+            elif isinstance(geometry, Source):
+                index = [
+                    np.ravel(i)
+                    for i in (geometry.p_source_index, geometry.u_source_index)
+                    if i is not None
+                ]
+                if geometry.p0_source_input is not None:
+                    index.append(np.flatnonzero(geometry.p0_source_input))
+                index = np.concatenate(index) if index else np.zeros(0)
+            else:
+                index = np.flatnonzero(np.reshape(geometry, shape))
+            if np.size(index) == 0:
+                raise ValueError("Source or sensor geometry has no points")
+            subs = np.array(np.unravel_index(np.asarray(index, dtype=np.intp), shape))
+        return subs.T * np.array(self.spacing)
+
+    @staticmethod
+    def _max_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        For every point in `a`, the distance to the farthest point in `b`.
+        For many points, an upper bound from the corners of the bounding
+        box of `b` is used instead.
+        """
+        if len(a) * len(b) <= 2**20:
+            return np.max(np.linalg.norm(a[:, None] - b[None], axis=-1), axis=1)
+        lo, hi = b.min(axis=0), b.max(axis=0)
+        far = np.where(np.abs(a - lo) > np.abs(a - hi), lo, hi)
+        return np.linalg.norm(a - far, axis=1)
+
+    def time_of_flight(self, c, source=None, sensor=None, round_trip=False) -> float:
+        """
+        Latest time [s] at which a wave from `source` can reach `sensor`,
+        an upper bound computed from the straight-line distances and the
+        minimum of the sound speed (map) `c`.
+
+        round_trip:
+            Latest time for a wave from `source` scattered anywhere in the
+            grid to reach `sensor` (pulse-echo imaging).
+
+        `source` and `sensor` are binary masks of the grid shape, `Source`
+        and `Sensor` objects or None for the whole grid.
+        """
+        c_min = np.min(c)
+        src = self._points(source)
+        sens = self._points(sensor)
+        if round_trip:
+            # the sum of the distances is convex in the scatterer position,
+            # so its maximum over the grid is at a corner
+            corners = self._points(None)
+            dist = self._max_distance(corners, src) + self._max_distance(corners, sens)
+        else:
+            dist = self._max_distance(src, sens)
+        return float(np.max(dist) / c_min)
+
+    def make_time(
+        self,
+        c: float,
+        cfl=0.3,
+        t_end=None,
+        source=None,
+        sensor=None,
+        round_trip=False,
+        t_extra=0.0,
+    ):
+        """
+        Set `dt` and `Nt` for the sound speed (map) `c`.
+
+        `dt` is the largest time step for the Courant number `cfl` at the
+        maximum sound speed. `Nt` is the smallest number of time steps that
+        covers `t_end`. Without `t_end`:
+          - if `source` or `sensor` is given, `t_end` is the latest arrival
+            (or round trip) time between them plus `t_extra`, e.g. the
+            source pulse length (see `time_of_flight`);
+          - otherwise, the time to cross the grid diagonal at the minimum
+            sound speed.
+        """
         c_max = np.max(c)
         c_min = np.min(c)
+        shape = self.shape
 
-        if t_end is None:
-            shape = self.shape
+        if t_end is None and (source is not None or sensor is not None):
+            t_end = self.time_of_flight(c, source, sensor, round_trip) + t_extra
+        elif t_end is None:
             match len(shape):
                 case 3:
                     t_end = (
@@ -118,18 +217,9 @@ class Grid:
                 case _:
                     t_end = self.x_size / c_min
 
-        min_grid_dim = 0.0
-        match len(shape):
-            case 3:
-                min_grid_dim = min(self.dx, self.dy, self.dz)
-            case 2:
-                min_grid_dim = min(self.dx, self.dy)
-            case _:
-                min_grid_dim = self.dx
+        self.dt = cfl * min(self.spacing) / c_max
 
-        self.dt = cfl * min_grid_dim / c_max
-
-        self.Nt = np.ceil(t_end / self.dt)
+        self.Nt = int(np.ceil(t_end / self.dt))
 
         if (np.floor(t_end / self.dt) != np.ceil(t_end / self.dt)) and np.remainder(
             t_end, self.dt
@@ -161,6 +251,9 @@ class Medium:
     alpha_coeff: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx"), (1, 1, 1)] = None
     alpha_power: FloatRealOptional = None
 
+    # the solver reads the staggered densities as scalars if rho0 is one
+    _uniform_groups = (("rho0", "rho0_sgx", "rho0_sgy", "rho0_sgz"),)
+
 
 @dataclass
 class Sensor:
@@ -184,16 +277,77 @@ class Sensor:
         sensor_mask_index = sensor_mask_index[np.newaxis, np.newaxis, :]
         return cls(sensor_mask_type=0, sensor_mask_index=sensor_mask_index)
 
-    # helper functions for sensor_mask_type == 0
+    @classmethod
+    def make_cuboid_sensor(
+        cls, corners: typing.Sequence[tuple[tuple[int, ...], tuple[int, ...]]]
+    ) -> Sensor:
+        """
+        Sensor recording on cuboids (sensor_mask_type == 1).
+
+        `corners` holds one (start, end) pair of opposing corners per
+        cuboid, given as inclusive indices into arrays of the grid shape
+        (`Grid.shape` order), e.g. ((z1, y1, x1), (z2, y2, x2)) in 3D or
+        ((y1, x1), (y2, x2)) in 2D. They are stored as k-Wave's 1-based
+        [x1, y1, z1, x2, y2, z2] columns.
+        """
+        columns = []
+        for start, end in corners:
+            if len(start) != len(end) or not 1 <= len(start) <= 3:
+                raise ValueError(f"Invalid cuboid corners {start}, {end}")
+            if any(a < 0 or a > b for a, b in zip(start, end)):
+                raise ValueError(f"Invalid cuboid corners {start}, {end}")
+            pad = (0,) * (3 - len(start))
+            xyz_start = (pad + tuple(start))[::-1]
+            xyz_end = (pad + tuple(end))[::-1]
+            columns.append([int(i) + 1 for i in xyz_start + xyz_end])
+        corners = np.array(columns, dtype=np.uint64).T[np.newaxis]
+        return cls(sensor_mask_type=1, sensor_mask_corners=corners)
+
+    # helper functions for sensor_mask_type == 1
+    def get_cuboid_corners(
+        self, ndims: int = 3
+    ) -> list[tuple[tuple[int, ...], tuple[int, ...]]]:
+        """
+        (start, end) corners of each cuboid as inclusive indices in
+        `Grid.shape` order for a grid with `ndims` dimensions
+        (the inverse of `make_cuboid_sensor`).
+        """
+        assert self.sensor_mask_type == 1
+        corners = np.asarray(self.sensor_mask_corners, dtype=np.int64).reshape(6, -1)
+        res = []
+        for col in corners.T - 1:
+            start = tuple(int(i) for i in col[2::-1])[3 - ndims :]
+            end = tuple(int(i) for i in col[:2:-1])[3 - ndims :]
+            res.append((start, end))
+        return res
+
+    def get_cuboid_slices(self, ndims: int = 3) -> list[tuple[slice, ...]]:
+        """Index expressions selecting each cuboid from a grid sized array"""
+        return [
+            tuple(slice(a, b + 1) for a, b in zip(start, end))
+            for start, end in self.get_cuboid_corners(ndims)
+        ]
+
+    def get_num_points(self) -> int:
+        """Number of recorded grid points (summed over cuboids)"""
+        if self.sensor_mask_type == 0:
+            return int(np.size(self.sensor_mask_index))
+        return sum(
+            int(np.prod([b - a + 1 for a, b in zip(start, end)]))
+            for start, end in self.get_cuboid_corners()
+        )
+
     def get_binary_mask(self, shape: tuple[int]):
+        mask = np.zeros(shape, dtype=np.uint8)
         if self.sensor_mask_type == 0:
-            indices = self.get_xy_sensor_mask_index(shape)
-            mask = np.zeros(shape, dtype=np.uint8)
-            mask[indices] = 1
-            return mask
+            index = np.ravel(self.sensor_mask_index).astype(np.intp)
+            mask[np.unravel_index(index, shape)] = 1
         else:
-            raise NotImplementedError()
+            for sl in self.get_cuboid_slices(len(shape)):
+                mask[sl] = 1
+        return mask
 
+    # helper functions for sensor_mask_type == 0
     def get_xy_sensor_mask_index(self, shape: tuple[int]):
         assert self.sensor_mask_type == 0
         assert len(shape) == 2
@@ -212,24 +366,24 @@ class Source:
     u_source_many: LongRealOptional = None
     u_source_index: Annotated[LongRealOptional, (1, 1, "Nsrc")] = None
     ux_source_input: Annotated[
-        LongRealOptional,
+        FloatRealOptional,
         [
-            (lambda self: self.sensor_mask_type == 0, (1, "Nt_src", 1)),
-            (lambda self: self.sensor_mask_type == 1, (1, "Nt_src", "Nsrc")),
+            (lambda self: self.u_source_many == 0, (1, "Nt_src", 1)),
+            (lambda self: self.u_source_many == 1, (1, "Nt_src", "Nsrc")),
         ],
     ] = None
     uy_source_input: Annotated[
-        LongRealOptional,
+        FloatRealOptional,
         [
-            (lambda self: self.sensor_mask_type == 0, (1, "Nt_src", 1)),
-            (lambda self: self.sensor_mask_type == 1, (1, "Nt_src", "Nsrc")),
+            (lambda self: self.u_source_many == 0, (1, "Nt_src", 1)),
+            (lambda self: self.u_source_many == 1, (1, "Nt_src", "Nsrc")),
         ],
     ] = None
     uz_source_input: Annotated[
-        LongRealOptional,
+        FloatRealOptional,
         [
-            (lambda self: self.sensor_mask_type == 0, (1, "Nt_src", 1)),
-            (lambda self: self.sensor_mask_type == 1, ("Nsrc", "Nt_src", 1)),
+            (lambda self: self.u_source_many == 0, (1, "Nt_src", 1)),
+            (lambda self: self.u_source_many == 1, (1, "Nt_src", "Nsrc")),
         ],
     ] = None
 
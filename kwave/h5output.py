@@ -48,45 +48,49 @@ class SimulationResults:
 
     # 5.1 Binary Sensor Mask (defined if sensor_mask_type = 0)
 
-    p: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")]  # -p or --p_raw
-    p_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --p_rms
-    p_max: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --p_max
-    p_min: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --p_min
-    p_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --p_max_all
-    p_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --p_min_all
-    p_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --p_final
-    ux: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")]  # -u or --u_raw
-    uy: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")]  # -u or --u_raw
-    uz: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")]  # -u or --u_raw
+    p: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")] = None  # -p or --p_raw
+    p_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --p_rms
+    p_max: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --p_max
+    p_min: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --p_min
+    p_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --p_max_all
+    p_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --p_min_all
+    p_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --p_final
+    ux: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")] = None  # -u or --u_raw
+    uy: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")] = None  # -u or --u_raw
+    uz: Annotated[FloatRealOptional, (1, "Nt-s+1", "Nsens")] = None  # -u or --u_raw
     ux_non_staggered: Annotated[
         FloatRealOptional, (1, "Nt-s+1", "Nsens")
-    ]  # --u_non_staggered
+    ] = None  # --u_non_staggered
     uy_non_staggered: Annotated[
         FloatRealOptional, (1, "Nt-s+1", "Nsens")
-    ]  # --u_non_staggered
+    ] = None  # --u_non_staggered
     uz_non_staggered: Annotated[
         FloatRealOptional, (1, "Nt-s+1", "Nsens")
-    ]  # --u_non_staggered
-    ux_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_rms
-    uy_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_rms
-    uz_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_rms
-    ux_max: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_max
-    uy_max: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_max
-    uz_max: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_max
-    ux_min: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_min
-    uy_min: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_min
-    uz_min: Annotated[FloatRealOptional, (1, 1, "Nsens")]  # --u_min
-    ux_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_max_all
-    uy_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_max_all
-    uz_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_max_all
-    ux_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_min_all
-    uy_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_min_all
-    uz_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_min_all
-    ux_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_final
-    uy_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_final
-    uz_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")]  # --u_final
+    ] = None  # --u_non_staggered
+    ux_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_rms
+    uy_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_rms
+    uz_rms: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_rms
+    ux_max: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_max
+    uy_max: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_max
+    uz_max: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_max
+    ux_min: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_min
+    uy_min: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_min
+    uz_min: Annotated[FloatRealOptional, (1, 1, "Nsens")] = None  # --u_min
+    ux_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_max_all
+    uy_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_max_all
+    uz_max_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_max_all
+    ux_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_min_all
+    uy_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_min_all
+    uz_min_all: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_min_all
+    ux_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_final
+    uy_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_final
+    uz_final: Annotated[FloatRealOptional, ("Nz", "Ny", "Nx")] = None  # --u_final
 
-    # 5.2 Opposing Cuboid Corners Sensor Mask (defined if sensor_mask_type = 1) (implemented = False)
+    # 5.2 Opposing Cuboid Corners Sensor Mask (defined if sensor_mask_type = 1)
+    #
+    # The sensor fields above then hold a list with one array per cuboid, with the
+    # axes in the (Cx, Cy, Cz, Nt-s+1) order below (the datasets are stored as
+    # (Nt-s+1, Cz, Cy, Cx)). See `deserialize_from_hdf5`.
     #
     # Note, each output group (e.g., /p) contains a dataset for each cuboid defined in
     # sensor_mask_corners, where /1 indicates the first dataset, /2 indicates the second
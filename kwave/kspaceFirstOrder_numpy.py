@@ -0,0 +1,451 @@
+"""
+In-process k-space pseudospectral solver (CPU backend).
+
+Solves the same coupled first-order acoustic equations as the k-Wave C++
+binaries (kspaceFirstOrder-OMP/CUDA) directly on the `H5Input` dataclasses,
+without writing or reading any HDF5 files.
+
+Conventions follow the C++ binaries:
+    - The PML is inside the grid.
+    - Source terms (p_source_input) are expected to be pre-scaled as mass
+      sources, exactly as they would be written to the input HDF5 file.
+    - alpha_coeff is given in [dB/(MHz^y cm)] and converted internally.
+
+Sensor indices follow the conventions of `Sensor.make_binary_sensor`
+(0-based linear indices into an array of shape `Grid.shape`). Cuboid
+sensors (`Sensor.make_cuboid_sensor`) return one array per cuboid, as
+read from the binary's output file.
+
+All fields are stored as float32 and spectra as complex64. FFTs use
+`scipy.fft` real transforms, which cache their plans between calls, and run
+with `workers` threads.
+"""
+from __future__ import annotations
+from dataclasses import asdict
+from typing import Callable
+import time
+
+import numpy as np
+import scipy.fft
+
+from kwave.h5input import H5Input
+from kwave.h5output import SimulationFlagsOutput, SimulationResults, H5Output
+from kwave.solver_options import SolverOptions
+from kwave.monitor import SolverPhase, SolverProgress, RunMetrics
+
+__all__ = ("KSpaceSolver", "kspaceFirstOrder_numpy")
+
+
+def _db2neper(alpha: float | np.ndarray, y: float):
+    """Convert absorption from [dB/(MHz^y cm)] to [Np/((rad/s)^y m)]"""
+    return 100 * alpha * (1e-6 / (2 * np.pi)) ** y / (20 * np.log10(np.e))
+
+
+def get_pml(
+    N: int, dx: float, dt: float, c: float, pml_size: int, pml_alpha: float, staggered
+):
+    """
+    1D PML absorption profile (k-Wave getPML), returned as exp(-alpha * dt/2).
+    """
+    pml = np.ones(N, dtype=np.float32)
+    if pml_size == 0:
+        return pml
+
+    x = np.arange(1, pml_size + 1, dtype=np.float64)
+    if staggered:
+        x = x + 0.5
+    pml_left = pml_alpha * (c / dx) * ((x - pml_size - 1) / (0 - pml_size)) ** 4
+    pml_right = pml_alpha * (c / dx) * (x / pml_size) ** 4
+
+    pml[:pml_size] = np.exp(-pml_left * dt / 2)
+    pml[-pml_size:] = np.exp(-pml_right * dt / 2)
+    return pml
+
+
+class KSpaceSolver:
+    """
+    Holds the k-space operators, PML profiles and medium fields for one
+    `H5Input` so they are computed once and reused for every time step.
+
+    The x axis is the last (contiguous) array axis, so real FFTs are taken
+    along x and the full complex spectrum along y and z.
+    """
+
+    def __init__(
+        self, inp: H5Input, options: SolverOptions | None = None, workers: int = -1
+    ):
+        self.inp = inp
+        self.options = SolverOptions() if options is None else options
+        self.workers = workers
+
+        grid = inp.grid
+        flags = inp.simulation_flags
+        medium = inp.medium
+        pml = inp.pml
+
+        self.shape = tuple(int(n) for n in grid.shape)
+        self.ndims = len(self.shape)
+        self.axes = tuple(range(self.ndims))
+        self.Nt = int(grid.Nt)
+        self.dt = np.float32(grid.dt)
+
+        if flags.elastic_flag or flags.axisymmetric_flag:
+            raise NotImplementedError("Elastic and axisymmetric models")
+        if flags.transducer_source_flag or any(
+            getattr(flags, f"u{ax}_source_flag") for ax in "xyz"
+        ):
+            raise NotImplementedError("Velocity and transducer sources")
+
+        # grid spacing and PML settings, in array axis order (z, y, x)
+        names = "zyx"[3 - self.ndims :]
+        spacing = [getattr(grid, "d" + n) for n in names]
+        pml_sizes = [int(getattr(pml, f"pml_{n}_size") or 0) for n in names]
+        pml_alphas = [getattr(pml, f"pml_{n}_alpha") or 0.0 for n in names]
+
+        # medium
+        self.c0 = self._field(medium.c0)
+        self.rho0 = self._field(medium.rho0)
+        rho0_sg = [medium.rho0_sgz, medium.rho0_sgy, medium.rho0_sgx][3 - self.ndims :]
+        self.rho0_sg_inv = [
+            (1 / self._field(medium.rho0 if r is None else r)).astype(np.float32)
+            for r in rho0_sg
+        ]
+        c_ref = float(medium.c_ref)
+
+        # k-space operators on the rfft grid
+        ks = []
+        self.ddk_pos = []
+        self.ddk_neg = []
+        self.shift_neg = []
+        for ax, (n, d) in enumerate(zip(self.shape, spacing)):
+            if ax == self.ndims - 1:
+                k = 2 * np.pi * scipy.fft.rfftfreq(n, d)
+            else:
+                k = 2 * np.pi * scipy.fft.fftfreq(n, d)
+            bshape = [1] * self.ndims
+            bshape[ax] = k.size
+            k = k.reshape(bshape)
+            ks.append(k)
+            self.ddk_pos.append((1j * k * np.exp(1j * k * d / 2)).astype(np.complex64))
+            self.ddk_neg.append((1j * k * np.exp(-1j * k * d / 2)).astype(np.complex64))
+            self.shift_neg.append(np.exp(-1j * k * d / 2).astype(np.complex64))
+
+        k = np.sqrt(sum(kk**2 for kk in ks))
+        self.kappa = np.sinc(c_ref * k * float(self.dt) / 2 / np.pi).astype(np.float32)
+
+        # PML
+        self.pml = []
+        self.pml_sg = []
+        for ax, (n, d) in enumerate(zip(self.shape, spacing)):
+            bshape = [1] * self.ndims
+            bshape[ax] = n
+            args = (n, d, float(self.dt), c_ref, pml_sizes[ax], pml_alphas[ax])
+            self.pml.append(get_pml(*args, staggered=False).reshape(bshape))
+            self.pml_sg.append(get_pml(*args, staggered=True).reshape(bshape))
+
+        # absorption
+        self.absorbing = bool(flags.absorbing_flag)
+        if self.absorbing:
+            if medium.alpha_coeff is None or medium.alpha_power is None:
+                raise ValueError(
+                    "absorbing_flag is set but medium.alpha_coeff or "
+                    "medium.alpha_power is missing"
+                )
+            y = float(medium.alpha_power)
+            alpha = _db2neper(self._field(medium.alpha_coeff).astype(np.float64), y)
+            c0 = self.c0.astype(np.float64)
+            self.absorb_tau = (-2 * alpha * c0 ** (y - 1)).astype(np.float32)
+            self.absorb_eta = (2 * alpha * c0**y * np.tan(np.pi * y / 2)).astype(
+                np.float32
+            )
+            with np.errstate(divide="ignore"):
+                nabla1 = k ** (y - 2)
+            nabla1[~np.isfinite(nabla1)] = 0
+            self.absorb_nabla1 = nabla1.astype(np.float32)
+            self.absorb_nabla2 = (k ** (y - 1)).astype(np.float32)
+
+        self.nonlinear = bool(flags.nonlinear_flag)
+        if self.nonlinear:
+            self.BonA = self._field(medium.BonA)
+
+        # sources
+        self.source = inp.source
+        self.p0 = None
+        if flags.p0_source_flag:
+            self.p0 = self._field(inp.source.p0_source_input)
+        self.p_source_flag = int(flags.p_source_flag)
+        if self.p_source_flag:
+            src = inp.source
+            self.p_source_index = np.asarray(src.p_source_index).ravel().astype(np.intp)
+            sig = np.asarray(src.p_source_input, dtype=np.float32)
+            # (1, Nt_src, Nsrc) -> (Nt_src, Nsrc); (1, Nt_src, 1) -> (Nt_src, 1)
+            self.p_source_input = sig.reshape(-1, sig.shape[-1])
+            self.p_source_dirichlet = int(src.p_source_mode or 0) == 0
+
+        # sensor
+        sensor = inp.sensor
+        self.cuboid_shapes = None
+        if sensor.sensor_mask_type == 0:
+            self.sensor_index = (
+                np.asarray(sensor.sensor_mask_index).ravel().astype(np.intp)
+            )
+        else:
+            # the points of all cuboids, one after the other in C order
+            flat = np.arange(np.prod(self.shape)).reshape(self.shape)
+            cuboids = [flat[sl] for sl in sensor.get_cuboid_slices(self.ndims)]
+            self.sensor_index = np.concatenate([c.ravel() for c in cuboids])
+            self.cuboid_shapes = [(1,) * (3 - self.ndims) + c.shape for c in cuboids]
+
+    def _field(self, val) -> np.ndarray:
+        """Medium/source value as a float32 scalar or an array of the grid shape"""
+        val = np.asarray(val, dtype=np.float32)
+        if val.size == 1:
+            return val.reshape(())
+        return val.reshape(self.shape)
+
+    def _fft(self, x: np.ndarray):
+        return scipy.fft.rfftn(x, axes=self.axes, workers=self.workers)
+
+    def _ifft(self, x: np.ndarray):
+        return scipy.fft.irfftn(x, s=self.shape, axes=self.axes, workers=self.workers)
+
+    def _grad_sg(self, p_k: np.ndarray, ax: int):
+        """d/dx_ax of p evaluated on the staggered grid"""
+        return self._ifft(self.ddk_pos[ax] * self.kappa * p_k)
+
+    def run(self, callback: Callable[[object], None] | None = None) -> H5Output:
+        """
+        Run all time steps. `callback` receives the same progress events
+        and final `RunMetrics` as for the binary (see `kwave.monitor`).
+        """
+        shape, dt = self.shape, self.dt
+        ndims = self.ndims
+
+        emit = callback if callback is not None else lambda event: None
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        report_every = max(self.Nt // 20, 1)
+        emit(SolverPhase(name="Simulation", time=0.0))
+
+        p = np.zeros(shape, dtype=np.float32)
+        p_k = self._fft(p)
+        u = [np.zeros(shape, dtype=np.float32) for _ in range(ndims)]
+        rho = [np.zeros(shape, dtype=np.float32) for _ in range(ndims)]
+        du = [None] * ndims
+
+        s0 = self.options.start_index - 1
+        recorder = _Recorder(
+            self.options,
+            self.shape,
+            self.sensor_index,
+            max(self.Nt - s0, 0),
+            self.cuboid_shapes,
+        )
+
+        for t_index in range(self.Nt):
+            # momentum conservation
+            for ax in range(ndims):
+                u[ax] = self.pml_sg[ax] * (
+                    self.pml_sg[ax] * u[ax]
+                    - dt * self.rho0_sg_inv[ax] * self._grad_sg(p_k, ax)
+                )
+
+            # velocity divergence
+            for ax in range(ndims):
+                du[ax] = self._ifft(self.ddk_neg[ax] * self.kappa * self._fft(u[ax]))
+
+            # mass conservation
+            for ax in range(ndims):
+                if self.nonlinear:
+                    rho[ax] = self.pml[ax] * (
+                        self.pml[ax] * rho[ax] - dt * (2 * rho[ax] + self.rho0) * du[ax]
+                    )
+                else:
+                    rho[ax] = self.pml[ax] * (
+                        self.pml[ax] * rho[ax] - dt * self.rho0 * du[ax]
+                    )
+
+            # pressure source, as a mass source
+            if self.p_source_flag and t_index < self.p_source_input.shape[0]:
+                sig = self.p_source_input[t_index]
+                for ax in range(ndims):
+                    r = rho[ax].reshape(-1)
+                    if self.p_source_dirichlet:
+                        r[self.p_source_index] = sig
+                    else:
+                        r[self.p_source_index] += sig
+
+            # equation of state
+            rho_sum = sum(rho)
+            if self.absorbing:
+                du_sum = sum(du)
+                p = self.c0**2 * (
+                    rho_sum
+                    + self.absorb_tau
+                    * self._ifft(self.absorb_nabla1 * self._fft(self.rho0 * du_sum))
+                    - self.absorb_eta
+                    * self._ifft(self.absorb_nabla2 * self._fft(rho_sum))
+                )
+            else:
+                p = self.c0**2 * rho_sum
+            if self.nonlinear:
+                p += self.c0**2 * self.BonA * rho_sum**2 / (2 * self.rho0)
+
+            # initial pressure
+            if t_index == 0 and self.p0 is not None:
+                p = np.broadcast_to(self.p0, shape).astype(np.float32)
+                for ax in range(ndims):
+                    rho[ax] = (p / (ndims * self.c0**2)).astype(np.float32)
+                p_k = self._fft(p)
+                for ax in range(ndims):
+                    u[ax] = dt * self.rho0_sg_inv[ax] * self._grad_sg(p_k, ax) / 2
+            else:
+                p_k = self._fft(p)
+
+            if t_index >= s0:
+                u_ns = None
+                if recorder.non_staggered:
+                    u_ns = [
+                        self._ifft(self.shift_neg[ax] * self._fft(u[ax]))
+                        for ax in range(ndims)
+                    ]
+                recorder.record(t_index - s0, p, u, u_ns)
+
+            if (t_index + 1) % report_every == 0 or t_index + 1 == self.Nt:
+                elapsed = time.perf_counter() - t0
+                done = (t_index + 1) / self.Nt
+                emit(
+                    SolverProgress(
+                        percent=100 * done,
+                        elapsed=elapsed,
+                        eta=elapsed * (1 - done) / done,
+                        time=elapsed,
+                    )
+                )
+
+        results = recorder.results()
+        wall_time = time.perf_counter() - t0
+        emit(
+            RunMetrics(
+                returncode=0,
+                wall_time=wall_time,
+                cpu_time=time.process_time() - cpu0,
+                phase_times={"Simulation": wall_time},
+            )
+        )
+        return H5Output(
+            simulation_flags=SimulationFlagsOutput(**asdict(self.inp.simulation_flags)),
+            grid=self.inp.grid,
+            pml=self.inp.pml,
+            sensor=self.inp.sensor,
+            results=results,
+        )
+
+
+class _Recorder:
+    """
+    Accumulates the `SimulationResults` fields selected by `SolverOptions`
+    (raw/rms/max/min at the sensor, max_all/min_all/final over the grid).
+    """
+
+    def __init__(
+        self,
+        options: SolverOptions,
+        shape: tuple[int, ...],
+        sensor_index: np.ndarray,
+        n_steps: int,
+        cuboid_shapes: list[tuple[int, int, int]] | None = None,
+    ):
+        ndims = len(shape)
+        self.fields = options.recorded_fields(ndims)
+        self.sensor_index = sensor_index
+        self.n_steps = n_steps
+        self.cuboid_shapes = cuboid_shapes
+        # output files store grid sized fields as (Nz, Ny, Nx)
+        self.grid_shape = (1,) * (3 - ndims) + shape
+        self.non_staggered = any("non_staggered" in f for f in self.fields)
+        self.axis_names = ["u" + n for n in "zyx"[3 - ndims :]]
+        self.data: dict[str, np.ndarray] = {}
+
+    def _sensor_stats(self, name: str, i: int, v: np.ndarray):
+        d = self.data
+        if name in self.fields:
+            if name not in d:
+                d[name] = np.empty((self.n_steps, v.size), dtype=np.float32)
+            d[name][i] = v
+        for stat, func in (("_max", np.maximum), ("_min", np.minimum)):
+            key = name + stat
+            if key in self.fields:
+                d[key] = v.copy() if i == 0 else func(d[key], v)
+        key = name + "_rms"
+        if key in self.fields:
+            d[key] = v**2 if i == 0 else d[key] + v**2
+
+    def _grid_stats(self, name: str, i: int, v: np.ndarray):
+        d = self.data
+        for stat, func in (("_max_all", np.maximum), ("_min_all", np.minimum)):
+            key = name + stat
+            if key in self.fields:
+                d[key] = v.copy() if i == 0 else func(d[key], v)
+        key = name + "_final"
+        if key in self.fields:
+            d[key] = v
+
+    def record(self, i: int, p: np.ndarray, u: list, u_ns: list | None):
+        self._sensor_stats("p", i, p.reshape(-1)[self.sensor_index])
+        self._grid_stats("p", i, p)
+        for name, v in zip(self.axis_names, u):
+            self._sensor_stats(name, i, v.reshape(-1)[self.sensor_index])
+            self._grid_stats(name, i, v)
+        if u_ns is not None:
+            for name, v in zip(self.axis_names, u_ns):
+                name = name + "_non_staggered"
+                self._sensor_stats(name, i, v.reshape(-1)[self.sensor_index])
+
+    def _split_cuboids(self, v: np.ndarray) -> list[np.ndarray]:
+        """
+        Sensor data of all cuboid points -> one array per cuboid, stored
+        like the binary as (Nt, Cz, Cy, Cx) and returned as (Cx, Cy, Cz, Nt)
+        """
+        res = []
+        start = 0
+        for shape in self.cuboid_shapes:
+            n = int(np.prod(shape))
+            block = v[..., start : start + n]
+            res.append(block.reshape(v.shape[:-1] + shape).T)
+            start += n
+        return res
+
+    def results(self) -> SimulationResults:
+        res = {}
+        for key, v in self.data.items():
+            if key.endswith("_rms"):
+                v = np.sqrt(v / self.n_steps)
+            if key.endswith(("_all", "_final")):
+                res[key] = np.array(v, dtype=np.float32).reshape(self.grid_shape)
+            elif self.cuboid_shapes is not None:
+                res[key] = self._split_cuboids(v)
+            elif v.ndim == 2:
+                # (Nt-s+1, Nsens) time series
+                res[key] = v[np.newaxis]
+            else:
+                res[key] = v.reshape(1, 1, -1)
+        return SimulationResults(**res)
+
+
+def kspaceFirstOrder_numpy(
+    inp: H5Input,
+    options: SolverOptions | None = None,
+    workers: int = -1,
+    callback: Callable[[object], None] | None = None,
+) -> H5Output:
+    """
+    Run a simulation in-process on the CPU and return the same `H5Output`
+    the C++ binary would produce.
+
+    `options` selects the recorded outputs and the start index like the
+    binary's command line flags (compression, extra_args and checkpointing
+    are ignored).
+    `workers` is the number of threads used by each FFT (-1 = all cores).
+    `callback` receives progress events (see `KSpaceSolver.run`).
+    """
+    return KSpaceSolver(inp, options, workers=workers).run(callback)
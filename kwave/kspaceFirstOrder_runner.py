@@ -1,11 +1,25 @@
 from __future__ import annotations
+import asyncio
+import concurrent.futures
+import contextlib
+import dataclasses
+import functools
+import logging
+from dataclasses import fields
 from importlib import resources
 from pathlib import Path
+from typing import Callable, Iterator
+import typing
+import os
+import shutil
 import tempfile
 import signal
 import subprocess
+import warnings
+import weakref
 
 import h5py
+import numpy as np
 
 from kwave.h5input import (
     Grid,
@@ -17,9 +31,26 @@ from kwave.h5input import (
     KSpaceAndShiftVariables,
     H5Input,
 )
-from kwave.h5output import H5Output
-from kwave.h5_dataclass_helper import serialize_to_hdf5, deserialize_from_hdf5
+from kwave.h5output import H5Output, SimulationResults
+from kwave.h5_dataclass_helper import (
+    serialize_to_hdf5,
+    deserialize_from_hdf5,
+    hash_dataclass,
+    StorageOptions,
+    collapse_uniform,
+    update_hdf5,
+    InputTemplate,
+    release_with,
+)
+from kwave.kspaceFirstOrder_numpy import kspaceFirstOrder_numpy
+from kwave.cache import SimulationCache
+from kwave.solver_options import SolverOptions
+from kwave.result_store import ResultStore
+from kwave.monitor import SolverMonitor, RunMetrics
+from kwave.estimate import EstimateModel, estimate, _input_nbytes, _output_nbytes
+from kwave.kwave_funcs import get_optimal_pml_size, expand_grid_for_pml, crop_to_grid
 
+logger = logging.getLogger(__name__)
 
 binary_root: Path = resources.files("kwave").parent / "binaries"
 
@@ -36,13 +67,540 @@ def kspaceFirstOrder(
     kspace: KSpaceAndShiftVariables = None,
     data_name: str = "kwave_data",
     data_path: str | Path | None = None,
+    options: SolverOptions | None = None,
+    backend: str = "cuda",
+    cache: SimulationCache | None = None,
+    callback: Callable[[object], None] | None = None,
+    staging: str = "disk",
+    keep_files: bool = False,
+    lazy: bool = False,
+    pml_inside: bool = True,
+    memory_limit: int | None = None,
+    on_memory_limit: str = "raise",
+    estimate_model: EstimateModel | None = None,
+    storage: StorageOptions | None = None,
+    collapse: bool = True,
+    reuse_input: bool = False,
+    template: InputTemplate | None = None,
     **kwargs,
 ):
-    """ """
+    """
+    Run a k-Wave simulation.
+
+    options:
+        `SolverOptions` selecting the recorded outputs and other solver
+        flags (default: record the raw pressure at the sensor only).
+    backend:
+        "cuda"  - serialize the input to HDF5 and run kspaceFirstOrder-CUDA.exe
+        "numpy" - run the in-process CPU solver (`kspaceFirstOrder_numpy`),
+                  no file I/O. `workers` may be passed to set the FFT threads.
+    cache:
+        Optional `SimulationCache`. If the same input was already run with
+        the same solver arguments, the cached output is returned without
+        launching the binary ("cuda" backend only).
+    callback:
+        Called with structured progress events parsed from the solver output
+        and resource samples of the solver process, and finally with the
+        run's `RunMetrics` (see `kwave.monitor`).
+    staging:
+        Where the input and output HDF5 files are placed:
+        "disk" - in `data_path` (default: <tempdir>/kwave)
+        "shm"  - in a private directory on the RAM-backed /dev/shm
+        "auto" - on /dev/shm if the files fit in its free space, else "disk"
+        Runs with checkpointing always use "disk" with "auto", and cannot
+        use "shm".
+    keep_files:
+        Keep the input and output files after a successful run (they are
+        always kept when the run fails).
+    lazy:
+        Return the results as `LazyDataset` proxies that read from the
+        output file on access (zero-copy memmaps where the layout allows).
+        Each lazy run gets its own output file (<data_name>_<random>_output.h5),
+        so later runs with the same `data_name` don't overwrite it. The file
+        (and a private "shm" staging directory) is removed once all proxies
+        of the run are garbage collected, or by `close()` on one of them;
+        arrays read from the proxies before then stay valid. With
+        `keep_files` the file is kept.
+    pml_inside:
+        True  - the PML is part of `grid` (default 20 points per side).
+        False - the grid is expanded by a PML on each side before the run
+                (`expand_grid_for_pml`). Without an explicit `pml`, the PML
+                sizes are chosen by `get_optimal_pml_size` so the expanded
+                axes have small prime factors and fast FFTs. Grid sized
+                results are cropped back to `grid` and the original input
+                is returned.
+    memory_limit:
+        Memory available to the solver [bytes]. The peak memory is estimated
+        before the launch (`kwave.estimate`, with `estimate_model`) and if it
+        exceeds the limit, the run is refused with a MemoryError
+        (`on_memory_limit="raise"`) or a ResourceWarning is issued
+        (`on_memory_limit="warn"`). The `ResourceEstimate` is also passed to
+        `callback`.
+    storage:
+        `StorageOptions` for the chunking and compression of the input file
+        datasets (e.g. gzip for mostly-zero media on a shared filesystem),
+        and the chunk cache to read the output with. By default the output
+        is read with a chunk cache sized to its largest chunks.
+    collapse:
+        Store uniform medium arrays (e.g. a constant `rho0`) as single
+        values, which the solver keeps as scalars instead of full grids
+        (see `collapse_uniform`) in the input file. The collapsed fields are
+        logged at INFO level, and the returned input keeps the arrays.
+    reuse_input:
+        Keep the input file in `data_path` after the run and, if it exists
+        from a previous run, update it in place: only datasets whose content
+        fingerprint changed are rewritten (see `update_hdf5`). For sweeps
+        where e.g. only the source changes between runs ("disk" staging).
+    template:
+        `InputTemplate` holding datasets shared by a sweep (e.g. the medium
+        and PML). If the input's parts match it, the input file links to
+        the template's datasets instead of holding its own copies.
+
+    Checkpointing is enabled through `options` (checkpoint_file,
+    checkpoint_interval, checkpoint_timesteps). If a checkpoint of the same
+    input exists in `data_path`, e.g. after the job was preempted, the
+    input file is left as is and the binary resumes from the checkpoint.
+    The checkpoint file is removed once the run completes.
+    """
+    inp_obj = _make_input(grid, medium, sensor, source, simulation_flags, pml, kspace)
+    run_inp, pml_size = _prepare_input(inp_obj, pml, pml_inside, collapse)
+    options = _check_resources(
+        run_inp, options, memory_limit, on_memory_limit, estimate_model, callback
+    )
+
+    output = _run_input(
+        run_inp,
+        options,
+        data_name=data_name,
+        data_path=data_path,
+        backend=backend,
+        cache=cache,
+        callback=callback,
+        staging=staging,
+        keep_files=keep_files,
+        lazy=lazy,
+        storage=storage,
+        reuse_input=reuse_input,
+        template=template,
+        **kwargs,
+    )
+    return _crop_output(inp_obj, run_inp, output, pml_size)
+
+
+def _run_input(
+    inp_obj: H5Input,
+    options: SolverOptions,
+    data_name: str,
+    data_path: str | Path | None,
+    backend: str,
+    cache: SimulationCache | None,
+    callback: Callable[[object], None] | None,
+    staging: str,
+    keep_files: bool,
+    lazy: bool,
+    storage: StorageOptions | None,
+    reuse_input: bool,
+    template: InputTemplate | None,
+    **kwargs,
+) -> H5Output:
+    """
+    Run an `H5Input` with the given backend. See `kspaceFirstOrder`.
+    """
+    if backend == "numpy":
+        return _numpy_run(inp_obj, options, callback, kwargs)()
+    _check_run_args(backend, staging, reuse_input, template)
+
+    key, output = _cache_lookup(cache, inp_obj, options)
+    if output is not None:
+        return output
+
+    run = _stage_run(
+        inp_obj, options, data_name, data_path, staging, storage, reuse_input, template
+    )
+    with _report_failure(run):
+        _run_binary(
+            run.binary_args(),
+            prefix=kwargs.get("stdout_prefix", ""),
+            callback=callback,
+        )
+    return _finish_run(
+        run, inp_obj, data_name, cache, key, keep_files, lazy, storage, reuse_input
+    )
+
+
+def kspaceFirstOrder_batch(
+    inputs: list[H5Input | dict],
+    max_workers: int | None = None,
+    data_name: str = "kwave_data",
+    data_path: str | Path | None = None,
+    as_completed: bool = False,
+    store: ResultStore | None = None,
+    params: list[dict] | None = None,
+    **kwargs,
+) -> list[tuple[H5Input, H5Output]] | Iterator[tuple[int, tuple[H5Input, H5Output]]]:
+    """
+    Run many simulations concurrently.
+
+    Each entry of `inputs` is either an `H5Input` or a dict of keyword
+    arguments for `kspaceFirstOrder`. Every job runs in its own working
+    directory under `data_path`, so concurrent jobs never share files.
+    Extra `kwargs` are passed to every `kspaceFirstOrder` call.
+
+    max_workers:
+        Number of simulations in flight at once (default: number of CPUs).
+    as_completed:
+        False - block and return a list of (input, output) in input order.
+        True  - return an iterator of (index, (input, output)) that yields
+                each job as soon as it finishes. The jobs start right
+                away; closing the iterator cancels those not yet started.
+    store:
+        `ResultStore` the worker threads append each job's results to as
+        soon as the job finishes.
+    params:
+        Parameters stored with each job's results (default: {"index": i}).
+    """
+    if params is not None and len(params) != len(inputs):
+        raise ValueError("params must have one entry per input")
+    if data_path is None:
+        data_path = Path(tempfile.gettempdir()) / "kwave"
+    data_path = Path(data_path)
+    data_path.mkdir(exist_ok=True, parents=True)
+
+    jobs = []
+    for i, inp in enumerate(inputs):
+        if isinstance(inp, H5Input):
+            inp = {f.name: getattr(inp, f.name) for f in fields(inp)}
+        job_dir = tempfile.mkdtemp(prefix=f"{data_name}_{i}_", dir=data_path)
+        job = dict(kwargs)
+        job.update(inp)
+        job.update(data_name=data_name, data_path=Path(job_dir))
+        job.setdefault("stdout_prefix", f"[{i}] ")
+        jobs.append(job)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if store is not None:
+        for i, job in enumerate(jobs):
+            job["_store"] = (store, dict(index=i) if params is None else params[i])
+
+    it = _run_batch(jobs, max_workers)
+    if as_completed:
+        return it
+
+    results = [None] * len(jobs)
+    for i, res in it:
+        results[i] = res
+    return results
+
+
+def _run_batch(jobs: list[dict], max_workers: int):
+    """
+    Submit all jobs now and return an iterator of (index, result) in
+    completion order. Closing (or dropping) the iterator cancels the jobs
+    that have not started yet.
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(_run_job, job): i for i, job in enumerate(jobs)}
+    it = _iter_batch(executor, futures)
+    # also shut down if the iterator is dropped before it was started
+    weakref.finalize(it, executor.shutdown, wait=False, cancel_futures=True)
+    return it
+
+
+def _iter_batch(executor: concurrent.futures.Executor, futures: dict):
+    try:
+        for fut in concurrent.futures.as_completed(futures):
+            yield futures[fut], fut.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_job(job: dict):
+    store = job.pop("_store", None)
+    res = kspaceFirstOrder(**job)
+    if store is not None:
+        store[0].append(res[1], store[1])
+    try:
+        # remove the job's working directory if nothing was kept in it
+        job["data_path"].rmdir()
+    except OSError:
+        pass
+    return res
+
+
+async def kspaceFirstOrder_async(
+    grid: Grid,
+    medium: Medium,
+    sensor: Sensor,
+    source: Source,
+    simulation_flags: SimulationFlags = None,
+    pml: PML = None,
+    kspace: KSpaceAndShiftVariables = None,
+    data_name: str = "kwave_data",
+    data_path: str | Path | None = None,
+    options: SolverOptions | None = None,
+    backend: str = "cuda",
+    cache: SimulationCache | None = None,
+    callback: Callable[[object], None] | None = None,
+    staging: str = "disk",
+    keep_files: bool = False,
+    lazy: bool = False,
+    pml_inside: bool = True,
+    memory_limit: int | None = None,
+    on_memory_limit: str = "raise",
+    estimate_model: EstimateModel | None = None,
+    storage: StorageOptions | None = None,
+    collapse: bool = True,
+    reuse_input: bool = False,
+    template: InputTemplate | None = None,
+    executor: concurrent.futures.Executor | None = None,
+    **kwargs,
+):
+    """
+    asyncio version of `kspaceFirstOrder`.
+
+    The binary runs as an asyncio subprocess and its stdout is streamed
+    without blocking the event loop. HDF5 serialization/deserialization (and
+    the "numpy" backend) run in `executor` (default: the loop's default
+    executor). Cancelling the task sends SIGINT to the binary and waits
+    for it to exit before re-raising CancelledError.
+    """
+    inp_obj = _make_input(grid, medium, sensor, source, simulation_flags, pml, kspace)
+    loop = asyncio.get_running_loop()
+    run_inp, pml_size = await loop.run_in_executor(
+        executor, _prepare_input, inp_obj, pml, pml_inside, collapse
+    )
+    options = _check_resources(
+        run_inp, options, memory_limit, on_memory_limit, estimate_model, callback
+    )
+
+    output = await _run_input_async(
+        run_inp,
+        options,
+        data_name=data_name,
+        data_path=data_path,
+        backend=backend,
+        cache=cache,
+        callback=callback,
+        staging=staging,
+        keep_files=keep_files,
+        lazy=lazy,
+        storage=storage,
+        reuse_input=reuse_input,
+        template=template,
+        executor=executor,
+        **kwargs,
+    )
+    return _crop_output(inp_obj, run_inp, output, pml_size)
+
+
+async def _run_input_async(
+    inp_obj: H5Input,
+    options: SolverOptions,
+    data_name: str,
+    data_path: str | Path | None,
+    backend: str,
+    cache: SimulationCache | None,
+    callback: Callable[[object], None] | None,
+    staging: str,
+    keep_files: bool,
+    lazy: bool,
+    storage: StorageOptions | None,
+    reuse_input: bool,
+    template: InputTemplate | None,
+    executor: concurrent.futures.Executor | None,
+    **kwargs,
+) -> H5Output:
+    """
+    asyncio version of `_run_input`.
+    """
+    loop = asyncio.get_running_loop()
+    if backend == "numpy":
+        return await loop.run_in_executor(
+            executor, _numpy_run(inp_obj, options, callback, kwargs)
+        )
+    _check_run_args(backend, staging, reuse_input, template)
+
+    # hashing and writing the input read every array, keep them off the loop
+    key, output = await loop.run_in_executor(
+        executor, _cache_lookup, cache, inp_obj, options
+    )
+    if output is not None:
+        return output
+
+    run = await loop.run_in_executor(
+        executor,
+        _stage_run,
+        inp_obj,
+        options,
+        data_name,
+        data_path,
+        staging,
+        storage,
+        reuse_input,
+        template,
+    )
+    with _report_failure(run):
+        await _run_binary_async(
+            run.binary_args(),
+            prefix=kwargs.get("stdout_prefix", ""),
+            callback=callback,
+        )
+    return await loop.run_in_executor(
+        executor,
+        _finish_run,
+        run,
+        inp_obj,
+        data_name,
+        cache,
+        key,
+        keep_files,
+        lazy,
+        storage,
+        reuse_input,
+    )
+
+
+def kspaceFirstOrder_version():
+    """
+    Print the version and build info of the C++ binary.
+    """
+    binary = _get_binary()
+
+    cmd = [str(binary), "--version"]
+    p = subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    _print_stdout_realtime_subp(p)
+    p.communicate()
+
+
+def _get_binary() -> Path:
+    binary = binary_root / cuda_binary
+    if not binary.exists():
+        raise ValueError(f"Binary not found at {binary}")
+    return binary
+
+
+def _run_binary(
+    args: list[str],
+    prefix: str = "",
+    callback: Callable[[object], None] | None = None,
+) -> RunMetrics:
+    """
+    Call the C++ binary with args.
+    Print stdout in real time (each line prefixed with `prefix`)
+    and check the return code.
+    Progress and resource events are passed to `callback` (see `SolverMonitor`).
+    """
+    binary = _get_binary()
+
+    cmd = [str(binary), *args]
+    p = subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    monitor = SolverMonitor(callback)
+    monitor.start(p.pid)
+    rusage = None
+    try:
+        _print_stdout_realtime_subp(p, prefix, monitor.feed)
+        if hasattr(os, "wait4"):
+            # reap the child ourselves to get its exact resource usage
+            _, status, rusage = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+        p.communicate()  # update returncode
+    finally:
+        metrics = monitor.finish(p.returncode, rusage)
+
+    if p.returncode != 0:
+        raise ValueError(
+            f"Binary {str(binary)} terminated with return code {p.returncode}."
+        )
+    return metrics
+
+
+def _print_stdout_realtime_subp(
+    p: subprocess.Popen,
+    prefix: str = "",
+    on_line: Callable[[str], None] | None = None,
+):
+    try:
+        while True:
+            s = p.stdout.readline()
+            if s:
+                s = s.decode()
+                print(prefix + s, end="")
+                if on_line is not None:
+                    on_line(s)
+            else:
+                break
+    except KeyboardInterrupt as e:
+        p.send_signal(signal.SIGINT)
+        raise e
+
+
+async def _run_binary_async(
+    args: list[str],
+    prefix: str = "",
+    callback: Callable[[object], None] | None = None,
+) -> RunMetrics:
+    """
+    asyncio version of `_run_binary`.
+    On cancellation, send SIGINT to the binary and wait for it to exit.
+    """
+    binary = _get_binary()
+
+    p = await asyncio.create_subprocess_exec(
+        str(binary),
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    monitor = SolverMonitor(callback)
+    monitor.start(p.pid)
+    try:
+        while True:
+            s = await p.stdout.readline()
+            if s:
+                s = s.decode()
+                print(prefix + s, end="")
+                monitor.feed(s)
+            else:
+                break
+        await p.wait()
+    except asyncio.CancelledError:
+        if p.returncode is None:
+            p.send_signal(signal.SIGINT)
+            await p.wait()
+        raise
+    finally:
+        metrics = monitor.finish(p.returncode)
+
+    if p.returncode != 0:
+        raise ValueError(
+            f"Binary {str(binary)} terminated with return code {p.returncode}."
+        )
+    return metrics
+
+
+def _make_input(
+    grid: Grid,
+    medium: Medium,
+    sensor: Sensor,
+    source: Source,
+    simulation_flags: SimulationFlags = None,
+    pml: PML = None,
+    kspace: KSpaceAndShiftVariables = None,
+) -> H5Input:
+    """
+    Fill in the default PML and simulation flags and build the H5Input.
+    """
     ndims = len(grid.shape)
     if pml is None:
-        # Auto PML
-        # TODO: implement getOptimalPMLSize
+        # Default PML inside the grid. The thickness does not change the FFT
+        # sizes; see `pml_inside=False` for an optimally sized outside PML.
         if ndims == 3:
             pml = PML(
                 pml_x_size=20,
@@ -70,80 +628,454 @@ def kspaceFirstOrder(
     )
     if kspace is not None:
         inp_args["kspace"] = kspace
-    inp_obj = H5Input(**inp_args)
+    return H5Input(**inp_args)
 
-    # infile = "./h5_test_data/example_ivp_binary_sensor_mask_input.h5"
-    # outfile = "test_out.h5"
-    # _run_binary(["-i", str(infile), "-o", str(outfile)])
 
+def _prepare_input(
+    inp_obj: H5Input, pml: PML | None, pml_inside: bool, collapse: bool
+) -> tuple[H5Input, tuple[int, ...] | None]:
+    """
+    The input to run: collapsed (`collapse_uniform`) and expanded by a PML
+    outside the grid (`_expand_outside_pml`). `inp_obj` is not modified.
+    """
+    if collapse:
+        inp_obj, collapsed = collapse_uniform(inp_obj)
+        if collapsed:
+            logger.info("Storing uniform fields as scalars: %s", ", ".join(collapsed))
+    return _expand_outside_pml(inp_obj, pml, pml_inside)
+
+
+def _expand_outside_pml(
+    inp_obj: H5Input, pml: PML | None, pml_inside: bool
+) -> tuple[H5Input, tuple[int, ...] | None]:
+    """
+    For `pml_inside=False`, expand the input by a PML outside the grid.
+    Returns the input to run and the PML size per axis (None if inside).
+    """
+    if pml_inside:
+        return inp_obj, None
+
+    shape = inp_obj.grid.shape
+    names = "zyx"[3 - len(shape) :]
+    if pml is None:
+        pml_size = get_optimal_pml_size(shape)
+        pml_alpha = 2.0
+    else:
+        pml_size = tuple(int(getattr(pml, f"pml_{n}_size") or 0) for n in names)
+        # an unset alpha (pml_z_alpha is optional) falls back to the x alpha
+        alphas = (getattr(pml, f"pml_{n}_alpha") for n in names)
+        pml_alpha = tuple(float(pml.pml_x_alpha if a is None else a) for a in alphas)
+    return expand_grid_for_pml(inp_obj, pml_size, pml_alpha), pml_size
+
+
+def _crop_output(
+    inp_obj: H5Input,
+    run_inp: H5Input,
+    output: H5Output,
+    pml_size: tuple[int, ...] | None,
+) -> tuple[H5Input, H5Output]:
+    """
+    Report the results of an expanded run on the original grid. Without an
+    expansion (`pml_size` None), return the caller's input and the output.
+    """
+    if pml_size is None:
+        return inp_obj, output
+    results = output.results
+    for f in fields(results):
+        val = getattr(results, f.name)
+        if val is not None and f.name.endswith(("_all", "_final")):
+            setattr(results, f.name, crop_to_grid(val, pml_size))
+    output.grid = inp_obj.grid
+    output.sensor = inp_obj.sensor
+    return dataclasses.replace(inp_obj, pml=run_inp.pml), output
+
+
+def _check_resources(
+    inp_obj: H5Input,
+    options: SolverOptions | None,
+    memory_limit: int | None,
+    on_memory_limit: str,
+    model: EstimateModel | None,
+    callback: Callable[[object], None] | None,
+) -> SolverOptions:
+    """
+    Estimate the resources of a run and enforce `memory_limit`.
+    Returns the solver options to run with (the defaults if None).
+    """
+    if options is None:
+        options = SolverOptions()
+    if on_memory_limit not in ("raise", "warn"):
+        raise ValueError(f"Unknown on_memory_limit {on_memory_limit!r}")
+    if memory_limit is None and callback is None:
+        return options
+
+    est = estimate(inp_obj, options, model)
+    if callback is not None:
+        callback(est)
+    if memory_limit is None or est.memory_bytes <= memory_limit:
+        return options
+
+    msg = (
+        f"Estimated solver memory {est.memory_bytes / 2**30:.2f} GiB exceeds "
+        f"the limit of {memory_limit / 2**30:.2f} GiB"
+    )
+    if on_memory_limit == "raise":
+        raise MemoryError(msg)
+    warnings.warn(msg, ResourceWarning, stacklevel=3)
+    return options
+
+
+def _numpy_run(
+    inp_obj: H5Input,
+    options: SolverOptions,
+    callback: Callable[[object], None] | None,
+    kwargs: dict,
+) -> Callable[[], H5Output]:
+    """The "numpy" backend run of an input, to call or submit to an executor"""
+    return functools.partial(
+        kspaceFirstOrder_numpy,
+        inp_obj,
+        options,
+        workers=kwargs.get("workers", -1),
+        callback=callback,
+    )
+
+
+def _check_run_args(
+    backend: str, staging: str, reuse_input: bool, template: InputTemplate | None
+):
+    if backend != "cuda":
+        raise ValueError(f"Unknown backend {backend!r}")
+    if reuse_input and staging != "disk":
+        raise ValueError("reuse_input requires staging='disk'")
+    if reuse_input and template is not None:
+        raise ValueError("reuse_input and template cannot be combined")
+
+
+def _cache_lookup(
+    cache: SimulationCache | None, inp_obj: H5Input, options: SolverOptions
+) -> tuple[str | None, H5Output | None]:
+    """The cache key of a run and its cached output, if any"""
+    if cache is None:
+        return None, None
+    key = cache.make_key(inp_obj, options.to_args(checkpoint=False))
+    return key, cache.get(key)
+
+
+class _StagedRun(typing.NamedTuple):
+    """
+    Files of a binary run.
+
+    staging_dir: private temporary directory to remove after the run (or None)
+    options:     with the checkpoint file resolved
+    """
+
+    input_file: Path
+    output_file: Path
+    staging_dir: Path | None
+    options: SolverOptions
+
+    def binary_args(self) -> list[str]:
+        return [
+            "-i",
+            str(self.input_file),
+            "-o",
+            str(self.output_file),
+            *self.options.to_args(),
+        ]
+
+
+def _stage_run(
+    inp_obj: H5Input,
+    options: SolverOptions,
+    data_name: str,
+    data_path: str | Path | None,
+    staging: str,
+    storage: StorageOptions | None,
+    reuse_input: bool,
+    template: InputTemplate | None,
+) -> _StagedRun:
+    """
+    Choose the files of a binary run and write its input file (or keep it
+    to resume from a checkpoint).
+    """
+    staging_dir, temporary = _staging_dir(staging, data_path, inp_obj, options)
+    input_file, output_file = _data_files(data_name, staging_dir)
+    options = _resolve_checkpoint(options, input_file, data_name)
+    _stage_input(
+        inp_obj, input_file, output_file, options, storage, reuse_input, template
+    )
+    return _StagedRun(
+        input_file, output_file, staging_dir if temporary else None, options
+    )
+
+
+@contextlib.contextmanager
+def _report_failure(run: _StagedRun) -> Iterator[None]:
+    """Point at the input file (which is kept) when the binary run fails"""
+    try:
+        yield
+    except Exception:
+        print(f"Run failed. Check the input file {run.input_file}")
+        raise
+
+
+def _finish_run(
+    run: _StagedRun,
+    inp_obj: H5Input,
+    data_name: str,
+    cache: SimulationCache | None,
+    key: str | None,
+    keep_files: bool,
+    lazy: bool,
+    storage: StorageOptions | None,
+    reuse_input: bool,
+) -> H5Output:
+    """
+    After a successful binary run: cache and read the output, and remove
+    the run's files.
+    """
+    _clear_checkpoint(run.options)
+    output_file = run.output_file
+    if cache is not None:
+        cache.put(key, output_file)
+
+    if lazy:
+        output_file = _own_output_file(output_file, data_name)
+    output = _read_output(
+        output_file, run.options, len(inp_obj.grid.shape), lazy, storage
+    )
+    if not keep_files:
+        _remove_files(
+            None if reuse_input else run.input_file,
+            output_file,
+            run.staging_dir,
+            output if lazy else None,
+        )
+    return output
+
+
+def _data_files(data_name: str, data_path: str | Path | None) -> tuple[Path, Path]:
+    """
+    Input and output file paths for a run. Creates `data_path` if needed.
+    """
     if data_path is None:
         data_path = Path(tempfile.gettempdir()) / "kwave"
+    data_path = Path(data_path)
     data_path.mkdir(exist_ok=True, parents=True)
 
     input_file = data_path / (data_name + "_input.h5")
     output_file = data_path / (data_name + "_output.h5")
+    return input_file, output_file
 
-    with h5py.File(input_file, "w") as fp:
-        serialize_to_hdf5(inp_obj, fp)
 
-    try:
-        _run_binary(["-i", str(input_file), "-o", str(output_file)])
-    except Exception as e:
-        print(f"Run failed. Check the input file {input_file}")
-        raise e
+shm_root = Path("/dev/shm")
 
-    with h5py.File(output_file, "r") as fp:
-        output = deserialize_from_hdf5(H5Output, fp)
 
-    return inp_obj, output
+def _staging_dir(
+    staging: str,
+    data_path: str | Path | None,
+    inp_obj: H5Input,
+    options: SolverOptions,
+) -> tuple[Path | str | None, bool]:
+    """
+    Directory for the input/output files of a run, and whether it is a
+    private temporary directory to be removed after the run.
+    """
+    if staging not in ("disk", "shm", "auto"):
+        raise ValueError(f"Unknown staging mode {staging!r}")
+    if staging == "shm" and options.checkpointing:
+        # the files would live in a private directory that is removed after
+        # the run, so a preempted run could never resume
+        raise ValueError("Checkpointing requires staging='disk' (or 'auto')")
 
+    if staging == "auto":
+        if options.checkpointing or not shm_root.is_dir():
+            staging = "disk"
+        else:
+            nbytes = _input_nbytes(inp_obj) + _output_nbytes(inp_obj, options)
+            # leave some headroom for HDF5 metadata and other processes
+            fits = 1.2 * nbytes < shutil.disk_usage(shm_root).free
+            staging = "shm" if fits else "disk"
 
-def kspaceFirstOrder_version():
+    if staging == "shm":
+        return Path(tempfile.mkdtemp(prefix="kwave_", dir=shm_root)), True
+    return data_path, False
+
+
+def _own_output_file(output_file: Path, data_name: str) -> Path:
     """
-    Print the version and build info of the C++ binary.
+    Move the output of a lazy run to a unique path, so the proxies reading
+    from it survive later runs with the same `data_name`.
     """
-    binary = binary_root / cuda_binary
-    if not binary.exists():
-        raise ValueError(f"Binary not found at {binary}")
-
-    cmd = [str(binary), "--version"]
-    p = subprocess.Popen(
-        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    fd, path = tempfile.mkstemp(
+        prefix=data_name + "_", suffix="_output.h5", dir=output_file.parent
     )
-    _print_stdout_realtime_subp(p)
-    p.communicate()
+    os.close(fd)
+    os.replace(output_file, path)
+    return Path(path)
 
 
-def _run_binary(args: list[str]):
+def _remove_files(
+    input_file: Path | None,
+    output_file: Path,
+    staging_dir: Path | None,
+    lazy_output: H5Output | None = None,
+):
     """
-    Call the C++ binary with args.
-    Print stdout in real time and check the return code.
+    Remove the files of a run. The output file (and `staging_dir`) of a lazy
+    run are removed once its proxies are released instead.
     """
-    binary = binary_root / cuda_binary
-    if not binary.exists():
-        raise ValueError(f"Binary not found at {binary}")
+    if input_file is not None:
+        input_file.unlink(missing_ok=True)
+    paths = [output_file] if staging_dir is None else [output_file, staging_dir]
+    if lazy_output is not None and release_with(lazy_output, *paths):
+        return
+    output_file.unlink(missing_ok=True)
+    if staging_dir is not None:
+        shutil.rmtree(staging_dir, ignore_errors=True)
 
-    cmd = [str(binary), *args]
-    p = subprocess.Popen(
-        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-    )
-    _print_stdout_realtime_subp(p)
 
-    p.communicate()  # update returncode
-    if p.returncode != 0:
-        raise ValueError(
-            f"Binary {str(binary)} terminated with return code {p.returncode}."
+_CORE_DRIVER_MAX_BYTES = 256 * 2**20
+
+
+def _write_input(
+    inp_obj: H5Input,
+    input_file: Path,
+    attrs: dict | None = None,
+    storage: StorageOptions | None = None,
+    update: bool = False,
+    template: InputTemplate | None = None,
+):
+    """
+    Write the input file. With `update=True`, an existing input file is
+    updated in place and new files are written with content fingerprints.
+    With a `template`, matching parts are linked to the template's datasets.
+    """
+    attrs = attrs or {}
+    if update and input_file.exists():
+        with h5py.File(input_file, "r+") as fp:
+            update_hdf5(inp_obj, fp, storage=storage)
+            if "input_hash" not in attrs:
+                # from a previous input
+                fp.attrs.pop("input_hash", None)
+            for k, v in attrs.items():
+                fp.attrs[k] = v
+        return
+
+    # build small files in memory and write them out in one go when closed;
+    # stream large ones to disk so the input is not held in memory twice
+    driver = {}
+    if _input_nbytes(inp_obj) <= _CORE_DRIVER_MAX_BYTES:
+        driver = dict(driver="core", backing_store=True)
+    with h5py.File(input_file, "w", **driver) as fp:
+        serialize_to_hdf5(
+            inp_obj,
+            fp,
+            storage=storage,
+            fingerprints=update,
+            links=None if template is None else template.links(inp_obj),
         )
+        for k, v in attrs.items():
+            fp.attrs[k] = v
 
 
-def _print_stdout_realtime_subp(p: subprocess.Popen):
-    try:
-        while True:
-            s = p.stdout.readline()
-            if s:
-                print(s.decode(), end="")
-            else:
-                break
-    except KeyboardInterrupt as e:
-        p.send_signal(signal.SIGINT)
-        raise e
+def _resolve_checkpoint(
+    options: SolverOptions, input_file: Path, data_name: str
+) -> SolverOptions:
+    """
+    Place the checkpoint file next to the input file if checkpointing
+    is enabled without an explicit file.
+    """
+    if options.checkpointing and options.checkpoint_file is None:
+        checkpoint_file = input_file.with_name(data_name + "_checkpoint.h5")
+        options = dataclasses.replace(options, checkpoint_file=checkpoint_file)
+    return options
+
+
+def _stage_input(
+    inp_obj: H5Input,
+    input_file: Path,
+    output_file: Path,
+    options: SolverOptions,
+    storage: StorageOptions | None = None,
+    update: bool = False,
+    template: InputTemplate | None = None,
+) -> bool:
+    """
+    Write the input file, unless there is a checkpoint of a run with the
+    same input to resume from. Return True when resuming.
+
+    The binary resumes from an existing checkpoint by itself, but it needs
+    the original input file and the partial output file.
+    """
+    if not options.checkpointing:
+        _write_input(inp_obj, input_file, None, storage, update, template)
+        return False
+
+    input_hash = hash_dataclass(inp_obj).hexdigest()
+    checkpoint = Path(options.checkpoint_file)
+    if checkpoint.exists():
+        if input_file.exists() and output_file.exists():
+            with h5py.File(input_file, "r") as fp:
+                previous_hash = fp.attrs.get("input_hash", b"")
+            if previous_hash == input_hash.encode():
+                print(f"Resuming from checkpoint {checkpoint}")
+                return True
+        print(f"Ignoring checkpoint {checkpoint} from a different input")
+        checkpoint.unlink()
+
+    _write_input(
+        inp_obj,
+        input_file,
+        dict(input_hash=np.bytes_(input_hash)),
+        storage,
+        update,
+        template,
+    )
+    return False
+
+
+def _clear_checkpoint(options: SolverOptions):
+    """Remove the checkpoint of a completed run so it is not resumed again."""
+    if options.checkpoint_file is not None:
+        Path(options.checkpoint_file).unlink(missing_ok=True)
+
+
+def _output_chunk_cache(output_file: Path, min_bytes: int = 2**20) -> int:
+    """
+    Chunk cache size for reading an output file: room for a few of its
+    largest chunks, so reading a row of a compressed output does not
+    decompress the same chunk again for every element.
+    """
+    chunk_bytes = [0]
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.chunks is not None:
+            chunk_bytes.append(int(np.prod(obj.chunks)) * obj.dtype.itemsize)
+
+    with h5py.File(output_file, "r") as fp:
+        fp.visititems(visit)
+    return max(min_bytes, 4 * max(chunk_bytes))
+
+
+def _read_output(
+    output_file: Path,
+    options: SolverOptions | None = None,
+    ndims: int = 3,
+    lazy: bool = False,
+    storage: StorageOptions | None = None,
+) -> H5Output:
+    """
+    Read the solver output, skipping results that were not requested.
+    """
+    skip = ()
+    if options is not None:
+        recorded = options.recorded_fields(ndims)
+        skip = {f.name for f in fields(SimulationResults)} - recorded
+    if storage is not None and storage.chunk_cache_bytes is not None:
+        file_kwargs = storage.file_kwargs()
+    else:
+        file_kwargs = dict(rdcc_nbytes=_output_chunk_cache(output_file))
+    with h5py.File(output_file, "r", **file_kwargs) as fp:
+        return deserialize_from_hdf5(H5Output, fp, skip=skip, lazy=lazy)
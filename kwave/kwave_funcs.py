@@ -2,11 +2,15 @@
 Implements some MATLAB functions from the k-Wave package
 """
 from __future__ import annotations
+import dataclasses
+import functools
 import numpy as np
 from numpy import fft
+import scipy.fft
 import matplotlib.pyplot as plt
 
-from kwave.h5output import Grid, Sensor
+from kwave.h5output import Grid, Sensor, PML
+from kwave.h5input import H5Input
 
 
 def gaussian(x, magnitude=None, mean=0, variance=1):
@@ -28,6 +32,103 @@ def gaussian(x, magnitude=None, mean=0, variance=1):
     return gauss_distr
 
 
+class GaussianFilterBank:
+    """
+    Frequency domain Gaussian filters for real signals of length N.
+
+    The coefficients of one or several centre frequencies are computed once
+    on the real FFT (rfft) bins, so filtering a batch costs one rfft of the
+    signals and one irfft per band:
+
+        bank = GaussianFilterBank(Nt, Fs, [3e6, 5e6, 7e6], 80)
+        bands = bank(sensor_data, workers=-1)   # (3, n_sensors, Nt)
+
+    N           - signal length (samples)
+    Fs          - sampling frequency [Hz]
+    freq        - filter centre frequency [Hz], or a sequence of them
+    bandwidth   - filter bandwidth [%], one for all bands or one per band
+    dtype       - precision of the coefficients (float32 inputs are
+                  filtered in single precision with either)
+
+    Each filter is the double-sided Gaussian of `gaussian_filter`.
+    """
+
+    def __init__(self, N: int, Fs: float, freq, bandwidth, dtype=np.float64):
+        self.N = int(N)
+        self.Fs = Fs
+        self.freqs = np.atleast_1d(np.asarray(freq, dtype=np.float64))
+        self.multi_band = np.ndim(freq) > 0
+        bandwidths = np.broadcast_to(bandwidth, self.freqs.shape).astype(np.float64)
+
+        # rfft bins only: the double-sided filter is even in f
+        self.f = scipy.fft.rfftfreq(self.N, 1 / Fs)
+        coeffs = []
+        for mean, bw in zip(self.freqs, bandwidths):
+            variance = (bw / 100 * mean / (2 * np.sqrt(2 * np.log(2)))) ** 2
+            coeffs.append(
+                np.maximum(
+                    gaussian(self.f, 1, mean, variance),
+                    gaussian(self.f, 1, -mean, variance),
+                )
+            )
+        self.coeffs = np.array(coeffs, dtype=dtype)
+        self._coeffs32 = self.coeffs.astype(np.float32)
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def __call__(
+        self,
+        x: np.ndarray,
+        out: np.ndarray | None = None,
+        band: int | None = None,
+        workers: int | None = None,
+    ) -> np.ndarray:
+        """
+        Filter the rows (last axis) of `x`.
+
+        x       - signal/s to filter, (..., N)
+        out     - preallocated output, x.shape for a single band and
+                  (n_bands, *x.shape) for several
+        band    - filter with this band only
+        workers - FFT threads (see scipy.fft, -1 for all CPUs)
+
+        Returns the filtered signal/s in the precision of `x` (float32 or
+        float64).
+        """
+        x = np.asarray(x)
+        if x.shape[-1] != self.N:
+            raise ValueError(f"Expected signals of length {self.N}, got {x.shape}")
+        dtype = np.result_type(x.dtype, np.float32)
+        coeffs = self._coeffs32 if dtype == np.float32 else self.coeffs
+
+        bands = range(len(self)) if band is None else [band]
+        single = band is not None or not self.multi_band
+        shape = x.shape if single else (len(bands), *x.shape)
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"out must have shape {shape}, got {out.shape}")
+
+        X = scipy.fft.rfft(x.astype(dtype, copy=False), axis=-1, workers=workers)
+        tmp = np.empty_like(X)
+        for i, b in enumerate(bands):
+            np.multiply(X, coeffs[b], out=tmp)
+            res = scipy.fft.irfft(
+                tmp, n=self.N, axis=-1, workers=workers, overwrite_x=True
+            )
+            if single:
+                out[...] = res
+            else:
+                out[i] = res
+        return out
+
+
+@functools.lru_cache(maxsize=32)
+def _gaussian_filter_bank(N: int, Fs: float, freq: float, bandwidth: float):
+    return GaussianFilterBank(N, Fs, freq, bandwidth)
+
+
 def gaussian_filter(
     x: np.ndarray, Fs: float, freq: float, bandwidth: float, plot: bool = False
 ):
@@ -51,36 +152,31 @@ def gaussian_filter(
     OUTPUTS:
         signal      - filtered signal/s
 
+    The filter coefficients are cached per (N, Fs, freq, bandwidth); use
+    `GaussianFilterBank` directly for several bands, `out=` or threads.
+
     ABOUT: ported from k-Wave
     """
-    N = x.shape[1]
-    if N % 2 == 0:
-        # N is even
-        f = np.arange(-N // 2, N // 2) * Fs / N
-    else:
-        # N is odd
-        f = np.arange(-(N - 1) // 2, (N - 1) // 2 + 1) * Fs / N
-
-    # compute gaussian filter coefficients
-    mean = freq
-    variance = (bandwidth / 100 * freq / (2 * np.sqrt(2 * np.log(2)))) ** 2
-    magnitude = 1
-
-    # create the double-sided Gaussian filter
-    gauss_filter = np.maximum(
-        gaussian(f, magnitude, mean, variance), gaussian(f, magnitude, -mean, variance)
-    )
-
-    # apply filter
-    x_filt = np.real(
-        fft.ifft(fft.ifftshift(gauss_filter * fft.fftshift(fft.fft(x), -1), -1))
-    )
+    x = np.asarray(x)
+    N = x.shape[-1]
+    bank = _gaussian_filter_bank(N, float(Fs), float(freq), float(bandwidth))
+    x_filt = bank(x)
 
     # plot filter
     if plot:
+        if N % 2 == 0:
+            # N is even
+            f = np.arange(-N // 2, N // 2) * Fs / N
+        else:
+            # N is odd
+            f = np.arange(-(N - 1) // 2, (N - 1) // 2 + 1) * Fs / N
+        gauss_filter = np.interp(np.abs(f), bank.f, bank.coeffs[0])
+
         # compute amplitude spectrum of central signal element
-        as_ = fft.fftshift(np.abs(fft.fft(x[len(x // 2)])) / N, -1)
-        af = fft.fftshift(np.abs(fft.fft(x_filt[len(x_filt) // 2])) / N, -1)
+        x2 = np.atleast_2d(x)
+        x_filt2 = np.atleast_2d(x_filt)
+        as_ = fft.fftshift(np.abs(fft.fft(x2[len(x2) // 2])) / N, -1)
+        af = fft.fftshift(np.abs(fft.fft(x_filt2[len(x_filt2) // 2])) / N, -1)
 
         # get axis scaling factors
         # [f_sc, f_scale, f_prefix] = scaleSI(f)
@@ -102,7 +198,82 @@ def gaussian_filter(
         ax.set_xlim([0, f[-1]])
         ax.set_ylim([0, 1])
 
-    return x
+    return x_filt
+
+
+class EnvelopeDetector:
+    """
+    Envelope detection of real signals of length N via the Hilbert
+    transform, computed with real FFTs:
+
+        H(x) = irfft(-1j * sign(f) * rfft(x, M))[:N]
+        env  = hypot(x, H(x))
+
+    The signals are zero padded to M >= 2 * N (the next fast FFT length) to
+    prevent wrapping at the beginning of the envelope. float32 inputs are
+    processed in single precision, and rows are processed in blocks so the
+    FFT temporaries stay bounded:
+
+        detector = EnvelopeDetector(Nt, workers=-1)
+        env = detector(sensor_data, out=env)
+
+    N           - signal length (samples)
+    workers     - FFT threads (see scipy.fft, -1 for all CPUs)
+    block_bytes - size of the spectrum of a block of rows
+    """
+
+    def __init__(self, N: int, workers: int | None = None, block_bytes: int = 2**25):
+        self.N = int(N)
+        self.M = scipy.fft.next_fast_len(2 * self.N, real=True)
+        self.workers = workers
+        self.block_bytes = block_bytes
+
+        # -1j on the positive frequencies, DC (and Nyquist, which irfft
+        # drops from a real output) set to zero
+        mult = np.full(self.M // 2 + 1, -1j, dtype=np.complex128)
+        mult[0] = 0
+        if self.M % 2 == 0:
+            mult[-1] = 0
+        self._mult = {
+            np.float32: mult.astype(np.complex64),
+            np.float64: mult,
+        }
+
+    def __call__(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Envelope of the rows (last axis) of `x`, in the precision of `x`
+        (float32 or float64). `out` is an optional preallocated output of
+        the shape of `x`.
+        """
+        x = np.asarray(x)
+        if x.shape[-1] != self.N:
+            raise ValueError(f"Expected signals of length {self.N}, got {x.shape}")
+        dtype = np.result_type(x.dtype, np.float32)
+        if out is None:
+            out = np.empty(x.shape, dtype=dtype)
+        elif out.shape != x.shape:
+            raise ValueError(f"out must have shape {x.shape}, got {out.shape}")
+
+        mult = self._mult[dtype.type]
+        rows = x.reshape(-1, self.N)
+        env = out.reshape(-1, self.N)
+        if not np.may_share_memory(env, out):
+            raise ValueError("out must be contiguous")
+        block = max(1, self.block_bytes // (mult.itemsize * len(mult)))
+        for r0 in range(0, len(rows), block):
+            xb = rows[r0 : r0 + block].astype(dtype, copy=False)
+            X = scipy.fft.rfft(xb, n=self.M, axis=-1, workers=self.workers)
+            X *= mult
+            z = scipy.fft.irfft(
+                X, n=self.M, axis=-1, workers=self.workers, overwrite_x=True
+            )
+            np.hypot(xb, z[:, : self.N], out=env[r0 : r0 + block])
+        return out
+
+
+@functools.lru_cache(maxsize=32)
+def _envelope_detector(N: int):
+    return EnvelopeDetector(N)
 
 
 def envelope_detection(x: np.ndarray):
@@ -123,35 +294,16 @@ def envelope_detection(x: np.ndarray):
     OUTPUTS:
         env         - envelope of input function
 
+    Computed with a cached `EnvelopeDetector`; use it directly for `out=`,
+    threads or other block sizes.
+
     ABOUT: ported from k-Wave
     """
-
+    x = np.asarray(x)
     if len(x.shape) == 1:
         x = np.expand_dims(x, 0)
 
-    # compute the FFT of the input function (use zero padding to prevent
-    # effects of wrapping at the beginning of the envelope), if x is a matrix
-    # the fft's are computed across each row
-    X = fft.fft(x, x.shape[1] * 2, -1)
-
-    # multiply the fft by -1i
-    X = -1j * X
-
-    # set the DC frequency to zero
-    X[0] = 0
-
-    # calculate where the negative frequencies start in the FFT
-    neg_f_index = int(np.ceil(X.shape[1] / 2))
-
-    # multiply the negative frequency components by -1
-    X[:, neg_f_index:] = -X[:, neg_f_index:]
-
-    # compute the Hilbert transform using the inverse fft
-    z = fft.ifft(X)
-
-    # extract the envelope
-    env = np.abs(x + 1j * z[:, : x.shape[1]])
-    return env
+    return _envelope_detector(x.shape[-1])(x)
 
 
 def log_compression(signal: np.ndarray, a: float, normalise=False):
@@ -275,3 +427,377 @@ def reorder_sensor_data(kgrid: Grid, sensor: Sensor, sensor_data: np.ndarray):
     # to adjacent sensor points.
     reordered_sensor_data = sensor_data[:, sort_idx]
     return reordered_sensor_data
+
+
+def largest_prime_factor(n: int) -> int:
+    """
+    Largest prime factor of a positive integer (1 for n = 1).
+    """
+    n = int(n)
+    factor, largest = 2, 1
+    while factor * factor <= n:
+        while n % factor == 0:
+            largest = factor
+            n //= factor
+        factor += 1
+    return max(largest, n) if n > 1 else largest
+
+
+def get_optimal_pml_size(
+    grid_size: tuple[int, ...], pml_range: tuple[int, int] = (10, 40)
+) -> tuple[int, ...]:
+    """Find PML sizes that give the smallest prime factors.
+    DESCRIPTION:
+        getOptimalPMLSize finds the size of the perfectly matched layer
+        (PML) that gives an overall grid size with the smallest prime
+        factors when using the first-order simulation functions in k-Wave
+        with the optional input 'PMLInside', false. Choosing grid sizes with
+        small prime factors can have a significant impact on the
+        computational speed, as the code computes spatial gradients using
+        the fast Fourier transform (FFT).
+
+    INPUTS:
+        grid_size   - grid size, e.g. Grid.shape
+        pml_range   - two element vector specifying the min and max PML
+                      size (default = (10, 40))
+
+    OUTPUTS:
+        pml_sz      - PML size for each dimension of grid_size, such that
+                      grid_size + 2 * pml_sz has the smallest largest
+                      prime factor (the thinnest PML wins ties)
+
+    ABOUT: ported from k-Wave
+    """
+    pml_min, pml_max = pml_range
+    if pml_min < 0 or pml_max < pml_min:
+        raise ValueError(f"Invalid PML range {pml_range}")
+
+    pml_sizes = np.arange(pml_min, pml_max + 1)
+    pml_sz = []
+    for n in grid_size:
+        facs = [largest_prime_factor(n + 2 * pml) for pml in pml_sizes]
+        pml_sz.append(int(pml_sizes[np.argmin(facs)]))
+    return tuple(pml_sz)
+
+
+def _pad_field(val, pad: list[tuple[int, int]], ndims: int, mode: str):
+    """Pad a grid-sized field; scalars and (1, 1, 1) values are kept as is."""
+    if val is None or np.size(val) == 1:
+        return val
+    val = np.asarray(val)
+    lead = val.shape[: val.ndim - ndims]
+    padded = np.pad(val.reshape(val.shape[-ndims:]), pad, mode=mode)
+    return padded.reshape(lead + padded.shape)
+
+
+def _shift_index(index, shape: tuple[int, ...], new_shape: tuple[int, ...], offset):
+    """Map linear indices in a grid of `shape` into the expanded grid."""
+    if index is None:
+        return None
+    index = np.asarray(index)
+    subs = np.unravel_index(index.ravel().astype(np.intp), shape)
+    subs = [s + o for s, o in zip(subs, offset)]
+    new = np.ravel_multi_index(subs, new_shape).astype(index.dtype)
+    return new.reshape(index.shape)
+
+
+def expand_grid_for_pml(
+    inp: H5Input,
+    pml_size: tuple[int, ...],
+    pml_alpha: float | tuple[float, ...] = 2.0,
+) -> H5Input:
+    """
+    Expand a simulation so the PML lies outside the original grid
+    (k-Wave's 'PMLInside', false).
+
+    Each axis of `inp.grid` (in Grid.shape order) grows by 2 * pml_size.
+    `pml_alpha` is the PML absorption, for all axes or per axis (also in
+    Grid.shape order).
+    Medium fields are extended with their edge values, the initial pressure
+    is zero padded, and the source and sensor indices (or cuboid corners)
+    are remapped to the expanded grid. Use `crop_to_grid` to cut grid-sized results back to
+    the original grid.
+    """
+    grid = inp.grid
+    shape = tuple(int(n) for n in grid.shape)
+    ndims = len(shape)
+    if len(pml_size) != ndims:
+        raise ValueError(f"Need {ndims} PML sizes, got {pml_size}")
+    if np.ndim(pml_alpha) == 0:
+        pml_alpha = (pml_alpha,) * ndims
+    if len(pml_alpha) != ndims:
+        raise ValueError(f"Need {ndims} PML alphas, got {pml_alpha}")
+
+    new_shape = tuple(n + 2 * pml for n, pml in zip(shape, pml_size))
+    pad = [(pml, pml) for pml in pml_size]
+    names = "zyx"[3 - ndims :]
+
+    new_grid = dataclasses.replace(
+        grid, **{"N" + n: new_n for n, new_n in zip(names, new_shape)}
+    )
+
+    medium = inp.medium
+    new_medium = dataclasses.replace(
+        medium,
+        **{
+            f.name: _pad_field(getattr(medium, f.name), pad, ndims, "edge")
+            for f in dataclasses.fields(medium)
+        },
+    )
+
+    source = inp.source
+    new_source = dataclasses.replace(
+        source,
+        p0_source_input=_pad_field(source.p0_source_input, pad, ndims, "constant"),
+        p_source_index=_shift_index(source.p_source_index, shape, new_shape, pml_size),
+        u_source_index=_shift_index(source.u_source_index, shape, new_shape, pml_size),
+    )
+
+    sensor = inp.sensor
+    if sensor.sensor_mask_type == 1:
+        corners = [
+            tuple(tuple(i + pml for i, pml in zip(c, pml_size)) for c in corner)
+            for corner in sensor.get_cuboid_corners(ndims)
+        ]
+        new_sensor = dataclasses.replace(
+            sensor,
+            sensor_mask_corners=Sensor.make_cuboid_sensor(corners).sensor_mask_corners,
+        )
+    else:
+        new_sensor = dataclasses.replace(
+            sensor,
+            sensor_mask_index=_shift_index(
+                sensor.sensor_mask_index, shape, new_shape, pml_size
+            ),
+        )
+
+    pml_args = {}
+    for n, pml, alpha in zip(names, pml_size, pml_alpha):
+        pml_args[f"pml_{n}_size"] = pml
+        pml_args[f"pml_{n}_alpha"] = alpha
+    for n in "xy":
+        # PML requires x and y entries
+        pml_args.setdefault(f"pml_{n}_size", 0)
+        pml_args.setdefault(f"pml_{n}_alpha", pml_alpha[-1])
+
+    return dataclasses.replace(
+        inp,
+        grid=new_grid,
+        medium=new_medium,
+        source=new_source,
+        sensor=new_sensor,
+        pml=PML(**pml_args),
+    )
+
+
+def crop_to_grid(arr: np.ndarray, pml_size: tuple[int, ...]) -> np.ndarray:
+    """
+    Cut the PML added by `expand_grid_for_pml` off a grid-sized array
+    (the last len(pml_size) axes are cropped).
+    """
+    ndims = len(pml_size)
+    idx = (Ellipsis,) + tuple(slice(pml, -pml if pml else None) for pml in pml_size)
+    assert len(idx) == ndims + 1
+    return arr[idx]
+
+
+def reorder_planar_sensor_data(kgrid: Grid, sensor: Sensor, sensor_data: np.ndarray):
+    """
+    Reshape sensor data recorded on a line (2D) or plane (3D) binary sensor
+    mask for `kspace_line_recon` / `kspace_plane_recon`.
+
+    The mask must fill a rectangle one grid point thick. Data of shape
+    (..., Nt, Nsens), as in `SimulationResults.p`, is returned as
+    (..., Nt, N1) for a line or (..., Nt, N1, N2) for a plane, with the
+    axes of the sensor in `Grid.shape` order.
+    """
+    shape = kgrid.shape
+    if sensor.sensor_mask_type != 0:
+        raise ValueError("The sensor mask must be a binary mask")
+    subs = np.unravel_index(np.ravel(sensor.sensor_mask_index).astype(np.intp), shape)
+    lo = [int(np.min(s)) for s in subs]
+    hi = [int(np.max(s)) + 1 for s in subs]
+    extent = [h - l for l, h in zip(lo, hi)]
+    if extent.count(1) != 1 or int(np.prod(extent)) != len(subs[0]):
+        raise ValueError("The sensor mask must be a line (2D) or a plane (3D)")
+
+    # the sensor indices are sorted in C order, i.e. in the order of the plane
+    sensor_shape = tuple(n for n in extent if n != 1)
+    sensor_data = np.asarray(sensor_data)
+    if len(sensor_data.shape) == 3 and sensor_data.shape[0] == 1:
+        sensor_data = sensor_data[0]
+    order = np.argsort(np.ravel(sensor.sensor_mask_index), kind="stable")
+    sensor_data = sensor_data[..., order]
+    return sensor_data.reshape(sensor_data.shape[:-1] + sensor_shape)
+
+
+@functools.lru_cache(maxsize=16)
+def _kspace_recon_tables(
+    Nt: int, sensor_shape: tuple[int, ...], spacing: tuple[float, ...], dt, c, dtype
+):
+    """
+    Frequency mapping of the k-space reconstruction in natural FFT order,
+    with the real FFT along the last sensor axis.
+
+    Returns (index, wa, wb): the value at every (kx, k_sensor) point is
+    wa * P[index] + wb * P[index + stride] of the flattened spectrum P(w,
+    k_sensor), where stride is the size of one w row. The weights include
+    the linear interpolation along w, the scaling factor and the exclusion
+    of the evanescent part.
+    """
+    Nw = 2 * Nt - 1
+    k_sensor = [2 * np.pi * np.fft.fftfreq(n, d) for n, d in zip(sensor_shape, spacing)]
+    k_sensor[-1] = 2 * np.pi * np.fft.rfftfreq(sensor_shape[-1], spacing[-1])
+    k_sensor = np.meshgrid(*k_sensor, indexing="ij")
+    k_sensor_sq = sum(k**2 for k in k_sensor)
+    stride = k_sensor_sq.size
+
+    # kx from the grid with dx = dt * c, and the w grid spacing
+    kx = 2 * np.pi * np.fft.fftfreq(Nw, dt * c)
+    dw = 2 * np.pi / (Nw * dt)
+    w_max = (Nw - 1) // 2 * dw
+
+    # w = c * |k|, as a position on the non-negative part of the w grid
+    w_new = c * np.sqrt(kx.reshape((-1,) + (1,) * len(sensor_shape)) ** 2 + k_sensor_sq)
+    pos = w_new / dw
+    valid = w_new <= w_max * (1 + 1e-12)
+    i0 = np.minimum(np.floor(pos), (Nw - 1) // 2 - 1).astype(np.int64)
+    frac = np.where(valid, pos - i0, 0)
+
+    def scale(i):
+        # c^2 sqrt((w/c)^2 - |k_sensor|^2) / (2w), 0 in the evanescent region
+        w = i * dw
+        arg = (w / c) ** 2 - k_sensor_sq
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sf = c**2 * np.sqrt(np.maximum(arg, 0)) / (2 * w)
+        sf = np.where(w < c * np.sqrt(k_sensor_sq) * (1 - 1e-12), 0, sf)
+        return np.where((w == 0) & (k_sensor_sq == 0), c / 2, sf)
+
+    index = i0 * stride + np.arange(stride).reshape(k_sensor_sq.shape)
+    wa = np.where(valid, (1 - frac) * scale(i0), 0).astype(dtype)
+    wb = np.where(valid, frac * scale(i0 + 1), 0).astype(dtype)
+    tables = index.ravel(), wa.ravel(), wb.ravel()
+    for arr in tables:
+        arr.flags.writeable = False  # shared through the cache
+    return tables
+
+
+def _kspace_recon(p, spacing, dt, c, pos_cond, workers):
+    p = np.asarray(p)
+    ndims = len(spacing)
+    dtype = np.result_type(p.dtype, np.float32)
+    lead = p.shape[: p.ndim - ndims - 1]
+    Nt, sensor_shape = p.shape[-ndims - 1], p.shape[-ndims:]
+    p = p.reshape((-1, Nt) + sensor_shape).astype(dtype, copy=False)
+
+    # mirror the time domain data about t = 0 (in natural FFT order), so the
+    # cosine transform can be computed using an FFT
+    q = np.concatenate([p, p[:, :0:-1]], axis=1)
+    axes = tuple(range(1, ndims + 2))
+    Q = scipy.fft.rfftn(q, axes=axes, workers=workers)
+
+    # map p(w, k_sensor) onto p(kx, k_sensor)
+    index, wa, wb = _kspace_recon_tables(
+        Nt, sensor_shape, tuple(float(d) for d in spacing), float(dt), float(c), dtype
+    )
+    stride = Q[0, 0].size
+    Qf = Q.reshape(len(Q), -1)
+    P = np.take(Qf, index, axis=1)
+    P *= wa
+    P += wb * np.take(Qf, index + stride, axis=1)
+
+    # inverse FFT, keeping the positive part of the mirrored axis
+    p_rec = scipy.fft.irfftn(
+        P.reshape(Q.shape), s=q.shape[1:], axes=axes, workers=workers, overwrite_x=True
+    )[:, :Nt]
+
+    # correct the scaling (the reconstruction assumes that p0 is symmetrical
+    # about the sensor, and only half the space collects data)
+    p_rec *= 4 / c
+    if pos_cond:
+        np.maximum(p_rec, 0, out=p_rec)
+    return p_rec.reshape(lead + p_rec.shape[1:])
+
+
+def kspace_line_recon(
+    p: np.ndarray,
+    dy: float,
+    dt: float,
+    c: float,
+    pos_cond: bool = False,
+    workers: int | None = None,
+):
+    """2D linear FFT reconstruction.
+    DESCRIPTION:
+        kspaceLineRecon takes an acoustic pressure time-series p_ty recorded
+        over an evenly spaced array of sensor points on a line, and
+        constructs an estimate of the initial acoustic pressure
+        distribution that gave rise to those measurements using an
+        algorithm based on the FFT. The pressure time-series must be
+        indexed as p_ty(time, sensor position). The reconstruction assumes
+        the sensor line is at x = 0 and the initial pressure lies at x > 0.
+
+    INPUTS:
+        p           - pressure time-series, (..., Nt, Ny); leading axes are
+                      reconstructed as separate frames (see
+                      `reorder_planar_sensor_data`)
+        dy          - spatial step of the sensor points [m]
+        dt          - time step [s]
+        c           - acoustic sound speed [m/s]
+
+    OPTIONAL INPUTS:
+        pos_cond    - Boolean controlling whether a positivity condition is
+                      enforced on the reconstructed image
+        workers     - FFT threads (see scipy.fft)
+
+    OUTPUTS:
+        p_xy        - estimate of the initial pressure, (..., Nt, Ny), with
+                      x = c * t, in the precision of p (float32 or float64)
+
+    The frequency mapping (linear interpolation) is cached per
+    (Nt, Ny, dy, dt, c).
+
+    ABOUT: ported from k-Wave
+    """
+    return _kspace_recon(p, (dy,), dt, c, pos_cond, workers)
+
+
+def kspace_plane_recon(
+    p: np.ndarray,
+    dy: float,
+    dz: float,
+    dt: float,
+    c: float,
+    pos_cond: bool = False,
+    workers: int | None = None,
+):
+    """3D planar FFT reconstruction.
+    DESCRIPTION:
+        kspacePlaneRecon takes an acoustic pressure time-series p_tyz
+        recorded over an evenly spaced array of sensor points on a plane,
+        and constructs an estimate of the initial acoustic pressure
+        distribution that gave rise to those measurements using an
+        algorithm based on the FFT. The pressure time-series must be
+        indexed as p_tyz(time, sensor y position, sensor z position). The
+        reconstruction assumes the sensor plane is at x = 0 and the initial
+        pressure lies at x > 0.
+
+    INPUTS:
+        p           - pressure time-series, (..., Nt, Ny, Nz); leading axes
+                      are reconstructed as separate frames
+        dy, dz      - spatial steps of the sensor points [m]
+        dt          - time step [s]
+        c           - acoustic sound speed [m/s]
+
+    OPTIONAL INPUTS:
+        pos_cond    - Boolean controlling whether a positivity condition is
+                      enforced on the reconstructed image
+        workers     - FFT threads (see scipy.fft)
+
+    OUTPUTS:
+        p_xyz       - estimate of the initial pressure, (..., Nt, Ny, Nz),
+                      with x = c * t, in the precision of p
+
+    ABOUT: ported from k-Wave
+    """
+    return _kspace_recon(p, (dy, dz), dt, c, pos_cond, workers)
@@ -0,0 +1,238 @@
+"""
+Structured progress and resource monitoring for solver runs.
+
+`SolverMonitor` parses the text output of the k-Wave C++ binaries into
+events (phases, progress with ETA, reported values), samples the resident
+memory and CPU time of the solver process from /proc, and produces a
+`RunMetrics` record when the run ends.
+
+Events are delivered to a user callback:
+
+    def callback(event):
+        if isinstance(event, kwave.SolverProgress):
+            print(f"{event.percent}% ETA {event.eta:.1f}s")
+
+    kwave.kspaceFirstOrder(..., callback=callback)
+
+Resource samples are taken on a background thread, so the callback must be
+safe to call from another thread.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+import os
+import re
+import threading
+import time
+
+__all__ = (
+    "SolverPhase",
+    "SolverProgress",
+    "SolverInfo",
+    "ResourceSample",
+    "RunMetrics",
+    "SolverMonitor",
+)
+
+
+@dataclass
+class SolverPhase:
+    """A new phase (section heading) in the solver output"""
+
+    name: str
+    time: float  # wall time since launch [s]
+
+
+@dataclass
+class SolverProgress:
+    """A row of the solver's progress table"""
+
+    percent: float
+    elapsed: float  # solver reported elapsed time [s]
+    eta: float  # solver reported time to go [s]
+    time: float  # wall time since launch [s]
+
+
+@dataclass
+class SolverInfo:
+    """A "key: value" line of the solver output (e.g. "Elapsed time: 0.05s")"""
+
+    phase: str
+    key: str
+    value: str
+    time: float  # wall time since launch [s]
+
+
+@dataclass
+class ResourceSample:
+    """Resident memory and CPU time of the solver process"""
+
+    rss_bytes: int
+    cpu_time: float  # user + system [s]
+    time: float  # wall time since launch [s]
+
+
+@dataclass
+class RunMetrics:
+    """Summary of one solver run"""
+
+    returncode: int | None = None
+    wall_time: float = 0.0  # [s]
+    cpu_time: float = 0.0  # user + system [s]
+    peak_rss_bytes: int = 0
+    phase_times: dict[str, float] = field(default_factory=dict)  # [s]
+    info: dict[str, str] = field(default_factory=dict)
+
+
+_BOX_CHARS = re.compile(r"[│┌┐└┘├┤┬┴┼─|+]")
+_PROGRESS = re.compile(r"^(\d+(?:\.\d+)?)%\s+(\S+)\s+(\S+)")
+_KEY_VALUE = re.compile(r"^(.+?):\s*(.*)$")
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d)")
+_DURATION_SCALE = dict(ms=1e-3, s=1.0, m=60.0, h=3600.0, d=86400.0)
+
+
+def _parse_seconds(s: str) -> float | None:
+    """Parse solver durations like "0.05s" or "1h 2m 3s" to seconds."""
+    parts = _DURATION.findall(s)
+    if not parts:
+        return None
+    return sum(float(v) * _DURATION_SCALE[u] for v, u in parts)
+
+
+def _read_proc(pid: int) -> tuple[int, float] | None:
+    """(rss_bytes, cpu_time) of a process from /proc, None if unavailable."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+
+    rss = 0
+    m = re.search(r"^VmRSS:\s+(\d+)\s+kB", status, re.M)
+    if m:
+        rss = int(m.group(1)) * 1024
+
+    # the command name may contain spaces; fields after it are space separated
+    stat_fields = stat[stat.rindex(")") + 2 :].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(stat_fields[11]) + int(stat_fields[12])) / ticks
+    return rss, cpu
+
+
+class SolverMonitor:
+    """
+    Parses solver output lines and samples the solver process.
+
+    callback:
+        Called with every `SolverPhase`, `SolverProgress`, `SolverInfo`,
+        `ResourceSample` and finally the `RunMetrics`.
+    sample_interval:
+        Seconds between resource samples.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[object], None] | None = None,
+        sample_interval: float = 1.0,
+    ):
+        self.callback = callback
+        self.sample_interval = sample_interval
+        self.metrics = RunMetrics()
+        self.phase = "Startup"
+
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _now(self):
+        return time.monotonic() - self._t0
+
+    def _emit(self, event):
+        if self.callback is not None:
+            self.callback(event)
+
+    def start(self, pid: int):
+        """Start sampling the process `pid` on a background thread."""
+        self._t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._sample_loop, args=(pid,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _sample_loop(self, pid: int):
+        while True:
+            self.sample(pid)
+            if self._stop.wait(self.sample_interval):
+                break
+
+    def sample(self, pid: int):
+        res = _read_proc(pid)
+        if res is None:
+            return
+        rss, cpu = res
+        with self._lock:
+            self.metrics.peak_rss_bytes = max(self.metrics.peak_rss_bytes, rss)
+            self.metrics.cpu_time = max(self.metrics.cpu_time, cpu)
+        self._emit(ResourceSample(rss_bytes=rss, cpu_time=cpu, time=self._now()))
+
+    def feed(self, line: str):
+        """Parse one line of solver output."""
+        text = _BOX_CHARS.sub(" ", line).strip()
+        if not text:
+            return
+
+        m = _PROGRESS.match(text)
+        if m:
+            elapsed = _parse_seconds(m.group(2))
+            eta = _parse_seconds(m.group(3))
+            if elapsed is not None and eta is not None:
+                self._emit(
+                    SolverProgress(
+                        percent=float(m.group(1)),
+                        elapsed=elapsed,
+                        eta=eta,
+                        time=self._now(),
+                    )
+                )
+                return
+
+        m = _KEY_VALUE.match(text)
+        if m:
+            key, value = m.group(1).strip(), m.group(2).strip()
+            if key == "Elapsed time":
+                seconds = _parse_seconds(value)
+                if seconds is not None:
+                    times = self.metrics.phase_times
+                    times[self.phase] = times.get(self.phase, 0.0) + seconds
+            else:
+                self.metrics.info[key] = value
+            self._emit(
+                SolverInfo(phase=self.phase, key=key, value=value, time=self._now())
+            )
+            return
+
+        # anything else on its own line is a section heading
+        if not text.startswith(("Progress", "Elapsed")):
+            self.phase = text
+            self._emit(SolverPhase(name=text, time=self._now()))
+
+    def finish(self, returncode: int | None, rusage=None) -> RunMetrics:
+        """
+        Stop sampling and emit the final `RunMetrics`.
+
+        `rusage` (from os.wait4), if given, replaces the sampled
+        peak memory and CPU time with the exact values.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        metrics = self.metrics
+        metrics.returncode = returncode
+        metrics.wall_time = self._now()
+        if rusage is not None:
+            metrics.cpu_time = rusage.ru_utime + rusage.ru_stime
+            metrics.peak_rss_bytes = rusage.ru_maxrss * 1024  # kB on Linux
+        self._emit(metrics)
+        return metrics
@@ -0,0 +1,236 @@
+"""
+Block-wise post-processing of sensor data.
+
+`SensorPipeline` chains row-wise processing stages (e.g. `gaussian_filter`,
+`envelope_detection`, `log_compression`) and runs them over blocks of
+sensors read straight from an output file, writing each processed block
+out before the next one is read:
+
+    pipe = kwave.SensorPipeline(
+        functools.partial(kwave.gaussian_filter, Fs=1 / dt, freq=5e6, bandwidth=80),
+        kwave.envelope_detection,
+        functools.partial(kwave.log_compression, a=3),
+        block_size=256,
+    )
+    pipe.run("output.h5", "bmode.h5")
+
+Only one block of time series and the stages' temporaries for it are in
+memory at a time, so the peak memory is set by `block_size` and not by the
+number of sensors.
+
+Stages are called with a (n_sensors, Nt) block, one time series per row
+(the convention of the functions in `kwave_funcs`), and must return one row
+per sensor (cuboid sensor outputs are processed the same way, cuboid by
+cuboid). The blocks are processed independently, so stages that
+normalise over the whole data (e.g. `log_compression(normalise=True)`)
+normalise per block instead.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable
+import contextlib
+
+import h5py
+import numpy as np
+
+from kwave.h5output import H5Output, SimulationResults
+from kwave.h5_dataclass_helper import LazyDataset, StorageOptions, _read_cuboids
+
+__all__ = ("SensorPipeline",)
+
+
+class SensorPipeline:
+    """
+    Row-wise processing stages applied to blocks of sensors.
+
+    stages:
+        Callables taking and returning a (n_sensors, Nt) array.
+    block_size:
+        Number of sensors processed at once.
+    dtype:
+        dtype of the output.
+    """
+
+    def __init__(
+        self,
+        *stages: Callable[[np.ndarray], np.ndarray],
+        block_size: int = 256,
+        dtype: np.dtype = np.float32,
+    ):
+        if block_size < 1:
+            raise ValueError(f"block_size must be >= 1, got {block_size}")
+        self.stages = list(stages)
+        self.block_size = block_size
+        self.dtype = np.dtype(dtype)
+
+    def then(self, stage: Callable[[np.ndarray], np.ndarray]) -> SensorPipeline:
+        """New pipeline with `stage` appended"""
+        return SensorPipeline(
+            *self.stages, stage, block_size=self.block_size, dtype=self.dtype
+        )
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Apply the stages to one (n_sensors, Nt) block"""
+        n = block.shape[0]
+        for stage in self.stages:
+            block = np.asarray(stage(block))
+            if block.ndim == 1:
+                block = block[np.newaxis]
+            if block.shape[0] != n:
+                raise ValueError(
+                    f"Stage {stage!r} returned {block.shape[0]} rows for {n} sensors"
+                )
+        return block
+
+    def run(
+        self,
+        src,
+        out=None,
+        name: str = "p",
+        out_name: str | None = None,
+        storage: StorageOptions | None = None,
+    ) -> np.ndarray | LazyDataset:
+        """
+        Process sensor data block by block.
+
+        src:
+            Sensor data stored as (1, Nt, Nsens) like `SimulationResults.p`
+            (or (Nt, Nsens)):
+            an output file path (read lazily), an `h5py.Dataset`,
+            `LazyDataset`, `H5Output`, `SimulationResults` or array.
+        out:
+            None      - return a new array.
+            array     - write into it and return it.
+            path      - write dataset `out_name` of the file (appending to
+                        the file if it exists) and return a `LazyDataset`.
+            h5py.Group - write dataset `out_name` of the group.
+        name:
+            Field of `src` to process.
+        out_name:
+            Output dataset name (default: `name`).
+        storage:
+            Layout and compression of an HDF5 output. By default the output
+            is chunked by sensor block.
+
+        The output has the layout of the input, (1, Nt_out, Nsens),
+        where Nt_out is the row length returned by the last stage.
+
+        The outputs of a cuboid sensor (a list of (Cx, Cy, Cz, Nt) arrays,
+        or the group of an output file) are processed cuboid by cuboid and
+        returned as a list of (Cx, Cy, Cz, Nt_out) arrays. In HDF5 they
+        are written like the solver's, as datasets "<out_name>/1", ... of
+        shape (Nt_out, Cz, Cy, Cx), and returned as transposed proxies.
+        """
+        out_name = name if out_name is None else out_name
+        with contextlib.ExitStack() as stack:
+            if isinstance(out, (str, Path)):
+                out_path = Path(out)
+                if isinstance(src, (str, Path)) and Path(src).resolve() == (
+                    out_path.resolve()
+                ):
+                    # processing in place: open the file only once
+                    f = stack.enter_context(h5py.File(out_path, "a"))
+                    src = f[name]
+                else:
+                    f = stack.enter_context(h5py.File(out_path, "a"))
+                out = f
+            src = _open_source(src, name, stack)
+            if isinstance(src, list):
+                return self._run_cuboids(src, out, out_name, storage)
+            if src.ndim < 2 or np.prod(src.shape[:-2]) != 1:
+                raise ValueError(
+                    f"Sensor data must be (..., Nt, Nsens), got {src.shape}"
+                )
+
+            lead = tuple(src.shape[:-2])
+            Nt, Nsens = src.shape[-2:]
+            dset = out
+            for s0 in range(0, Nsens, self.block_size):
+                s1 = min(s0 + self.block_size, Nsens)
+                block = np.asarray(src[..., s0:s1]).reshape(Nt, s1 - s0).T
+                res = self.process(np.ascontiguousarray(block))
+                if dset is None or isinstance(dset, h5py.Group):
+                    shape = (*lead, res.shape[1], Nsens)
+                    dset = self._create_output(dset, out_name, shape, storage)
+                dset[..., s0:s1] = res.T.reshape(*lead, res.shape[1], s1 - s0)
+
+            if isinstance(dset, h5py.Dataset):
+                dset.file.flush()
+                return LazyDataset(dset)
+            return dset
+
+    def _run_cuboids(self, cuboids, out, out_name, storage):
+        if out is not None and not isinstance(out, h5py.Group):
+            raise ValueError("Cuboid outputs are written to new arrays or a file")
+        group = None
+        if out is not None:
+            if out_name in out:
+                del out[out_name]
+            group = out.create_group(out_name)
+
+        res = []
+        for i, cuboid in enumerate(cuboids, 1):
+            *space, Nt = cuboid.shape
+            # blocks of whole (Cy, Cz) slabs, one time series per row
+            step = max(1, self.block_size // int(np.prod(space[1:])))
+            dset = None
+            for x0 in range(0, space[0], step):
+                x1 = min(x0 + step, space[0])
+                block = np.asarray(cuboid[x0:x1]).reshape(-1, Nt)
+                block = self.process(np.ascontiguousarray(block))
+                block = block.reshape(x1 - x0, *space[1:], block.shape[1])
+                if dset is None:
+                    shape = (*space, block.shape[-1])
+                    if group is None:
+                        dset = np.empty(shape, dtype=self.dtype)
+                    else:
+                        kwargs = {}
+                        if storage is not None:
+                            kwargs = storage.dataset_kwargs(str(i), shape[::-1])
+                        dset = group.create_dataset(
+                            str(i), shape=shape[::-1], dtype=self.dtype, **kwargs
+                        )
+                if group is None:
+                    dset[x0:x1] = block
+                else:
+                    dset[..., x0:x1] = block.T
+            res.append(dset)
+
+        if group is None:
+            return res
+        group.file.flush()
+        return _read_cuboids(group, lazy=True)
+
+    def _create_output(self, group, name, shape, storage):
+        if group is None:
+            return np.empty(shape, dtype=self.dtype)
+        if name in group:
+            del group[name]
+        if storage is not None:
+            kwargs = storage.dataset_kwargs(name, shape)
+        else:
+            chunks = (1,) * (len(shape) - 2) + (
+                shape[-2],
+                min(self.block_size, shape[-1]),
+            )
+            kwargs = dict(chunks=chunks) if 0 not in shape else {}
+        return group.create_dataset(name, shape=shape, dtype=self.dtype, **kwargs)
+
+
+def _open_source(src, name: str, stack: contextlib.ExitStack):
+    if isinstance(src, (str, Path)):
+        f = stack.enter_context(h5py.File(src, "r"))
+        src = f[name]
+    if isinstance(src, H5Output):
+        src = src.results
+    if isinstance(src, SimulationResults):
+        src = getattr(src, name)
+        if src is None:
+            raise ValueError(f"No '{name}' sensor data")
+    if isinstance(src, h5py.Group):
+        return _read_cuboids(src, lazy=True)
+    if isinstance(src, list):
+        return src
+    if isinstance(src, (h5py.Dataset, LazyDataset)):
+        return src
+    return np.asarray(src)
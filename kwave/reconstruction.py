@@ -0,0 +1,223 @@
+"""
+Image reconstruction from sensor data.
+
+`DelayAndSum` back-projects the pressure recorded at a binary or cuboid
+sensor mask (`SimulationResults.p`) onto a pixel grid, for photoacoustic
+(one-way) imaging with a homogeneous sound speed:
+
+    das = kwave.DelayAndSum(grid, sensor, c=1500.0)
+    image = das(output.results.p)            # (Nz, Ny, Nx) / (Ny, Nx)
+
+For every pixel and sensor the travel time |r_pixel - r_sensor| / c is
+converted once to a sample index and a linear interpolation weight. These
+delay tables are cached on the object (up to `cache_bytes`), so repeated
+reconstructions, e.g. of many frames or iterations, only gather and sum.
+Pixels are processed in chunks to bound the temporaries, optionally on a
+thread pool.
+"""
+from __future__ import annotations
+import concurrent.futures
+
+import numpy as np
+
+from kwave.h5input import Grid, Sensor
+
+__all__ = ("DelayAndSum", "delay_and_sum")
+
+
+class DelayAndSum:
+    """
+    Delay-and-sum reconstruction for a fixed geometry.
+
+    grid:
+        Simulation grid (positions, dt and Nt).
+    sensor:
+        Binary mask or cuboid sensor the data was recorded with.
+    c:
+        Homogeneous sound speed [m/s].
+    pixels:
+        Pixel positions [m], shape (..., ndims) in the order of
+        `Grid.shape` with the origin at the first grid point. Default: the
+        points of the grid.
+    start_index:
+        1-based time index of the first recorded sample
+        (`SolverOptions.start_index`).
+    chunk_size:
+        Pixels per chunk (default: about 4M pixel-sensor pairs per chunk).
+    cache_bytes:
+        Delay tables are cached if they fit into this size and recomputed
+        chunk by chunk otherwise.
+    workers:
+        Threads processing chunks.
+    """
+
+    def __init__(
+        self,
+        grid: Grid,
+        sensor: Sensor,
+        c: float,
+        pixels: np.ndarray | None = None,
+        start_index: int = 1,
+        chunk_size: int | None = None,
+        cache_bytes: int = 2**30,
+        workers: int = 1,
+    ):
+        if np.size(c) > 1 and np.ptp(c) > 0:
+            raise ValueError("Delay-and-sum needs a homogeneous sound speed")
+
+        shape = grid.shape
+        ndims = len(shape)
+        if sensor.sensor_mask_type == 1:
+            self.sensor_pos = _cuboid_points(grid, sensor)
+        else:
+            self.sensor_pos = grid._points(sensor)
+        if pixels is None:
+            axes = [np.arange(n) * d for n, d in zip(shape, grid.spacing)]
+            pixels = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+        pixels = np.asarray(pixels, dtype=np.float64)
+        if pixels.shape[-1] != ndims:
+            raise ValueError(f"pixels must have shape (..., {ndims})")
+        self.pixel_shape = pixels.shape[:-1]
+        self.pixels = pixels.reshape(-1, ndims)
+
+        self.c = float(np.mean(c))
+        self.dt = float(grid.dt)
+        self.Nt = int(grid.Nt) - start_index + 1
+        self.t0 = (start_index - 1) * self.dt
+
+        n_sens = len(self.sensor_pos)
+        if chunk_size is None:
+            chunk_size = max(1, 2**22 // n_sens)
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+        # 8 bytes of index and 4 bytes of weight per pixel-sensor pair
+        self._cache = None
+        if 12 * len(self.pixels) * n_sens <= cache_bytes:
+            self._cache = {}
+
+    @property
+    def n_sensors(self) -> int:
+        return len(self.sensor_pos)
+
+    def _chunks(self):
+        return [
+            slice(i, min(i + self.chunk_size, len(self.pixels)))
+            for i in range(0, len(self.pixels), self.chunk_size)
+        ]
+
+    def delay_table(self, chunk: slice) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (index, weight) of the pixels in `chunk`, shape (n_pixels, n_sensors).
+        `index` points into the sensor data transposed to (Nsens, Nt + 1)
+        (one zero padding sample per sensor) and flattened. Delays outside
+        the recording point to a padding sample with weight 0.
+        """
+        if self._cache is not None and chunk.start in self._cache:
+            return self._cache[chunk.start]
+
+        pix = self.pixels[chunk]
+        dist = np.linalg.norm(pix[:, None, :] - self.sensor_pos[None, :, :], axis=-1)
+        t = (dist / self.c - self.t0) / self.dt
+        i0 = np.floor(t)
+        weight = (t - i0).astype(np.float32)
+        i0 = i0.astype(np.int64)
+        valid = (i0 >= 0) & (i0 < self.Nt)
+        index = np.arange(self.n_sensors) * (self.Nt + 1) + i0
+        # the padding sample of the first sensor, weight 0
+        index[~valid] = self.Nt
+        weight[~valid] = 0
+
+        if self._cache is not None:
+            self._cache[chunk.start] = (index, weight)
+        return index, weight
+
+    def __call__(self, p: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Reconstruct an image from sensor data p of shape (..., Nt, Nsens)
+        (e.g. `SimulationResults.p`, (1, Nt, Nsens)), or the list of
+        (Cx, Cy, Cz, Nt) arrays of a cuboid sensor. Leading axes other
+        than a single frame are reconstructed as separate frames.
+
+        Returns the sum over the sensors of the delayed signals, shape
+        (*frames, *pixel_shape) with the frame axes of `p` (dropped for a
+        single (1, Nt, Nsens) or (Nt, Nsens) frame).
+        """
+        if isinstance(p, list):
+            # the points of each cuboid in the order of `_cuboid_points`
+            p = np.concatenate([np.reshape(c, (-1, c.shape[-1])) for c in p]).T
+        p = np.asarray(p)
+        if p.shape[-2:] != (self.Nt, self.n_sensors):
+            raise ValueError(
+                f"Expected sensor data of shape (..., {self.Nt}, {self.n_sensors}), "
+                f"got {p.shape}"
+            )
+        frames = p.shape[:-2]
+        if frames == (1,):
+            frames = ()
+        dtype = np.result_type(p.dtype, np.float32)
+
+        # (F, Nsens, Nt + 1), one zero padding sample per sensor
+        data = np.zeros(
+            (int(np.prod(frames)), self.n_sensors, self.Nt + 1), dtype=dtype
+        )
+        data[..., :-1] = p.reshape(-1, self.Nt, self.n_sensors).transpose(0, 2, 1)
+        data = data.reshape(len(data), -1)
+
+        shape = (*frames, *self.pixel_shape)
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"out must have shape {shape}, got {out.shape}")
+        image = out.reshape(len(data), -1)
+        if not np.may_share_memory(image, out):
+            raise ValueError("out must be contiguous")
+
+        def run(chunk):
+            index, weight = self.delay_table(chunk)
+            a = np.take(data, index, axis=1)
+            b = np.take(data, index + 1, axis=1)
+            b -= a
+            b *= weight
+            b += a
+            image[:, chunk] = b.sum(axis=-1)
+
+        chunks = self._chunks()
+        if self.workers > 1 and len(chunks) > 1:
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+                list(executor.map(run, chunks))
+        else:
+            for chunk in chunks:
+                run(chunk)
+        return out
+
+
+def _cuboid_points(grid: Grid, sensor: Sensor) -> np.ndarray:
+    """
+    Positions [m] of the points of a cuboid sensor, shape (n, ndims) in the
+    order of `Grid.shape`, cuboid by cuboid in the C order of their
+    (Cx, Cy, Cz) outputs
+    """
+    ndims = len(grid.shape)
+    pos = []
+    for start, end in sensor.get_cuboid_corners(ndims):
+        axes = [np.arange(a, b + 1) * d for a, b, d in zip(start, end, grid.spacing)]
+        # outputs are indexed x, y, z: the reverse of Grid.shape order
+        points = np.stack(np.meshgrid(*axes[::-1], indexing="ij"), axis=-1)
+        pos.append(points.reshape(-1, ndims)[:, ::-1])
+    return np.concatenate(pos)
+
+
+def delay_and_sum(
+    p: np.ndarray,
+    grid: Grid,
+    sensor: Sensor,
+    c: float,
+    pixels: np.ndarray | None = None,
+    **kwargs,
+) -> np.ndarray:
+    """
+    One-off delay-and-sum reconstruction, see `DelayAndSum`. Keep a
+    `DelayAndSum` object to reuse the delay tables.
+    """
+    return DelayAndSum(grid, sensor, c, pixels, **kwargs)(p)
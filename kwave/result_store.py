@@ -0,0 +1,249 @@
+"""
+Consolidated store for the results of many runs.
+
+A `ResultStore` appends the `SimulationResults` of every run of a sweep to
+one chunked, compressed HDF5 file, indexed by the run parameters:
+
+    store = kwave.ResultStore("sweep.h5", fields=("p",))
+    for pos, (inp, out) in zip(positions, kwave.kspaceFirstOrder_batch(...)):
+        store.append(out, dict(source_x=pos))
+
+    store.read("p", np.s_[:, 0, :, 17])     # sensor 17 of all runs
+    store.read("p", np.s_[3, 0, 100:200])    # a time window of run 3
+    store.select(source_x=0.01)              # run indices by parameters
+
+Layout:
+    /<field>   (Nruns, ...) float32, chunked over runs, time and sensors
+    /<field>/<i> (Nruns, Cx, Cy, Cz, ...) the same per cuboid (1, 2, ...) of a
+               cuboid sensor, e.g. store.read("p/2", np.s_[:, :, :, 0, 10])
+    /params    (Nruns,) JSON of the run parameters
+
+Appends take an exclusive lock (a thread lock and, where available, an
+`fcntl` lock on "<path>.lock" for other processes), so batch workers can
+append concurrently. The parameters are written last and mark a run as
+complete, so an interrupted append is overwritten by the next one.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterator
+import contextlib
+import json
+import threading
+
+import h5py
+import numpy as np
+
+from kwave.h5output import SimulationResults, H5Output
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock
+    fcntl = None
+
+__all__ = ("ResultStore",)
+
+
+class ResultStore:
+    """
+    HDF5 container for the results of many runs.
+
+    path:
+        Store file (created on the first append).
+    fields:
+        `SimulationResults` fields to store, e.g. ("p", "p_max").
+    compression, compression_opts, shuffle:
+        HDF5 filters of the datasets (see `h5py.Group.create_dataset`).
+    chunk_bytes:
+        Target chunk size. Chunks span `run_chunk` runs and a balanced part
+        of the other axes, so reads along the run axis and along the time
+        axis both touch few chunks.
+    """
+
+    run_chunk = 16
+
+    def __init__(
+        self,
+        path: str | Path,
+        fields: tuple[str, ...] = ("p",),
+        compression: str | None = "gzip",
+        compression_opts: int | None = 4,
+        shuffle: bool = True,
+        chunk_bytes: int = 2**20,
+    ):
+        self.path = Path(path)
+        self.fields = tuple(fields)
+        self.compression = compression
+        self.compression_opts = compression_opts if compression == "gzip" else None
+        self.shuffle = shuffle
+        self.chunk_bytes = chunk_bytes
+        self._lock = threading.Lock()
+        self._lock_file = self.path.with_name(self.path.name + ".lock")
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        with self._lock, open(self._lock_file, "a") as fp:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fp, fcntl.LOCK_UN)
+
+    def _chunks(self, shape: tuple[int, ...]) -> tuple[int, ...]:
+        chunks = [max(n, 1) for n in shape]
+        limit = max(1, self.chunk_bytes // (4 * self.run_chunk))
+        while np.prod(chunks) > limit and max(chunks) > 1:
+            i = int(np.argmax(chunks))
+            chunks[i] = (chunks[i] + 1) // 2
+        return (self.run_chunk, *chunks)
+
+    def append(
+        self, results: SimulationResults | H5Output, params: dict | None = None
+    ) -> int:
+        """
+        Append the results of one run with its parameters and return the
+        run's index in the store.
+        """
+        if isinstance(results, H5Output):
+            results = results.results
+
+        arrays = {}
+        for name in self.fields:
+            val = getattr(results, name)
+            if val is None:
+                raise ValueError(f"Run has no '{name}' results")
+            if isinstance(val, list):
+                # cuboid sensor: one dataset per cuboid
+                for i, cuboid in enumerate(val, 1):
+                    arrays[f"{name}/{i}"] = np.asarray(cuboid, dtype=np.float32)
+            else:
+                arrays[name] = np.asarray(val, dtype=np.float32)
+        params_json = json.dumps(params or {}, sort_keys=True, default=_to_json)
+
+        with self._locked(True), h5py.File(self.path, "a") as f:
+            if "params" not in f:
+                f.create_dataset(
+                    "params",
+                    shape=(0,),
+                    maxshape=(None,),
+                    dtype=h5py.string_dtype(),
+                    chunks=(1024,),
+                )
+            n = f["params"].shape[0]
+            for name in self.fields:
+                _check_layout(f.get(name), name, arrays)
+
+            for name, val in arrays.items():
+                if name not in f:
+                    f.create_dataset(
+                        name,
+                        shape=(0, *val.shape),
+                        maxshape=(None, *val.shape),
+                        dtype=np.float32,
+                        chunks=self._chunks(val.shape),
+                        compression=self.compression,
+                        compression_opts=self.compression_opts,
+                        shuffle=self.shuffle,
+                    )
+                dset = f[name]
+                if dset.shape[1:] != val.shape:
+                    raise ValueError(
+                        f"Shape of '{name}' {val.shape} differs from the store's "
+                        f"{dset.shape[1:]}"
+                    )
+                dset.resize(n + 1, axis=0)
+                dset[n] = val
+
+            # written last: the run is complete once its parameters exist
+            f["params"].resize(n + 1, axis=0)
+            f["params"][n] = params_json
+        return n
+
+    def __len__(self) -> int:
+        if not self.path.exists():
+            return 0
+        with self._locked(False), h5py.File(self.path, "r") as f:
+            return f["params"].shape[0] if "params" in f else 0
+
+    @property
+    def params(self) -> list[dict]:
+        """Parameters of all runs, in run order"""
+        if not self.path.exists():
+            return []
+        with self._locked(False), h5py.File(self.path, "r") as f:
+            if "params" not in f:
+                return []
+            return [json.loads(s) for s in f["params"].asstr()[()]]
+
+    def select(self, **criteria) -> np.ndarray:
+        """Indices of the runs whose parameters equal all `criteria`"""
+        return np.array(
+            [
+                i
+                for i, p in enumerate(self.params)
+                if all(p.get(k) == v for k, v in criteria.items())
+            ],
+            dtype=np.intp,
+        )
+
+    def read(self, name: str, index=()) -> np.ndarray:
+        """
+        Read a hyperslab of a field. `index` covers the run axis followed
+        by the axes of the field, e.g. np.s_[:, 0, :, 17] for sensor 17 of
+        every run of "p" (stored as (Nruns, 1, Nt, Nsens)). Run indices
+        count complete runs only (negative ones from the last of them);
+        others raise IndexError.
+        """
+        if not isinstance(index, tuple):
+            index = (index,)
+        with self._locked(False), h5py.File(
+            self.path, "r", rdcc_nbytes=16 * self.chunk_bytes
+        ) as f:
+            n = f["params"].shape[0]
+            runs = index[0] if index else slice(None)
+            if isinstance(runs, slice):
+                # skip a run whose append was interrupted
+                runs = slice(*runs.indices(n))
+            elif isinstance(runs, (int, np.integer)):
+                runs = int(_check_runs(np.intp(runs), n))
+            elif isinstance(runs, (list, np.ndarray)):
+                # h5py needs increasing indices
+                runs = _check_runs(np.asarray(runs, dtype=np.intp), n)
+                order = np.argsort(runs)
+                data = f[name][(runs[order], *index[1:])]
+                return np.take(data, np.argsort(order), axis=0)
+            return f[name][(runs, *index[1:])]
+
+
+def _check_layout(stored, name: str, arrays: dict):
+    """Check that a run has the store's (binary or cuboid) sensor layout"""
+    if stored is None:
+        return
+    if isinstance(stored, h5py.Group):
+        keys = {f"{name}/{k}" for k in stored}
+        if keys != {k for k in arrays if k.startswith(name + "/")}:
+            raise ValueError(
+                f"The store holds '{name}' of {len(keys)} cuboids, the run doesn't"
+            )
+    elif name not in arrays:
+        raise ValueError(
+            f"The store holds '{name}' of a binary sensor, the run doesn't"
+        )
+
+
+def _check_runs(runs: np.ndarray, n: int) -> np.ndarray:
+    """Run indices resolved against the `n` complete runs"""
+    if np.any((runs < -n) | (runs >= n)):
+        raise IndexError(f"Run index {runs} out of range for {n} runs")
+    return np.where(runs < 0, runs + n, runs)
+
+
+def _to_json(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, Path):
+        return str(o)
+    raise TypeError(f"Cannot store parameter of type {type(o)}")
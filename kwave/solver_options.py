@@ -0,0 +1,150 @@
+"""
+Command line options of the k-Wave C++ binaries.
+
+`SolverOptions` selects which `SimulationResults` are recorded and maps the
+selection (plus the start index, compression level, ...) to the
+binary's command line flags.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+__all__ = ("SolverOptions",)
+
+
+# output flag -> SimulationResults fields it records
+_OUTPUT_FIELDS = {
+    "p_raw": ("p",),
+    "p_rms": ("p_rms",),
+    "p_max": ("p_max",),
+    "p_min": ("p_min",),
+    "p_max_all": ("p_max_all",),
+    "p_min_all": ("p_min_all",),
+    "p_final": ("p_final",),
+    "u_raw": ("ux", "uy", "uz"),
+    "u_non_staggered_raw": ("ux_non_staggered", "uy_non_staggered", "uz_non_staggered"),
+    "u_rms": ("ux_rms", "uy_rms", "uz_rms"),
+    "u_max": ("ux_max", "uy_max", "uz_max"),
+    "u_min": ("ux_min", "uy_min", "uz_min"),
+    "u_max_all": ("ux_max_all", "uy_max_all", "uz_max_all"),
+    "u_min_all": ("ux_min_all", "uy_min_all", "uz_min_all"),
+    "u_final": ("ux_final", "uy_final", "uz_final"),
+}
+
+
+@dataclass
+class SolverOptions:
+    """
+    Outputs to record and other command line options for the solver.
+
+    Each boolean output field maps to the flag of the same name
+    (e.g. `p_max_all=True` -> `--p_max_all`). By default only the raw
+    pressure at the sensor (`--p_raw`) is recorded, as in the binary.
+
+    start_index:
+        Time index (1-based) at which sensor recording starts (-s).
+    compression_level:
+        Deflate compression level of the output file, 0-9 (-c).
+    copy_sensor_mask:
+        Copy the sensor mask to the output file (--copy_sensor_mask).
+    extra_args:
+        Passed to the binary as is (e.g. ["-g", "1"] to select a GPU).
+
+    checkpoint_file:
+        Checkpoint file (--checkpoint_file). If checkpointing is enabled
+        without a file, the runner places it next to the input file.
+    checkpoint_interval:
+        Seconds between checkpoints (--checkpoint_interval).
+    checkpoint_timesteps:
+        Time steps between checkpoints (--checkpoint_timesteps).
+    """
+
+    p_raw: bool = True
+    p_rms: bool = False
+    p_max: bool = False
+    p_min: bool = False
+    p_max_all: bool = False
+    p_min_all: bool = False
+    p_final: bool = False
+    u_raw: bool = False
+    u_non_staggered_raw: bool = False
+    u_rms: bool = False
+    u_max: bool = False
+    u_min: bool = False
+    u_max_all: bool = False
+    u_min_all: bool = False
+    u_final: bool = False
+
+    start_index: int = 1
+    compression_level: int | None = None
+    copy_sensor_mask: bool = False
+    extra_args: list[str] = field(default_factory=list)
+
+    checkpoint_file: str | Path | None = None
+    checkpoint_interval: int | None = None
+    checkpoint_timesteps: int | None = None
+
+    def __post_init__(self):
+        if self.start_index < 1:
+            raise ValueError(f"start_index must be >= 1, got {self.start_index}")
+        if self.compression_level is not None and not (
+            0 <= self.compression_level <= 9
+        ):
+            raise ValueError(
+                f"compression_level must be in [0, 9], got {self.compression_level}"
+            )
+
+    @property
+    def checkpointing(self) -> bool:
+        return (
+            self.checkpoint_file is not None
+            or self.checkpoint_interval is not None
+            or self.checkpoint_timesteps is not None
+        )
+
+    @property
+    def outputs(self) -> list[str]:
+        """Names of the selected output flags"""
+        return [
+            f.name
+            for f in fields(self)
+            if f.name in _OUTPUT_FIELDS and getattr(self, f.name)
+        ]
+
+    def recorded_fields(self, ndims: int = 3) -> set[str]:
+        """
+        Names of the `SimulationResults` fields the solver will write
+        for a simulation with `ndims` dimensions.
+        """
+        axes = "xyz"[:ndims]
+        recorded = set()
+        for name in self.outputs:
+            for fname in _OUTPUT_FIELDS[name]:
+                if fname[0] == "u" and fname[1] not in axes:
+                    continue
+                recorded.add(fname)
+        return recorded
+
+    def to_args(self, checkpoint: bool = True) -> list[str]:
+        """
+        Command line arguments for the binary (excluding -i/-o).
+
+        With `checkpoint=False` the checkpoint flags, which do not change
+        the results, are left out.
+        """
+        args = []
+        if self.start_index != 1:
+            args += ["-s", str(self.start_index)]
+        if self.compression_level is not None:
+            args += ["-c", str(self.compression_level)]
+        args += ["--" + name for name in self.outputs]
+        if self.copy_sensor_mask:
+            args.append("--copy_sensor_mask")
+        args += list(self.extra_args)
+        if checkpoint and self.checkpoint_file is not None:
+            args += ["--checkpoint_file", str(self.checkpoint_file)]
+        if checkpoint and self.checkpoint_interval is not None:
+            args += ["--checkpoint_interval", str(self.checkpoint_interval)]
+        if checkpoint and self.checkpoint_timesteps is not None:
+            args += ["--checkpoint_timesteps", str(self.checkpoint_timesteps)]
+        return args
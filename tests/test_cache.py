@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import h5py
+import numpy as np
+import kwave
+import kwave.kspaceFirstOrder_runner
+from kwave import SimulationCache
+
+
+def _make_input(p0_value=1.0):
+    N = 16
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = p0_value
+    mask = np.zeros((N, N))
+    mask[2, 2] = 1
+    return dict(
+        grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=10, dt=2e-8),
+        medium=kwave.Medium(c0=1500, alpha_coeff=0.75, alpha_power=1.5),
+        sensor=kwave.Sensor.make_binary_sensor(mask),
+        source=kwave.Source(p0_source_input=p0),
+    )
+
+
+def _write_output(fname, nbytes=1000):
+    with h5py.File(fname, "w") as fp:
+        fp["p"] = np.ones((1, 1, nbytes // 4), dtype=np.float32)
+
+
+def test_cache_key_is_stable(tmp_path):
+    make_input = kwave.kspaceFirstOrder_runner._make_input
+    a = make_input(**_make_input())
+    b = make_input(**_make_input())
+    b.medium.c0 = np.float64(1500.0)  # same value once cast to float32
+    c = make_input(**_make_input(p0_value=2.0))
+
+    cache = SimulationCache(tmp_path)
+    assert cache.make_key(a) == cache.make_key(b)
+    assert cache.make_key(a) != cache.make_key(c)
+    assert cache.make_key(a) != cache.make_key(a, ["--p_max"])
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = SimulationCache(tmp_path / "cache", max_bytes=25000)
+    for i in range(3):
+        _write_output(tmp_path / f"out{i}.h5", 8000)
+        cache.put(f"key{i}", tmp_path / f"out{i}.h5")
+    assert len(cache) == 2  # each file is > 8000 bytes on disk
+    assert "key0" not in cache
+
+    assert cache.get("key1") is not None  # key1 is now most recently used
+    _write_output(tmp_path / "out3.h5", 8000)
+    cache.put("key3", tmp_path / "out3.h5")
+    assert "key1" in cache and "key2" not in cache
+
+    # index is persisted
+    reopened = SimulationCache(tmp_path / "cache", max_bytes=25000)
+    assert set(reopened._index) == {"key1", "key3"}
+    np.testing.assert_array_equal(reopened.get("key3").results.p, 1)
+
+
+def test_cache_skips_binary(tmp_path, monkeypatch):
+    # fake solver that copies a prepared output file and counts its runs
+    prepared = tmp_path / "prepared.h5"
+    _write_output(prepared)
+    counter = tmp_path / "runs"
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(f'#!/bin/sh\necho run >> {counter}\ncp {prepared} "$4"\n')
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    cache = SimulationCache(tmp_path / "cache")
+    for _ in range(2):
+        _, output = kwave.kspaceFirstOrder(
+            **_make_input(), data_path=tmp_path / "data", cache=cache
+        )
+        assert output.results.p.shape == (1, 1, 250)
+    assert counter.read_text().count("run") == 1
+
+
+def test_cache_key_off_event_loop(tmp_path, monkeypatch):
+    prepared = tmp_path / "prepared.h5"
+    _write_output(prepared)
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(f'#!/bin/sh\ncp {prepared} "$4"\n')
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    cache = SimulationCache(tmp_path / "cache")
+    make_key = cache.make_key
+    threads = []
+
+    def record_thread(*args):
+        threads.append(threading.get_ident())
+        return make_key(*args)
+
+    monkeypatch.setattr(cache, "make_key", record_thread)
+
+    async def run():
+        await kwave.kspaceFirstOrder_async(
+            **_make_input(), data_path=tmp_path / "data", cache=cache
+        )
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import kwave
+from kwave.kspaceFirstOrder_runner import _make_input
+
+
+def _make_input_3d(N=32, Nt=100, heterogeneous=False):
+    grid = kwave.Grid(Nx=N, Ny=N, Nz=N, dx=1e-4, dy=1e-4, dz=1e-4, Nt=Nt, dt=2e-8)
+    c0 = np.full((N, N, N), 1500.0) if heterogeneous else 1500.0
+    medium = kwave.Medium(c0=c0, alpha_coeff=0.75, alpha_power=1.5)
+    mask = np.zeros((N, N, N))
+    mask[N // 2, N // 2, :] = 1
+    sensor = kwave.Sensor.make_binary_sensor(mask)
+    source = kwave.Source(p0_source_input=np.zeros((N, N, N)))
+    return _make_input(grid, medium, sensor, source)
+
+
+def test_estimate_scaling():
+    inp = _make_input_3d()
+    est = kwave.estimate(inp)
+    assert est.grid_points == 32**3 and est.time_steps == 100
+    assert est.output_bytes == 4 * 32 * 100
+    assert est.memory_bytes > kwave.EstimateModel().memory_overhead
+
+    # grid sized outputs and heterogeneous media need more memory
+    est_all = kwave.estimate(inp, outputs=["p_raw", "p_max_all"])
+    assert est_all.output_bytes == est.output_bytes + 4 * 32**3
+    # one grid matrix and one sensor buffer
+    assert est_all.memory_bytes == est.memory_bytes + 4 * 32**3 + 4 * 32
+    assert kwave.estimate(_make_input_3d(heterogeneous=True)).memory_bytes > (
+        est.memory_bytes
+    )
+
+    # runtime grows with the number of time steps
+    assert kwave.estimate(_make_input_3d(Nt=200)).runtime > est.runtime
+
+    with pytest.raises(ValueError):
+        kwave.estimate(inp, outputs=["p_typo"])
+
+
+def test_calibrate():
+    truth = kwave.EstimateModel(
+        memory_overhead=100 * 2**20,
+        memory_scale=1.5,
+        runtime_overhead=0.5,
+        fft_time=1e-9,
+    )
+    runs = []
+    for N, Nt in ((16, 50), (32, 100), (48, 80)):
+        inp = _make_input_3d(N=N, Nt=Nt)
+        est = kwave.estimate(inp, model=truth)
+        metrics = kwave.RunMetrics(
+            returncode=0, wall_time=est.runtime, peak_rss_bytes=est.memory_bytes
+        )
+        runs.append((inp, None, metrics))
+
+    model = kwave.EstimateModel.calibrate(runs)
+    assert model.memory_scale == pytest.approx(1.5, rel=1e-3)
+    assert model.memory_overhead == pytest.approx(100 * 2**20, rel=1e-3)
+    assert model.fft_time == pytest.approx(1e-9, rel=1e-3)
+    assert model.runtime_overhead == pytest.approx(0.5, rel=1e-3)
+
+
+def test_memory_limit():
+    N = 16
+    grid = kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=10, dt=2e-8)
+    medium = kwave.Medium(c0=1500.0, rho0=1000.0, rho0_sgx=1000.0, rho0_sgy=1000.0)
+    mask = np.zeros((N, N))
+    mask[0, 0] = 1
+    kwargs = dict(
+        grid=grid,
+        medium=medium,
+        sensor=kwave.Sensor.make_binary_sensor(mask),
+        source=kwave.Source(p0_source_input=np.zeros((N, N))),
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=kwave.PML(4, 2.0, 4, 2.0),
+        backend="numpy",
+    )
+    with pytest.raises(MemoryError):
+        kwave.kspaceFirstOrder(**kwargs, memory_limit=2**20)
+
+    events = []
+    with pytest.warns(ResourceWarning):
+        _, output = kwave.kspaceFirstOrder(
+            **kwargs,
+            memory_limit=2**20,
+            on_memory_limit="warn",
+            callback=events.append,
+        )
+    assert output.results.p.shape == (1, 10, 1)
+    assert isinstance(events[0], kwave.ResourceEstimate)
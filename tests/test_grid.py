@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import kwave
+
+
+def test_make_time_explicit_t_end():
+    grid = kwave.Grid(Nx=64, Ny=64, dx=1e-4, dy=1e-4)
+    grid.make_time(1500.0, cfl=0.3, t_end=1e-5)
+    assert grid.dt == pytest.approx(0.3 * 1e-4 / 1500.0)
+    assert grid.Nt == int(np.ceil(1e-5 / grid.dt))
+
+
+def test_make_time_sensor_aware():
+    N = 128
+    grid = kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4)
+    c = np.full((N, N), 1500.0)
+    c[:10] = 1400.0
+    grid.make_time(c)
+    Nt_diagonal = grid.Nt
+
+    p0 = np.zeros((N, N))
+    p0[60, 60] = 1
+    mask = np.zeros((N, N))
+    mask[60, 70] = mask[70, 60] = 1
+    source = kwave.Source(p0_source_input=p0)
+    sensor = kwave.Sensor.make_binary_sensor(mask)
+
+    t = grid.time_of_flight(c, source, sensor)
+    assert t == pytest.approx(10 * 1e-4 / 1400.0)
+
+    grid.make_time(c, source=source, sensor=sensor, t_extra=1e-6)
+    assert grid.dt == pytest.approx(0.3 * 1e-4 / 1500.0)
+    assert (grid.Nt - 1) * grid.dt < t + 1e-6 <= grid.Nt * grid.dt
+    assert grid.Nt < Nt_diagonal / 5
+
+    # round trip via the worst corner of the grid
+    t_rt = grid.time_of_flight(c, mask, mask, round_trip=True)
+    points = np.array([[60, 70], [70, 60]])
+    dist = max(
+        2 * np.linalg.norm(points - corner, axis=1).max()
+        for corner in ([0, 0], [0, 127], [127, 0], [127, 127])
+    )
+    assert t_rt == pytest.approx(dist * 1e-4 / 1400.0)
@@ -1,8 +1,14 @@
+import asyncio
+import gc
+import inspect
 import tempfile
+import threading
 from pathlib import Path
 
 import h5py
+import pytest
 import numpy as np
+import kwave
 import kwave.kspaceFirstOrder_runner
 from kwave.h5_compare import compare_hdf5_files
 
@@ -19,3 +25,378 @@ def test_kspaceFirstOrder_output():
         )
 
         compare_hdf5_files(true_output, outfile)
+
+
+def test_kspaceFirstOrder_batch_order():
+    N = 32
+    inputs = []
+    for i in range(3):
+        p0 = np.zeros((N, N))
+        p0[N // 2, 8 + 4 * i] = 1.0
+        mask = np.zeros((N, N))
+        mask[N // 2, N - 8] = 1
+        inputs.append(
+            dict(
+                grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=60, dt=2e-8),
+                medium=kwave.Medium(c0=1500.0),
+                sensor=kwave.Sensor.make_binary_sensor(mask),
+                source=kwave.Source(p0_source_input=p0),
+                simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+                pml=kwave.PML(6, 2.0, 6, 2.0),
+            )
+        )
+
+    results = kwave.kspaceFirstOrder_batch(inputs, max_workers=3, backend="numpy")
+    assert all(inp.source is d["source"] for (inp, _), d in zip(results, inputs))
+
+    # the source moves towards the sensor, so the arrival gets earlier
+    arrivals = [np.argmax(out.results.p[0, :, 0]) for _, out in results]
+    assert arrivals[0] > arrivals[1] > arrivals[2]
+
+    it = kwave.kspaceFirstOrder_batch(
+        inputs, max_workers=2, backend="numpy", as_completed=True
+    )
+    assert sorted(i for i, _ in it) == [0, 1, 2]
+
+
+def test_kspaceFirstOrder_batch_starts_eagerly(tmp_path, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(**job):
+        started.set()
+        release.wait(5)
+        return job["data_name"], None
+
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "kspaceFirstOrder", run)
+    it = kwave.kspaceFirstOrder_batch(
+        [{}, {}, {}], max_workers=1, data_path=tmp_path, as_completed=True
+    )
+    # the first job runs before the iterator is consumed
+    assert started.wait(5)
+    release.set()
+    assert next(it)[0] == 0
+    # closing the iterator cancels the jobs that have not started
+    it.close()
+
+
+def test_kspaceFirstOrder_async_cancel(tmp_path, monkeypatch):
+    # fake solver that runs until interrupted
+    marker = tmp_path / "interrupted"
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(
+        "#!/bin/sh\n"
+        f"trap 'touch {marker}; exit 130' INT\n"
+        "echo started\n"
+        "while true; do sleep 0.05; done\n"
+    )
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    async def main():
+        task = asyncio.create_task(
+            kwave.kspaceFirstOrder_runner._run_binary_async(["-i", "in.h5"])
+        )
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(main())
+    assert marker.exists()
+
+
+def test_solver_options_args():
+    options = kwave.SolverOptions(
+        p_raw=False, p_max_all=True, u_final=True, start_index=100, compression_level=4
+    )
+    assert options.to_args() == ["-s", "100", "-c", "4", "--p_max_all", "--u_final"]
+    assert options.recorded_fields(ndims=2) == {"p_max_all", "ux_final", "uy_final"}
+
+
+def test_kspaceFirstOrder_resume_from_checkpoint(tmp_path, monkeypatch):
+    # fake solver that is "preempted" after writing a checkpoint, and
+    # completes when it finds one
+    checkpoint = tmp_path / "data" / "ckpt.h5"
+    prepared = tmp_path / "prepared.h5"
+    with h5py.File(prepared, "w") as fp:
+        fp["p"] = np.ones((1, 4, 1), dtype=np.float32)
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(
+        "#!/bin/sh\n"
+        f'if [ -e {checkpoint} ]; then cp {prepared} "$4"; exit 0; fi\n'
+        f'touch {checkpoint} "$4"\n'
+        "exit 1\n"
+    )
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    N = 16
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = 1.0
+    args = dict(
+        grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+        medium=kwave.Medium(c0=1500.0),
+        sensor=kwave.Sensor.make_binary_sensor(p0),
+        source=kwave.Source(p0_source_input=p0),
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        options=kwave.SolverOptions(checkpoint_file=checkpoint, checkpoint_interval=60),
+        data_path=tmp_path / "data",
+        keep_files=True,
+    )
+
+    with pytest.raises(ValueError):
+        kwave.kspaceFirstOrder(**args)
+    input_file = tmp_path / "data" / "kwave_data_input.h5"
+    mtime = input_file.stat().st_mtime_ns
+
+    _, output = kwave.kspaceFirstOrder(**args)
+    assert input_file.stat().st_mtime_ns == mtime  # input was not rewritten
+    assert output.results.p.shape == (1, 4, 1)
+    assert not checkpoint.exists()
+
+
+def test_kspaceFirstOrder_shm_staging(tmp_path, monkeypatch):
+    # fake solver that checks where its files are and writes an output
+    prepared = tmp_path / "prepared.h5"
+    with h5py.File(prepared, "w") as fp:
+        fp["p"] = np.ones((1, 4, 1), dtype=np.float32)
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(
+        f'#!/bin/sh\necho "$2" > {tmp_path / "args"}\ncp {prepared} "$4"\n'
+    )
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+    shm = tmp_path / "shm"
+    shm.mkdir()
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "shm_root", shm)
+
+    N = 16
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = 1.0
+    _, output = kwave.kspaceFirstOrder(
+        grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+        medium=kwave.Medium(c0=1500.0),
+        sensor=kwave.Sensor.make_binary_sensor(p0),
+        source=kwave.Source(p0_source_input=p0),
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        data_path=tmp_path / "data",
+        staging="auto",
+    )
+    assert output.results.p.shape == (1, 4, 1)
+    assert (tmp_path / "args").read_text().startswith(str(shm))
+    assert list(shm.iterdir()) == []  # cleaned up
+
+    # a checkpoint in a private /dev/shm directory could never be resumed
+    with pytest.raises(ValueError, match="Checkpointing"):
+        kwave.kspaceFirstOrder(
+            grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+            medium=kwave.Medium(c0=1500.0),
+            sensor=kwave.Sensor.make_binary_sensor(p0),
+            source=kwave.Source(p0_source_input=p0),
+            data_path=tmp_path / "data",
+            staging="shm",
+            options=kwave.SolverOptions(checkpoint_interval=60),
+        )
+    assert list(shm.iterdir()) == []
+
+
+def test_kspaceFirstOrder_async_matches_sync(tmp_path, monkeypatch, capsys):
+    sync_params = inspect.signature(kwave.kspaceFirstOrder).parameters
+    async_params = dict(inspect.signature(kwave.kspaceFirstOrder_async).parameters)
+    async_params.pop("executor")
+    assert list(async_params.items()) == list(sync_params.items())
+
+    # a failing binary is reported the same way and its input file is kept
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text("#!/bin/sh\nexit 3\n")
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    N = 16
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = 1.0
+    args = dict(
+        grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+        medium=kwave.Medium(c0=1500.0),
+        sensor=kwave.Sensor.make_binary_sensor(p0),
+        source=kwave.Source(p0_source_input=p0),
+        data_path=tmp_path / "data",
+    )
+    input_file = tmp_path / "data" / "kwave_data_input.h5"
+    for run in (
+        lambda: kwave.kspaceFirstOrder(**args),
+        lambda: asyncio.run(kwave.kspaceFirstOrder_async(**args)),
+    ):
+        with pytest.raises(ValueError, match="return code 3"):
+            run()
+        assert f"Check the input file {input_file}" in capsys.readouterr().out
+        assert input_file.exists()
+        input_file.unlink()
+
+
+def test_kspaceFirstOrder_lazy_own_output(tmp_path, monkeypatch):
+    # fake solver that copies whatever output is prepared for the next run
+    prepared = tmp_path / "prepared.h5"
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(f'#!/bin/sh\ncp {prepared} "$4"\n')
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+    shm = tmp_path / "shm"
+    shm.mkdir()
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "shm_root", shm)
+
+    N = 16
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = 1.0
+
+    def run(value, staging):
+        with h5py.File(prepared, "w") as fp:
+            fp["p"] = np.full((1, 4, 1), value, dtype=np.float32)
+        return kwave.kspaceFirstOrder(
+            grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+            medium=kwave.Medium(c0=1500.0),
+            sensor=kwave.Sensor.make_binary_sensor(p0),
+            source=kwave.Source(p0_source_input=p0),
+            simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+            data_name="lazy",
+            data_path=tmp_path / "data",
+            staging=staging,
+            lazy=True,
+        )[1]
+
+    # a second run with the same data_name leaves the first run's file alone
+    first = run(1, "disk")
+    second = run(2, "disk")
+    assert isinstance(first.results.p, kwave.LazyDataset)
+    np.testing.assert_array_equal(first.results.p[()], 1)
+    np.testing.assert_array_equal(second.results.p[()], 2)
+    assert len(list((tmp_path / "data").iterdir())) == 2
+
+    # the files are removed with the proxies
+    second.results.p.close()
+    assert len(list((tmp_path / "data").iterdir())) == 1
+    del first
+    gc.collect()
+    assert list((tmp_path / "data").iterdir()) == []
+
+    # including the private /dev/shm directory
+    output = run(3, "shm")
+    assert len(list(shm.iterdir())) == 1
+    np.testing.assert_array_equal(output.results.p.T[()], 3)
+    del output
+    gc.collect()
+    assert list(shm.iterdir()) == []
+
+
+def test_kspaceFirstOrder_reuse_input(tmp_path, monkeypatch):
+    prepared = tmp_path / "prepared.h5"
+    with h5py.File(prepared, "w") as fp:
+        fp["p"] = np.ones((1, 4, 1), dtype=np.float32)
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(f'#!/bin/sh\ncp {prepared} "$4"\n')
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    updates = []
+
+    def update_hdf5(*args, **kwargs):
+        updates.append(kwave.update_hdf5(*args, **kwargs))
+        return updates[-1]
+
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "update_hdf5", update_hdf5)
+
+    N = 32
+    c0 = np.random.default_rng(0).uniform(1400, 1600, (N, N)).astype(np.float32)
+    mask = np.zeros((N, N))
+    mask[0, :] = 1
+    input_file = tmp_path / "data" / "kwave_data_input.h5"
+    for i in range(3):
+        p0 = np.zeros((N, N))
+        p0[N // 2, 4 + 8 * i] = 1.0
+        _, output = kwave.kspaceFirstOrder(
+            grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+            medium=kwave.Medium(c0=c0),
+            sensor=kwave.Sensor.make_binary_sensor(mask),
+            source=kwave.Source(p0_source_input=p0),
+            simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+            data_path=tmp_path / "data",
+            reuse_input=True,
+        )
+        assert output.results.p.shape == (1, 4, 1)
+        with h5py.File(input_file, "r") as fp:
+            np.testing.assert_array_equal(fp["p0_source_input"][0], p0)
+
+    # the first run writes the file, the others only rewrite the source
+    assert updates == [["p0_source_input"], ["p0_source_input"]]
+
+
+def test_kspaceFirstOrder_input_template(tmp_path, monkeypatch):
+    prepared = tmp_path / "prepared.h5"
+    with h5py.File(prepared, "w") as fp:
+        fp["p"] = np.ones((1, 4, 1), dtype=np.float32)
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(f'#!/bin/sh\ncp {prepared} "$4"\n')
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    N = 64
+    c0 = np.random.default_rng(0).uniform(1400, 1600, (N, N)).astype(np.float32)
+    medium = kwave.Medium(c0=c0, rho0=1000.0, rho0_sgx=1000.0, rho0_sgy=1000.0)
+    pml = kwave.PML(10, 2.0, 10, 2.0)
+    template = kwave.InputTemplate(tmp_path / "template.h5", medium, pml)
+
+    mask = np.zeros((N, N))
+    mask[0, :] = 1
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = 1.0
+    args = dict(
+        grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+        sensor=kwave.Sensor.make_binary_sensor(mask),
+        source=kwave.Source(p0_source_input=p0),
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=pml,
+        data_path=tmp_path / "data",
+        keep_files=True,
+        template=template,
+    )
+    input_file = tmp_path / "data" / "kwave_data_input.h5"
+
+    # an equal (not identical) medium is linked
+    kwave.kspaceFirstOrder(medium=kwave.Medium(**vars(medium)), **args)
+    with h5py.File(input_file, "r") as fp:
+        assert isinstance(fp.get("c0", getlink=True), h5py.ExternalLink)
+        assert isinstance(fp.get("pml_x_size", getlink=True), h5py.ExternalLink)
+        assert isinstance(fp.get("p0_source_input", getlink=True), h5py.HardLink)
+        np.testing.assert_array_equal(fp["c0"][0], c0)
+        assert fp["c0"].attrs["data_type"] == b"float"
+
+    # a different medium is written to the input file
+    kwave.kspaceFirstOrder(medium=kwave.Medium(c0=c0 + 1), **args)
+    with h5py.File(input_file, "r") as fp:
+        assert isinstance(fp.get("c0", getlink=True), h5py.HardLink)
+        assert isinstance(fp.get("pml_x_size", getlink=True), h5py.ExternalLink)
+
+    # uniform medium arrays are collapsed in the template and in the inputs
+    rho0 = np.full((N, N), 1000.0)
+    array_medium = kwave.Medium(c0=c0, rho0=rho0, rho0_sgx=rho0, rho0_sgy=rho0)
+    template = kwave.InputTemplate(tmp_path / "template.h5", array_medium, pml)
+    args["template"] = template
+    for m in (array_medium, kwave.Medium(c0=c0.copy(), rho0=rho0.copy())):
+        m.rho0_sgx = m.rho0_sgy = m.rho0
+        kwave.kspaceFirstOrder(medium=m, **args)
+        with h5py.File(input_file, "r") as fp:
+            for key in ("c0", "rho0", "rho0_sgx", "rho0_sgy"):
+                assert isinstance(fp.get(key, getlink=True), h5py.ExternalLink)
+            assert fp["rho0"].shape == (1, 1, 1)
+
+    # the template's own array, modified in place, no longer matches
+    c0[0, 0] += 10
+    kwave.kspaceFirstOrder(medium=array_medium, **args)
+    with h5py.File(input_file, "r") as fp:
+        assert isinstance(fp.get("c0", getlink=True), h5py.HardLink)
+        assert isinstance(fp.get("rho0", getlink=True), h5py.HardLink)
+        np.testing.assert_array_equal(fp["c0"][0], c0)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import threading
+
+import numpy as np
+import pytest
+import kwave
+import kwave.kspaceFirstOrder_runner
+
+
+def _make_2d_inputs(N=64, Nt=120):
+    grid = kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=Nt, dt=2e-8)
+    medium = kwave.Medium(c0=1500.0, rho0=1000.0, rho0_sgx=1000.0, rho0_sgy=1000.0)
+    p0 = np.zeros((N, N))
+    p0[N // 2, N // 2] = 1.0
+    mask = np.zeros((N, N))
+    mask[N // 2, N // 2 + 15] = 1
+    mask[N // 2 + 15, N // 2] = 1
+    sensor = kwave.Sensor.make_binary_sensor(mask)
+    source = kwave.Source(p0_source_input=p0)
+    return grid, medium, sensor, source
+
+
+def test_numpy_backend_arrival_time():
+    grid, medium, sensor, source = _make_2d_inputs()
+    _, output = kwave.kspaceFirstOrder(
+        grid=grid,
+        medium=medium,
+        sensor=sensor,
+        source=source,
+        simulation_flags=kwave.SimulationFlags(p0_source_flag=1, absorbing_flag=0),
+        pml=kwave.PML(10, 2.0, 10, 2.0),
+        backend="numpy",
+    )
+    p = output.results.p
+    assert isinstance(output, kwave.H5Output)
+    assert p.shape == (1, grid.Nt, 2)
+    assert p.dtype == np.float32
+
+    # both sensors are 15 points from the source
+    expected = 15 * grid.dx / 1500.0 / grid.dt
+    arrival = np.argmax(p[0], axis=0)
+    assert np.all(np.abs(arrival - expected) < 3)
+    assert arrival[0] == arrival[1]
+
+
+def test_numpy_backend_output_selection():
+    grid, medium, sensor, source = _make_2d_inputs(N=32, Nt=50)
+    options = kwave.SolverOptions(
+        p_raw=True, p_max=True, p_final=True, u_raw=True, start_index=11
+    )
+    _, output = kwave.kspaceFirstOrder(
+        grid=grid,
+        medium=medium,
+        sensor=sensor,
+        source=source,
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=kwave.PML(6, 2.0, 6, 2.0),
+        options=options,
+        backend="numpy",
+    )
+    res = output.results
+    assert res.p.shape == (1, 40, 2)
+    assert res.ux.shape == res.uy.shape == (1, 40, 2)
+    assert res.uz is None
+    assert res.p_max.shape == (1, 1, 2)
+    np.testing.assert_allclose(res.p_max[0, 0], res.p[0].max(axis=0))
+    assert res.p_final.shape == (1, 32, 32)
+    assert res.p_rms is None and res.p_max_all is None
+
+
+def test_optimal_pml_size():
+    # 128 + 2 * 17 = 162 = 2 * 3^4
+    assert kwave.get_optimal_pml_size((128, 128)) == (17, 17)
+    for n, pml in zip((100, 257), kwave.get_optimal_pml_size((100, 257))):
+        assert kwave.largest_prime_factor(n + 2 * pml) <= 7
+
+
+def test_numpy_backend_pml_outside():
+    grid, medium, sensor, source = _make_2d_inputs(N=40, Nt=80)
+    options = kwave.SolverOptions(p_raw=True, p_final=True)
+    inp, output = kwave.kspaceFirstOrder(
+        grid=grid,
+        medium=medium,
+        sensor=sensor,
+        source=source,
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        options=options,
+        backend="numpy",
+        pml_inside=False,
+    )
+    assert inp.grid.shape == output.grid.shape == (40, 40)
+    assert output.results.p_final.shape == (1, 40, 40)
+    assert output.results.p.shape == (1, 80, 2)
+
+    expected = 15 * grid.dx / 1500.0 / grid.dt
+    arrival = np.argmax(output.results.p[0], axis=0)
+    assert np.all(np.abs(arrival - expected) < 3)
+
+    # an explicit PML keeps its size and alpha per axis
+    inp, output = kwave.kspaceFirstOrder(
+        grid=grid,
+        medium=medium,
+        sensor=sensor,
+        source=source,
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=kwave.PML(10, 1.5, 12, 3.0),
+        options=options,
+        backend="numpy",
+        pml_inside=False,
+    )
+    assert (inp.pml.pml_x_size, inp.pml.pml_y_size) == (10, 12)
+    assert (inp.pml.pml_x_alpha, inp.pml.pml_y_alpha) == (1.5, 3.0)
+    assert output.results.p_final.shape == (1, 40, 40)
+
+
+@pytest.mark.parametrize("pml_inside", [True, False])
+def test_numpy_backend_cuboid_sensor(pml_inside):
+    grid, medium, _, source = _make_2d_inputs(N=32, Nt=40)
+    cuboids = [((10, 12), (12, 20)), ((20, 5), (20, 9))]
+    mask = np.zeros((32, 32))
+    for (y1, x1), (y2, x2) in cuboids:
+        mask[y1 : y2 + 1, x1 : x2 + 1] = 1
+
+    results = []
+    for sensor in (
+        kwave.Sensor.make_binary_sensor(mask),
+        kwave.Sensor.make_cuboid_sensor(cuboids),
+    ):
+        _, output = kwave.kspaceFirstOrder(
+            grid=grid,
+            medium=medium,
+            sensor=sensor,
+            source=source,
+            simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+            pml=kwave.PML(6, 2.0, 6, 2.0),
+            options=kwave.SolverOptions(p_raw=True, p_max=True),
+            backend="numpy",
+            pml_inside=pml_inside,
+        )
+        assert output.sensor is sensor
+        results.append(output.results)
+
+    binary, cuboid = results
+    assert [p.shape for p in cuboid.p] == [(9, 3, 1, 40), (5, 1, 1, 40)]
+    assert [p.shape for p in cuboid.p_max] == [(9, 3, 1), (5, 1, 1)]
+    # binary mask points are in C order, like the points of the first cuboid
+    np.testing.assert_allclose(
+        cuboid.p[0][:, :, 0].T.reshape(40, -1), binary.p[0, :, :27]
+    )
+    np.testing.assert_allclose(cuboid.p_max[1][:, 0, 0], binary.p_max[0, 0, 27:])
+
+
+def test_collapse_keeps_caller_input(caplog, monkeypatch):
+    grid, _, sensor, source = _make_2d_inputs(N=32, Nt=40)
+    c0 = np.full((32, 32), 1500.0)
+    args = dict(
+        grid=grid,
+        medium=kwave.Medium(c0=c0),
+        sensor=sensor,
+        source=source,
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=kwave.PML(6, 2.0, 6, 2.0),
+        backend="numpy",
+    )
+    with caplog.at_level(logging.INFO, logger="kwave.kspaceFirstOrder_runner"):
+        inp, _ = kwave.kspaceFirstOrder(**args)
+    assert inp.medium.c0 is c0
+    assert "c0" in caplog.text
+
+    # collapsing (and the PML expansion) run off the event loop
+    collapse_uniform = kwave.kspaceFirstOrder_runner.collapse_uniform
+    threads = []
+
+    def record_thread(d):
+        threads.append(threading.get_ident())
+        return collapse_uniform(d)
+
+    monkeypatch.setattr(
+        kwave.kspaceFirstOrder_runner, "collapse_uniform", record_thread
+    )
+
+    async def run():
+        inp, _ = await kwave.kspaceFirstOrder_async(**args, pml_inside=False)
+        return inp, threading.get_ident()
+
+    inp, loop_thread = asyncio.run(run())
+    assert inp.medium.c0 is c0
+    assert threads and loop_thread not in threads
@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from numpy import fft
+import kwave
+from kwave import GaussianFilterBank
+
+
+def _gaussian_filter_reference(x, Fs, freq, bandwidth):
+    """The full complex FFT implementation of k-Wave's gaussianFilter"""
+    N = x.shape[-1]
+    f = (np.arange(N) - N // 2) * Fs / N
+    variance = (bandwidth / 100 * freq / (2 * np.sqrt(2 * np.log(2)))) ** 2
+    g = np.maximum(
+        kwave.gaussian(f, 1, freq, variance), kwave.gaussian(f, 1, -freq, variance)
+    )
+    return np.real(fft.ifft(fft.ifftshift(g * fft.fftshift(fft.fft(x), -1), -1)))
+
+
+@pytest.mark.parametrize("N", [128, 127])
+def test_gaussian_filter(N):
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((5, N))
+    Fs, freq, bw = 50e6, 5e6, 60
+
+    expected = _gaussian_filter_reference(x, Fs, freq, bw)
+    np.testing.assert_allclose(kwave.gaussian_filter(x, Fs, freq, bw), expected)
+    np.testing.assert_allclose(kwave.gaussian_filter(x[2], Fs, freq, bw), expected[2])
+
+
+def test_gaussian_filter_bank():
+    rng = np.random.default_rng(1)
+    x = rng.standard_normal((6, 200))
+    Fs, freqs = 40e6, [2e6, 4e6, 6e6]
+
+    bank = GaussianFilterBank(200, Fs, freqs, [50, 60, 70])
+    out = np.empty((3, 6, 200))
+    assert bank(x, out=out, workers=2) is out
+    for i, (freq, bw) in enumerate(zip(freqs, [50, 60, 70])):
+        expected = _gaussian_filter_reference(x, Fs, freq, bw)
+        np.testing.assert_allclose(out[i], expected, atol=1e-12)
+        np.testing.assert_allclose(bank(x, band=i), expected, atol=1e-12)
+
+    # float32 in, float32 out
+    res = bank(x.astype(np.float32), band=1)
+    assert res.dtype == np.float32
+    np.testing.assert_allclose(res, out[1], atol=1e-5)
+
+    with pytest.raises(ValueError):
+        bank(x[:, :100])
+    with pytest.raises(ValueError):
+        bank(x, out=np.empty((6, 200)))
+
+
+def test_envelope_detection():
+    import scipy.signal
+
+    # Gaussian modulated tone burst: the envelope is the Gaussian
+    t = np.arange(301) / 50e6
+    gauss = np.exp(-(((t - t.mean()) / 1e-6) ** 2))
+    x = np.stack([gauss * np.sin(2 * np.pi * 5e6 * t), 2 * gauss])
+    env = kwave.envelope_detection(x)
+    np.testing.assert_allclose(env[0], gauss, atol=1e-3)
+
+    M = kwave.EnvelopeDetector(301).M
+    assert M >= 2 * 301
+    expected = np.abs(scipy.signal.hilbert(x, M)[:, :301])
+    np.testing.assert_allclose(env, expected, atol=1e-10)
+    assert kwave.envelope_detection(x[0]).shape == (1, 301)
+
+
+def test_envelope_detector_blocks():
+    rng = np.random.default_rng(2)
+    x = rng.standard_normal((3, 7, 64)).astype(np.float32)
+    expected = kwave.envelope_detection(x.reshape(-1, 64).astype(np.float64))
+
+    # two rows per block, into a preallocated float32 output
+    detector = kwave.EnvelopeDetector(64, workers=2, block_bytes=2 * 8 * 65)
+    out = np.empty_like(x)
+    assert detector(x, out=out) is out
+    np.testing.assert_allclose(out.reshape(-1, 64), expected, rtol=1e-4, atol=1e-5)
+    assert detector(x).dtype == np.float32
+
+    with pytest.raises(ValueError):
+        detector(x, out=np.empty((7, 3, 64), dtype=np.float32).transpose(1, 0, 2))
+
+
+def _kspace_recon_reference(p, spacing, dt, c):
+    """Literal port of k-Wave's kspaceLineRecon / kspacePlaneRecon"""
+    Nt = p.shape[0]
+    p = np.concatenate([p[::-1], p[1:]])
+    shape = p.shape
+    ks = [
+        fft.fftshift(fft.fftfreq(n, d)) * 2 * np.pi
+        for n, d in zip(shape, (dt * c, *spacing))
+    ]
+    K = np.meshgrid(*ks, indexing="ij")
+    w = c * K[0]
+    k_sensor = np.sqrt(sum(k**2 for k in K[1:]))
+    w_new = c * np.sqrt(K[0] ** 2 + k_sensor**2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sf = c**2 * np.sqrt((w / c) ** 2 - k_sensor**2 + 0j) / (2 * w)
+        sf[(w == 0) & (k_sensor == 0)] = c / 2
+        P = sf * fft.fftshift(fft.fftn(fft.ifftshift(p)))
+    P[np.abs(w) < c * k_sensor] = 0
+
+    # interpolate along w for every sensor wavenumber
+    w_axis = c * ks[0]
+    cols = P.reshape(shape[0], -1)
+    new = w_new.reshape(shape[0], -1)
+    out = np.empty_like(cols)
+    for j in range(cols.shape[1]):
+        re = np.interp(new[:, j], w_axis, cols[:, j].real, right=np.nan)
+        im = np.interp(new[:, j], w_axis, cols[:, j].imag, right=np.nan)
+        out[:, j] = re + 1j * im
+    out[np.isnan(out)] = 0
+    p = np.real(fft.fftshift(fft.ifftn(fft.ifftshift(out.reshape(shape)))))
+    return 4 * p[Nt - 1 :] / c
+
+
+def test_kspace_line_recon():
+    rng = np.random.default_rng(3)
+    dy, dt, c = 1e-4, 2e-8, 1500.0
+    p = rng.standard_normal((3, 40, 24))
+
+    res = kwave.kspace_line_recon(p, dy, dt, c, workers=2)
+    assert res.shape == p.shape
+    for frame, expected in zip(res, p):
+        np.testing.assert_allclose(
+            frame, _kspace_recon_reference(expected, (dy,), dt, c), atol=1e-10
+        )
+
+    res32 = kwave.kspace_line_recon(p.astype(np.float32), dy, dt, c, pos_cond=True)
+    assert res32.dtype == np.float32
+    np.testing.assert_allclose(res32, np.maximum(res, 0), atol=1e-4 * np.abs(res).max())
+
+
+def test_kspace_plane_recon():
+    rng = np.random.default_rng(4)
+    dy, dz, dt, c = 1e-4, 2e-4, 3e-8, 1500.0
+    p = rng.standard_normal((15, 8, 7))
+    np.testing.assert_allclose(
+        kwave.kspace_plane_recon(p, dy, dz, dt, c),
+        _kspace_recon_reference(p, (dy, dz), dt, c),
+        atol=1e-10,
+    )
+
+
+def test_kspace_line_recon_point_source():
+    N, Nt = 64, 160
+    grid = kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=Nt, dt=2e-8)
+    p0 = np.zeros((N, N))
+    p0[30, 40] = 1.0
+    mask = np.zeros((N, N))
+    mask[10, 5:-5] = 1  # a line along x, 20 points above the source
+    sensor = kwave.Sensor.make_binary_sensor(mask)
+    _, output = kwave.kspaceFirstOrder(
+        grid=grid,
+        medium=kwave.Medium(c0=1500.0),
+        sensor=sensor,
+        source=kwave.Source(p0_source_input=p0),
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=kwave.PML(6, 2.0, 6, 2.0),
+        backend="numpy",
+    )
+
+    p = kwave.reorder_planar_sensor_data(grid, sensor, output.results.p)
+    assert p.shape == (Nt, N - 10)
+    image = kwave.kspace_line_recon(p, grid.dx, grid.dt, 1500.0)
+    depth, pos = np.unravel_index(np.argmax(image), image.shape)
+    # x = c * t in units of the grid spacing
+    assert abs(depth * 1500.0 * grid.dt / grid.dy - 20) <= 1
+    assert abs(pos + 5 - 40) <= 1
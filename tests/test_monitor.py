@@ -0,0 +1,60 @@
+import kwave
+import kwave.kspaceFirstOrder_runner
+from kwave.monitor import SolverMonitor
+
+SAMPLE_OUTPUT = """\
+┌───────────────────────────────────────────────────────────────┐
+│                   kspaceFirstOrder-CUDA v1.3                  │
+├───────────────────────────────────────────────────────────────┤
+│                        Initialization                         │
+├───────────────────────────────────────────────────────────────┤
+│ Memory allocation:                                       Done │
+│ Elapsed time:                                          0.25s │
+│ Pre-processing phase:                                    Done │
+│ Elapsed time:                                          0.50s │
+├───────────────────────────────────────────────────────────────┤
+│                          Simulation                           │
+├──────────┬────────────────┬──────────────┬────────────────────┤
+│ Progress │  Elapsed time  │  Time to go  │  Est. finish time  │
+├──────────┼────────────────┼──────────────┼────────────────────┤
+│     0%   │        0.000s  │      0.000s  │  25/11/23 16:03:04 │
+│    50%   │        1.500s  │      1.500s  │  25/11/23 16:03:06 │
+├──────────┴────────────────┴──────────────┴────────────────────┤
+│ Elapsed time:                                          3.00s │
+├───────────────────────────────────────────────────────────────┤
+│ Peak host memory in use:                               134MB │
+└───────────────────────────────────────────────────────────────┘
+"""
+
+
+def test_monitor_parses_solver_output():
+    events = []
+    monitor = SolverMonitor(events.append)
+    for line in SAMPLE_OUTPUT.splitlines():
+        monitor.feed(line)
+    metrics = monitor.finish(0)
+
+    progress = [e for e in events if isinstance(e, kwave.SolverProgress)]
+    assert [(e.percent, e.elapsed, e.eta) for e in progress] == [
+        (0.0, 0.0, 0.0),
+        (50.0, 1.5, 1.5),
+    ]
+    assert metrics.phase_times == {"Initialization": 0.75, "Simulation": 3.0}
+    assert metrics.info["Peak host memory in use"] == "134MB"
+    assert events[-1] is metrics
+
+
+def test_run_binary_metrics(tmp_path, monkeypatch):
+    out = tmp_path / "stdout.txt"
+    out.write_text(SAMPLE_OUTPUT)
+    binary = tmp_path / kwave.kspaceFirstOrder_runner.cuda_binary
+    binary.write_text(f"#!/bin/sh\ncat {out}\n")
+    binary.chmod(0o755)
+    monkeypatch.setattr(kwave.kspaceFirstOrder_runner, "binary_root", tmp_path)
+
+    events = []
+    metrics = kwave.kspaceFirstOrder_runner._run_binary([], callback=events.append)
+    assert metrics.returncode == 0
+    assert metrics.wall_time > 0
+    assert metrics.peak_rss_bytes > 0
+    assert any(isinstance(e, kwave.SolverProgress) for e in events)
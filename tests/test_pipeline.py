@@ -0,0 +1,91 @@
+import functools
+
+import h5py
+import numpy as np
+import pytest
+import kwave
+from kwave import SensorPipeline, StorageOptions
+
+
+def _stages():
+    return (
+        kwave.envelope_detection,
+        functools.partial(kwave.log_compression, a=3),
+    )
+
+
+def _full(p):
+    x = p[0].T
+    for stage in _stages():
+        x = stage(x)
+    return x.T[np.newaxis]
+
+
+def test_pipeline_blocks_match_full(tmp_path):
+    rng = np.random.default_rng(0)
+    p = rng.standard_normal((1, 64, 37)).astype(np.float32)
+    expected = _full(p)
+
+    pipe = SensorPipeline(*_stages(), block_size=8)
+    res = pipe.run(kwave.SimulationResults(p=p))
+    assert res.shape == p.shape and res.dtype == np.float32
+    np.testing.assert_allclose(res, expected, rtol=1e-5, atol=1e-6)
+
+    # file to file, chunked by sensor block
+    src = tmp_path / "output.h5"
+    with h5py.File(src, "w") as f:
+        f["p"] = p
+    dst = tmp_path / "bmode.h5"
+    lazy = pipe.run(src, dst, out_name="bmode")
+    np.testing.assert_allclose(lazy[0, :, 20:30], expected[0, :, 20:30], rtol=1e-5)
+    with h5py.File(dst, "r") as f:
+        assert f["bmode"].chunks == (1, 64, 8)
+
+    # in place, compressed
+    lazy = pipe.run(src, src, out_name="env", storage=StorageOptions("gzip"))
+    np.testing.assert_allclose(np.asarray(lazy), expected, rtol=1e-5, atol=1e-6)
+    with h5py.File(src, "r") as f:
+        assert set(f) == {"p", "env"}
+
+
+def test_pipeline_stage_checks():
+    p = np.ones((1, 16, 4))
+    # stages may change the time series length
+    res = SensorPipeline(lambda x: x[:, ::2], block_size=3).run(p)
+    assert res.shape == (1, 8, 4)
+
+    with pytest.raises(ValueError, match="rows"):
+        SensorPipeline(lambda x: x[:1], block_size=3).run(p)
+
+
+def test_pipeline_cuboids(tmp_path):
+    rng = np.random.default_rng(1)
+    # stored by the solver as (Nt, Cz, Cy, Cx), read as (Cx, Cy, Cz, Nt)
+    stored = [
+        rng.standard_normal((64, 1, 3, 9)).astype(np.float32),
+        rng.standard_normal((64, 2, 2, 2)).astype(np.float32),
+    ]
+    cuboids = [c.T for c in stored]
+    expected = [
+        _full(c.reshape(-1, 64).T[np.newaxis])[0].T.reshape(*c.shape[:-1], -1)
+        for c in cuboids
+    ]
+
+    pipe = SensorPipeline(*_stages(), block_size=4)
+    res = pipe.run(kwave.SimulationResults(p=cuboids))
+    for r, e in zip(res, expected):
+        np.testing.assert_allclose(r, e, rtol=1e-5, atol=1e-6)
+
+    src = tmp_path / "output.h5"
+    with h5py.File(src, "w") as f:
+        for i, c in enumerate(stored, 1):
+            f[f"p/{i}"] = c
+    lazy = pipe.run(src, tmp_path / "bmode.h5", out_name="bmode")
+    for r, e in zip(lazy, expected):
+        assert isinstance(r, kwave.LazyDataset) and r.shape == e.shape
+        np.testing.assert_allclose(r[()], e, rtol=1e-5, atol=1e-6)
+    with h5py.File(tmp_path / "bmode.h5", "r") as f:
+        assert f["bmode/1"].shape == (64, 1, 3, 9)
+
+    with pytest.raises(ValueError, match="Cuboid"):
+        pipe.run(cuboids, np.empty((1, 64, 31)))
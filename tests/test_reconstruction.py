@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+import kwave
+from kwave import DelayAndSum
+
+
+def _simulate(N=64, Nt=200):
+    grid = kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=Nt, dt=2e-8)
+    p0 = np.zeros((N, N))
+    p0[40, 25] = 1.0
+    # sensors on a ring around the centre of the grid
+    yy, xx = np.mgrid[:N, :N]
+    r = np.hypot(yy - N // 2, xx - N // 2)
+    mask = (np.abs(r - 24) < 0.5).astype(float)
+    sensor = kwave.Sensor.make_binary_sensor(mask)
+    _, output = kwave.kspaceFirstOrder(
+        grid=grid,
+        medium=kwave.Medium(c0=1500.0),
+        sensor=sensor,
+        source=kwave.Source(p0_source_input=p0),
+        simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+        pml=kwave.PML(6, 2.0, 6, 2.0),
+        backend="numpy",
+    )
+    return grid, sensor, output.results.p
+
+
+def test_delay_and_sum_point_source():
+    grid, sensor, p = _simulate()
+    das = DelayAndSum(grid, sensor, 1500.0)
+    image = das(p)
+    assert image.shape == grid.shape and image.dtype == np.float32
+    peak = np.unravel_index(np.argmax(image), image.shape)
+    assert np.abs(np.subtract(peak, (40, 25))).max() <= 1
+
+    # chunked, uncached and threaded paths give the same image
+    other = DelayAndSum(grid, sensor, 1500.0, chunk_size=500, cache_bytes=0, workers=4)
+    np.testing.assert_allclose(other(p), image, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(
+        kwave.delay_and_sum(p, grid, sensor, 1500.0), image, rtol=1e-6
+    )
+
+    # a pixel subset and several frames
+    pixels = np.array([[40, 25], [10, 10]]) * 1e-4
+    frames = np.stack([p[0], 2 * p[0]])
+    res = DelayAndSum(grid, sensor, 1500.0, pixels)(frames)
+    assert res.shape == (2, 2)
+    np.testing.assert_allclose(res[0], image[(40, 10), (25, 10)], rtol=1e-5)
+    np.testing.assert_allclose(res[1], 2 * res[0], rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        das(p[:, :-1])
+
+
+def test_delay_and_sum_cuboid_sensor():
+    N, Nt = 48, 150
+    grid = kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=Nt, dt=2e-8)
+    p0 = np.zeros((N, N))
+    p0[30, 20] = 1.0
+    cuboids = [((5, 5), (6, 40)), ((10, 42), (40, 42))]
+    mask = np.zeros((N, N))
+    for (y1, x1), (y2, x2) in cuboids:
+        mask[y1 : y2 + 1, x1 : x2 + 1] = 1
+
+    images = []
+    for sensor in (
+        kwave.Sensor.make_binary_sensor(mask),
+        kwave.Sensor.make_cuboid_sensor(cuboids),
+    ):
+        _, output = kwave.kspaceFirstOrder(
+            grid=grid,
+            medium=kwave.Medium(c0=1500.0),
+            sensor=sensor,
+            source=kwave.Source(p0_source_input=p0),
+            simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+            pml=kwave.PML(6, 2.0, 6, 2.0),
+            backend="numpy",
+        )
+        images.append(DelayAndSum(grid, sensor, 1500.0)(output.results.p))
+
+    # the same points in a different order
+    np.testing.assert_allclose(images[1], images[0], rtol=1e-4, atol=1e-6)
+    peak = np.unravel_index(np.argmax(images[1]), images[1].shape)
+    assert np.abs(np.subtract(peak, (30, 20))).max() <= 1
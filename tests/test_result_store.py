@@ -0,0 +1,126 @@
+import concurrent.futures
+
+import h5py
+import numpy as np
+import pytest
+import kwave
+from kwave import ResultStore
+
+
+def _results(value, Nt=50, Nsens=20):
+    p = np.full((1, Nt, Nsens), value, dtype=np.float32)
+    p[0, :, :] += np.arange(Nsens)
+    return kwave.SimulationResults(p=p, p_max=p.max(axis=1, keepdims=True))
+
+
+def test_result_store_append_read(tmp_path):
+    store = ResultStore(tmp_path / "store.h5", fields=("p", "p_max"))
+    assert len(store) == 0
+    for i in range(5):
+        assert (
+            store.append(_results(100 * i), dict(run=i, c0=np.float32(1500 + i))) == i
+        )
+
+    assert len(store) == 5
+    assert store.params[2] == dict(run=2, c0=1502.0)
+    assert list(store.select(run=3)) == [3]
+
+    # one sensor across all runs, and a time window of one run
+    s = store.read("p", np.s_[:, 0, :, 17])
+    assert s.shape == (5, 50)
+    np.testing.assert_array_equal(s[:, 0], 100 * np.arange(5) + 17)
+    np.testing.assert_array_equal(store.read("p", np.s_[3, 0, 10:20, 0]), 300)
+    np.testing.assert_array_equal(
+        store.read("p_max", np.s_[[4, 1], 0, 0, 0]), [400, 100]
+    )
+
+    with h5py.File(store.path, "r") as f:
+        assert f["p"].compression == "gzip"
+        assert f["p"].chunks[0] == ResultStore.run_chunk
+
+
+def test_result_store_interrupted_append(tmp_path):
+    store = ResultStore(tmp_path / "store.h5")
+    store.append(_results(0), dict(run=0))
+    # a run whose append stopped before its parameters were written
+    with h5py.File(store.path, "a") as f:
+        f["p"].resize(2, axis=0)
+    assert store.read("p").shape == (1, 1, 50, 20)
+
+    # the incomplete run is out of range, negative indices count from run 0
+    with pytest.raises(IndexError):
+        store.read("p", 1)
+    with pytest.raises(IndexError):
+        store.read("p", [0, 1])
+    np.testing.assert_array_equal(store.read("p", -1), store.read("p", 0))
+
+    assert store.append(_results(1), dict(run=1)) == 1
+    assert store.read("p", np.s_[:, 0, 0, 0]).tolist() == [0, 1]
+    assert store.read("p", np.s_[[-1, 0], 0, 0, 0]).tolist() == [1, 0]
+    assert store.read("p", np.s_[np.int64(-1), 0, 0, 0]) == 1
+
+
+def test_result_store_cuboids(tmp_path):
+    store = ResultStore(tmp_path / "store.h5", fields=("p", "p_max"))
+    for i in range(3):
+        p = [np.full((9, 3, 1, 40), i, np.float32), np.full((5, 1, 1, 40), -i)]
+        p_max = [c.max(axis=-1) for c in p]
+        store.append(kwave.SimulationResults(p=p, p_max=p_max), dict(run=i))
+
+    assert store.read("p/1").shape == (3, 9, 3, 1, 40)
+    np.testing.assert_array_equal(store.read("p/2", np.s_[:, 4, 0, 0, 7]), [0, -1, -2])
+    np.testing.assert_array_equal(store.read("p_max/1", np.s_[2]), 2)
+
+    # runs must keep the store's sensor layout
+    with pytest.raises(ValueError, match="cuboids"):
+        store.append(_results(0), dict(run=3))
+    with pytest.raises(ValueError, match="cuboids"):
+        store.append(kwave.SimulationResults(p=p[:1], p_max=p_max[:1]))
+    binary = ResultStore(tmp_path / "binary.h5")
+    binary.append(_results(0))
+    with pytest.raises(ValueError, match="binary"):
+        binary.append(kwave.SimulationResults(p=p))
+    assert len(store) == 3 and len(binary) == 1
+
+
+def test_result_store_concurrent_append(tmp_path):
+    store = ResultStore(tmp_path / "store.h5")
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda i: store.append(_results(i), dict(run=i)), range(32)))
+
+    runs = [p["run"] for p in store.params]
+    assert sorted(runs) == list(range(32))
+    np.testing.assert_array_equal(store.read("p", np.s_[:, 0, 0, 0]), runs)
+
+
+def test_kspaceFirstOrder_batch_store(tmp_path):
+    N = 24
+    inputs = []
+    for i in range(3):
+        p0 = np.zeros((N, N))
+        p0[N // 2, 6 + 2 * i] = 1.0
+        mask = np.zeros((N, N))
+        mask[N // 2, N - 6] = 1
+        inputs.append(
+            dict(
+                grid=kwave.Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=40, dt=2e-8),
+                medium=kwave.Medium(c0=1500.0),
+                sensor=kwave.Sensor.make_binary_sensor(mask),
+                source=kwave.Source(p0_source_input=p0),
+                simulation_flags=kwave.SimulationFlags(absorbing_flag=0),
+                pml=kwave.PML(4, 2.0, 4, 2.0),
+            )
+        )
+
+    store = ResultStore(tmp_path / "store.h5")
+    results = kwave.kspaceFirstOrder_batch(
+        inputs,
+        max_workers=3,
+        backend="numpy",
+        store=store,
+        params=[dict(x=6 + 2 * i) for i in range(3)],
+    )
+    assert len(store) == 3
+    for i, (_, out) in enumerate(results):
+        (run,) = store.select(x=6 + 2 * i)
+        np.testing.assert_array_equal(store.read("p", run), out.results.p)
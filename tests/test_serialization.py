@@ -2,8 +2,20 @@ import tempfile
 from pathlib import Path
 
 import h5py
-from kwave import H5Input
-from kwave.h5_dataclass_helper import serialize_to_hdf5, deserialize_from_hdf5
+import numpy as np
+import pytest
+from kwave import H5Input, SimulationFlags, Grid, Medium, Sensor, Source, PML
+from kwave import SimulationResults, LazyDataset, StorageOptions, benchmark_storage
+from kwave.h5_dataclass_helper import (
+    serialize_to_hdf5,
+    deserialize_from_hdf5,
+    serialize_to_bytes,
+    deserialize_from_bytes,
+    get_field_plan,
+    hash_dataclass,
+    collapse_uniform,
+    update_hdf5,
+)
 from kwave.h5_compare import compare_hdf5_files
 
 
@@ -18,3 +30,254 @@ def test_serialization_deserialization_input():
             serialize_to_hdf5(inp, new_h5)
 
         compare_hdf5_files(new_path, true_input_path)
+
+
+def test_serialize_to_bytes_roundtrip():
+    N = 8
+    p0 = np.zeros((N, N))
+    p0[2, 3] = 1.0
+    inp = H5Input(
+        simulation_flags=SimulationFlags(absorbing_flag=0),
+        grid=Grid(Nx=N, Ny=N, dx=1e-4, dy=1e-4, Nt=4, dt=2e-8),
+        medium=Medium(c0=1500.0),
+        sensor=Sensor.make_binary_sensor(p0),
+        source=Source(p0_source_input=p0),
+        pml=PML(2, 2.0, 2, 2.0),
+    )
+    data = serialize_to_bytes(inp)
+    assert data[:8] == b"\x89HDF\r\n\x1a\n"
+
+    new = deserialize_from_bytes(H5Input, data)
+    assert new.grid.Nx == N
+    np.testing.assert_array_equal(new.source.p0_source_input[0], p0)
+
+
+def test_lazy_deserialization(tmp_path):
+    p = np.arange(2 * 50 * 7, dtype=np.float32).reshape(1, 100, 7)
+    fname = tmp_path / "out.h5"
+    with h5py.File(fname, "w") as f:
+        f["p"] = p
+        f.create_dataset("p_final", data=p, chunks=(1, 10, 7), compression="gzip")
+
+    with h5py.File(fname, "r") as f:
+        res = deserialize_from_hdf5(SimulationResults, f, lazy=True)
+
+    # read after the file was closed
+    assert isinstance(res.p, LazyDataset) and res.p.is_memmap
+    assert not np.asarray(res.p).flags.owndata  # mapped, not copied
+    np.testing.assert_array_equal(res.p[0, 10:20, 3], p[0, 10:20, 3])
+
+    assert not res.p_final.is_memmap
+    assert res.p_final.shape == p.shape
+    np.testing.assert_array_equal(res.p_final[:, 90:, [1, 4]], p[:, 90:, [1, 4]])
+    np.testing.assert_array_equal(res.p_final.read(), p)
+
+
+def test_field_plan_conditional_shapes():
+    plan = get_field_plan(Source)
+    assert plan is get_field_plan(Source)  # compiled once
+    p_input = next(p for p in plan if p.name == "p_source_input")
+    assert p_input.optional and p_input.dtype is np.float32
+    assert len(p_input.conditional) == 2
+
+    signal = np.ones((1, 10, 3), dtype=np.float32)
+    source = Source(
+        p_source_mode=0,
+        p_source_many=1,
+        p_source_index=np.arange(3)[None, None],
+        p_source_input=signal,
+        p0_source_input=np.zeros((4, 4)),
+    )
+    with h5py.File("cond.h5", "w", driver="core", backing_store=False) as f:
+        serialize_to_hdf5(source, f)
+        assert f["p_source_input"].shape == (1, 10, 3)
+
+    # a single signal for many sources has the wrong shape
+    source.p_source_many = 0
+    with h5py.File("cond.h5", "w", driver="core", backing_store=False) as f:
+        with pytest.raises(ValueError, match="p_source_input"):
+            serialize_to_hdf5(source, f)
+
+
+def test_storage_options(tmp_path):
+    N = 64
+    p0 = np.zeros((N, N, N), dtype=np.float32)
+    p0[20:30, 20:30, 20:30] = 1.0
+    inp = H5Input(
+        simulation_flags=SimulationFlags(absorbing_flag=0),
+        grid=Grid(Nx=N, Ny=N, Nz=N, dx=1e-4, dy=1e-4, dz=1e-4, Nt=4, dt=2e-8),
+        medium=Medium(c0=1500.0),
+        sensor=Sensor(sensor_mask_index=np.arange(3, dtype=np.uint64)[None, None]),
+        source=Source(p0_source_input=p0),
+        pml=PML(2, 2.0, 2, 2.0),
+    )
+    storage = StorageOptions(
+        compression="gzip",
+        shuffle=True,
+        fields=dict(
+            p0_source_input=StorageOptions(compression="lzf", chunks=(8, 64, 128))
+        ),
+    )
+    with h5py.File(tmp_path / "c.h5", "w") as f:
+        serialize_to_hdf5(inp, f, storage=storage)
+    with h5py.File(tmp_path / "c.h5", "r") as f:
+        dset = f["p0_source_input"]
+        assert dset.compression == "lzf" and dset.chunks == (8, 64, 64)
+        assert f["sensor_mask_index"].chunks is None  # small datasets stay contiguous
+        new = deserialize_from_hdf5(H5Input, f)
+    np.testing.assert_array_equal(new.source.p0_source_input, p0)
+
+    results = benchmark_storage(
+        inp, dict(contiguous=None, gzip=StorageOptions(compression="gzip")), tmp_path, 1
+    )
+    sizes = {r["name"]: r["file_size"] for r in results}
+    assert sizes["gzip"] < sizes["contiguous"] / 10
+
+
+def test_streaming_serialization(tmp_path, monkeypatch):
+    import tracemalloc
+    from kwave import h5_dataclass_helper
+
+    monkeypatch.setattr(h5_dataclass_helper, "_SLAB_BYTES", 2**18)
+
+    # float64 memmap, read through a non-contiguous (transposed) view
+    shape = (32, 64, 128)
+    mm = np.memmap(tmp_path / "c0.dat", dtype=np.float64, mode="w+", shape=shape[::-1])
+    mm[:] = np.random.default_rng(0).uniform(1400, 1600, shape[::-1])
+    c0 = mm.T
+    medium = Medium(c0=c0)
+
+    tracemalloc.start()
+    with h5py.File(tmp_path / "m.h5", "w") as f:
+        serialize_to_hdf5(medium, f)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < c0.nbytes / 2  # less than a float32 copy
+
+    with h5py.File(tmp_path / "m.h5", "r") as f:
+        assert f["c0"].dtype == np.float32
+        np.testing.assert_array_equal(f["c0"][:], c0.astype(np.float32))
+
+    # streamed hash matches the hash of the converted array
+    h1 = hash_dataclass(medium).hexdigest()
+    h2 = hash_dataclass(Medium(c0=np.ascontiguousarray(c0, dtype=np.float32)))
+    assert h1 == h2.hexdigest()
+
+
+def test_update_hdf5_skips_unchanged(tmp_path, monkeypatch):
+    from kwave import h5_dataclass_helper
+
+    rng = np.random.default_rng(0)
+    c0 = rng.uniform(1400, 1600, (8, 8, 8))
+    rho0 = rng.uniform(900, 1100, (8, 8, 8))
+    with h5py.File(tmp_path / "m.h5", "w") as f:
+        serialize_to_hdf5(Medium(c0=c0, rho0=rho0), f, fingerprints=True)
+        assert f["c0"].attrs["kwave_fingerprint"] == h5_dataclass_helper._fingerprint(
+            c0, np.float32
+        )
+
+    hashed = []
+    hash_value = h5_dataclass_helper._hash_value
+
+    def count_hashes(val, dtype, h):
+        if val.size > 1:
+            hashed.append(val.shape)
+        hash_value(val, dtype, h)
+
+    monkeypatch.setattr(h5_dataclass_helper, "_hash_value", count_hashes)
+
+    with h5py.File(tmp_path / "m.h5", "r+") as f:
+        # equal content is hashed but not rewritten
+        assert update_hdf5(Medium(c0=c0.copy(), rho0=rho0), f) == []
+        assert len(hashed) == 2
+
+        # an array modified in place is rewritten
+        rho0 += 1
+        assert update_hdf5(Medium(c0=c0, rho0=rho0), f) == ["rho0"]
+        np.testing.assert_array_equal(f["rho0"][:], rho0.astype(np.float32))
+
+        # a dataset of a different shape is rewritten without comparing
+        hashed.clear()
+        assert update_hdf5(Medium(c0=c0[:4], rho0=rho0), f) == ["c0"]
+        assert hashed == [rho0.shape]
+
+        # fields marked unchanged are neither hashed nor rewritten
+        hashed.clear()
+        other = Medium(c0=c0 + 1, rho0=rho0 + 2)
+        assert update_hdf5(other, f, unchanged={"c0", "rho0"}) == []
+        assert hashed == []
+        np.testing.assert_array_equal(f["rho0"][:], rho0.astype(np.float32))
+
+
+def test_collapse_uniform():
+    N = 16
+    shape = (N, N, N)
+    c0 = np.full(shape, 1500.0)
+    c0[3, 4, 5] = 1540.0
+    medium = Medium(
+        c0=c0,
+        rho0=np.full(shape, 1000.0),
+        rho0_sgx=np.full(shape, 1000.0),
+        rho0_sgy=np.full(shape, 1000.0),
+        rho0_sgz=np.full(shape, 1000.0),
+        alpha_coeff=np.full(shape, 0.75, dtype=np.float32),
+    )
+    new, collapsed = collapse_uniform(medium)
+    assert sorted(collapsed) == [
+        "alpha_coeff",
+        "rho0",
+        "rho0_sgx",
+        "rho0_sgy",
+        "rho0_sgz",
+    ]
+    assert new.rho0 == np.float32(1000.0) and new.c0 is c0
+    assert medium.rho0.shape == shape  # input left untouched
+
+    # the densities are only collapsed together
+    medium.rho0_sgx = medium.rho0_sgx.copy()
+    medium.rho0_sgx[0, 0, 0] = 900.0
+    _, collapsed = collapse_uniform(medium)
+    assert collapsed == ["alpha_coeff"]
+
+    with h5py.File("m.h5", "w", driver="core", backing_store=False) as f:
+        collapsed = serialize_to_hdf5(medium, f, collapse=True)
+        assert collapsed == ["alpha_coeff"]
+        assert f["alpha_coeff"].shape == (1, 1, 1)
+        assert f["rho0"].shape == shape
+
+
+def test_cuboid_sensor(tmp_path):
+    corners = [((1, 2, 3), (2, 5, 3)), ((0, 0, 0), (0, 1, 1))]
+    sensor = Sensor.make_cuboid_sensor(corners)
+    assert sensor.sensor_mask_corners.shape == (1, 6, 2)
+    # k-Wave's 1-based [x1, y1, z1, x2, y2, z2]
+    np.testing.assert_array_equal(
+        sensor.sensor_mask_corners[0, :, 0], [4, 3, 2, 4, 6, 3]
+    )
+    assert sensor.get_cuboid_corners() == corners
+    assert sensor.get_num_points() == 2 * 4 * 1 + 1 * 2 * 2
+    mask = sensor.get_binary_mask((4, 8, 8))
+    assert mask.sum() == 12 and mask[2, 5, 3] == 1
+
+    # output groups p/1, p/2 stored as (Nt, Cz, Cy, Cx)
+    Nt = 10
+    p1 = np.random.default_rng(0).random((Nt, 2, 4, 1), dtype=np.float32)
+    p2 = np.random.default_rng(1).random((Nt, 1, 2, 2), dtype=np.float32)
+    fname = tmp_path / "out.h5"
+    with h5py.File(fname, "w") as f:
+        f["p/1"] = p1
+        f.create_dataset("p/2", data=p2, chunks=(5, 1, 2, 2), compression="gzip")
+
+    with h5py.File(fname, "r") as f:
+        res = deserialize_from_hdf5(SimulationResults, f)
+        lazy = deserialize_from_hdf5(SimulationResults, f, lazy=True)
+
+    assert [a.shape for a in res.p] == [(1, 4, 2, Nt), (2, 2, 1, Nt)]
+    np.testing.assert_array_equal(res.p[0], p1.T)
+
+    assert lazy.p[0].is_memmap and lazy.p[0].shape == (1, 4, 2, Nt)
+    assert not np.asarray(lazy.p[0]).flags.owndata
+    np.testing.assert_array_equal(lazy.p[0][0, 1:3, :, 4:], p1.T[0, 1:3, :, 4:])
+    assert not lazy.p[1].is_memmap
+    np.testing.assert_array_equal(lazy.p[1][..., 2], p2.T[..., 2])
+    np.testing.assert_array_equal(np.asarray(lazy.p[1]), p2.T)